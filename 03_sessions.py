@@ -13,12 +13,16 @@ Session은 관련된 여러 trace들을 그룹화합니다.
 
 import os
 import time
+import importlib
 from datetime import datetime
 from dotenv import load_dotenv
 from langfuse import Langfuse
 
 load_dotenv()
 
+# 05_prompts.py의 캐시 토큰 카운터 재사용 (파일명이 숫자로 시작해 import 문을 쓸 수 없음)
+TokenCounter = importlib.import_module("05_prompts").TokenCounter
+
 
 def simple_session_example():
     """
@@ -223,6 +227,7 @@ def long_conversation_session_example():
     print(f"세션: {session_id}")
     print(f"사용자: {user_id}\n")
 
+    token_counter = TokenCounter()
     total_tokens = 0
 
     for turn_data in conversation:
@@ -242,17 +247,17 @@ def long_conversation_session_example():
             input=turn_data['user']
         )
 
-        # 토큰 수 시뮬레이션
-        prompt_tokens = len(turn_data['user'].split()) * 1.3
-        completion_tokens = len(turn_data['assistant'].split()) * 1.3
-        tokens = int(prompt_tokens + completion_tokens)
+        # 토크나이저로 토큰 수 계산
+        prompt_tokens = token_counter.count(turn_data['user'])
+        completion_tokens = token_counter.count(turn_data['assistant'])
+        tokens = prompt_tokens + completion_tokens
         total_tokens += tokens
 
         generation.end(
             output=turn_data['assistant'],
             usage={
-                "prompt_tokens": int(prompt_tokens),
-                "completion_tokens": int(completion_tokens),
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
                 "total_tokens": tokens
             }
         )
@@ -9,15 +9,159 @@ Prompt Management는 프롬프트를 중앙에서 관리하고 버전 관리하
 2. 버전 관리 및 롤백
 3. A/B 테스트를 위한 다중 버전
 4. 프로덕션과 개발 환경 분리
+5. 렌더링된 프롬프트의 토큰 수 계산 (캐시)
 """
 
 import os
+import re
+import hashlib
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
 from dotenv import load_dotenv
 from langfuse import Langfuse
 
+try:
+    import tiktoken
+except ImportError:  # 선택 의존성: 없으면 정규식 기반 토크나이저 사용
+    tiktoken = None
+
 load_dotenv()
 
 
+# ============================================================
+# 토큰 카운터 (Token Counter)
+# ============================================================
+
+TEMPLATE_VARIABLE_PATTERN = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+
+def regex_tokenize(text: str) -> List[str]:
+    """
+    tiktoken이 없을 때 사용하는 기본 토크나이저
+
+    단어, 숫자, 구두점, 공백 덩어리를 토큰으로 나눕니다.
+    """
+    return re.findall(r" ?\w+| ?[^\w\s]+|\s+", text)
+
+
+def get_tokenizer(model: str = "gpt-3.5-turbo") -> Callable[[str], List]:
+    """
+    모델에 맞는 토크나이저를 반환합니다.
+
+    tiktoken이 설치되어 있으면 모델 인코딩을, 없으면 regex_tokenize를 사용합니다.
+    """
+    if tiktoken is None:
+        return regex_tokenize
+
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        encoding = tiktoken.get_encoding("cl100k_base")
+    return encoding.encode
+
+
+class TokenCounter:
+    """
+    콘텐츠 해시를 키로 하는 LRU 캐시를 가진 토큰 카운터
+
+    같은 시스템 프롬프트를 매 호출마다 다시 토큰화하지 않도록
+    텍스트의 SHA-256 해시별로 토큰 수를 저장합니다.
+    """
+
+    def __init__(self, tokenizer: Optional[Callable[[str], List]] = None, max_entries: int = 4096):
+        self.tokenizer = tokenizer or get_tokenizer()
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, int]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def content_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def count(self, text: str) -> int:
+        """텍스트의 토큰 수 (캐시 사용)"""
+        if not text:
+            return 0
+
+        key = self.content_hash(text)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        tokens = len(self.tokenizer(text))
+        self._cache[key] = tokens
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return tokens
+
+    def count_messages(self, messages: List[Dict[str, str]]) -> int:
+        """채팅 메시지 목록의 토큰 수 합계"""
+        return sum(self.count(message["content"]) for message in messages)
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+
+class CompiledPrompt:
+    """
+    정적 세그먼트의 토큰 수를 미리 계산해 둔 프롬프트 템플릿
+
+    템플릿을 정적 텍스트와 {{변수}} 슬롯으로 분리하고, 정적 부분은 컴파일 시
+    한 번만 토큰화합니다. 렌더링 시에는 변수 값만 토큰화하여 합산합니다.
+    토크나이저는 단어 앞 공백을 다음 토큰에 붙이므로, 변수 앞의 공백은
+    정적 세그먼트가 아니라 변수 값 쪽(prefix)에 포함해 셉니다.
+    변수 경계가 공백/구두점이면 전체 토큰화 결과와 일치하며,
+    render(..., exact=True)로 전체 텍스트를 (캐시를 통해) 다시 셀 수 있습니다.
+    """
+
+    def __init__(self, template: str, counter: TokenCounter):
+        self.template = template
+        self.counter = counter
+        self.segments: List[str] = []
+        self.prefixes: List[str] = []
+        self.variables: List[str] = []
+
+        position = 0
+        for match in TEMPLATE_VARIABLE_PATTERN.finditer(template):
+            segment = template[position:match.start()]
+            stripped = segment.rstrip(" ")
+            self.segments.append(stripped)
+            self.prefixes.append(segment[len(stripped):])
+            self.variables.append(match.group(1))
+            position = match.end()
+        self.segments.append(template[position:])
+
+        self.static_tokens = sum(counter.count(segment) for segment in self.segments)
+
+    def render(self, variables: Dict[str, str], exact: bool = False):
+        """
+        템플릿을 렌더링하고 (텍스트, 토큰 수)를 반환합니다.
+        """
+        parts = [self.segments[0]]
+        tokens = self.static_tokens
+
+        for name, prefix, segment in zip(self.variables, self.prefixes, self.segments[1:]):
+            value = prefix + str(variables[name])
+            parts.append(value)
+            parts.append(segment)
+            tokens += self.counter.count(value)
+
+        text = "".join(parts)
+        if exact:
+            tokens = self.counter.count(text)
+        return text, tokens
+
+
 def create_and_manage_prompts():
     """
     프롬프트 생성 및 관리 예제
@@ -503,6 +647,87 @@ def prompt_fallback_example():
     langfuse.flush()
 
 
+def prompt_token_budget_example():
+    """
+    프롬프트 토큰 예산 예제
+
+    컴파일된 템플릿으로 렌더링된 프롬프트의 토큰 수를 호출 전에 계산합니다.
+    """
+    print("\n" + "=" * 60)
+    print("7. 프롬프트 토큰 수 계산 및 예산 관리")
+    print("=" * 60)
+
+    langfuse = Langfuse()
+
+    counter = TokenCounter()
+    tokenizer_name = "tiktoken" if tiktoken is not None else "regex"
+
+    system_prompt = (
+        "You are a senior support engineer. Follow the company style guide, "
+        "cite documentation when possible, and never reveal internal details.\n" * 20
+    )
+    template = system_prompt + "\nCustomer ({{tier}}): {{question}}\nAnswer:"
+
+    compiled = CompiledPrompt(template, counter)
+    token_budget = 1024
+
+    print(f"\n토크나이저: {tokenizer_name}")
+    print(f"정적 세그먼트: {len(compiled.segments)}개, 변수: {', '.join(compiled.variables)}")
+    print(f"정적 토큰 수 (사전 계산): {compiled.static_tokens}")
+    print(f"토큰 예산: {token_budget}\n")
+
+    questions = [
+        {"tier": "premium", "question": "How do I export traces to CSV?"},
+        {"tier": "free", "question": "Why is my dashboard empty?"},
+        {"tier": "premium", "question": "How do I export traces to CSV?"}
+    ]
+
+    for i, variables in enumerate(questions, 1):
+        final_prompt, prompt_tokens = compiled.render(variables)
+        within_budget = prompt_tokens <= token_budget
+
+        trace = langfuse.trace(
+            name="prompt_token_budget",
+            metadata={
+                "prompt_tokens": prompt_tokens,
+                "token_budget": token_budget,
+                "tokenizer": tokenizer_name
+            }
+        )
+
+        generation = trace.generation(
+            name="support_answer",
+            model="gpt-3.5-turbo",
+            input=final_prompt
+        )
+
+        output = "Please see the export guide in the documentation."
+        completion_tokens = counter.count(output)
+
+        generation.end(
+            output=output,
+            usage={
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        )
+
+        trace.end()
+
+        status = "✓" if within_budget else "⚠"
+        print(f"[{i}] {status} {variables['question']}")
+        print(f"    Prompt Tokens: {prompt_tokens} / {token_budget}")
+
+    stats = counter.stats()
+    print(f"\n캐시 통계:")
+    print(f"  - Entries: {stats['entries']}")
+    lookups = stats['hits'] + stats['misses']
+    print(f"  - Hit Rate: {stats['hit_rate']*100:.1f}% ({stats['hits']}/{lookups})")
+
+    langfuse.flush()
+
+
 def main():
     """메인 실행 함수"""
     print("\n" + "=" * 60)
@@ -528,6 +753,9 @@ def main():
         # 6. 폴백 전략
         prompt_fallback_example()
 
+        # 7. 토큰 수 계산
+        prompt_token_budget_example()
+
         print("\n" + "=" * 60)
         print("✓ 모든 Prompts 예제 완료!")
         print("=" * 60)
@@ -9,16 +9,1757 @@ Datasets는 테스트 케이스를 관리하고 모델 성능을 평가하는 
 2. 모델 평가 자동화
 3. 회귀 테스트
 4. 벤치마킹 및 성능 비교
+5. 대규모 데이터셋 동시 평가 (재시도, 타임아웃, 체크포인트)
+6. 컬럼 기반 결과 저장 및 벡터화 집계
+7. 메모리보다 큰 데이터셋 스트리밍 로딩
+8. 콘텐츠 해시 기반 데이터셋 아이템 일괄 동기화
+9. 결정적 재평가를 위한 Generation 결과 캐시
+10. 부트스트랩 신뢰구간 기반 회귀 감지
+11. 정규화 캐시를 사용하는 일괄 정답 매칭
+12. 다중 프로세스 샤딩 벤치마크
+13. 층화/적응형 샘플링 평가
 """
 
 import os
-from datetime import datetime
+import re
+import json
+import math
+import string
+import time
+import heapq
+import hashlib
+import random
+import asyncio
+import sqlite3
+import queue
+import tempfile
+import itertools
+import threading
+from statistics import NormalDist
+from collections import Counter, deque
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
 from dotenv import load_dotenv
 from langfuse import Langfuse
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # 선택 의존성: Parquet 내보내기에만 필요
+    pa = None
+    pq = None
+
 load_dotenv()
 
 
+# ============================================================
+# 스트리밍 데이터셋 소스 (Streaming Dataset Source)
+# ============================================================
+
+class StreamingDatasetSource:
+    """
+    메모리에 다 올릴 수 없는 데이터셋을 지연 로딩하는 이터러블
+
+    JSONL 파일, Parquet 파일, Langfuse 데이터셋 API 페이지를 읽어
+    아이템 dict(input, expected_output, metadata, id)를 하나씩 내보냅니다.
+    백그라운드 스레드가 크기 제한(buffer_size)이 있는 큐에 미리 읽어 두므로
+    평가 루프는 I/O를 기다리지 않고, 메모리 사용량은 버퍼 크기로 제한됩니다.
+    """
+
+    _END = object()
+
+    def __init__(self, reader: Callable[[], Iterable[Dict[str, Any]]], buffer_size: int = 1024):
+        self.reader = reader
+        self.buffer_size = buffer_size
+
+    @classmethod
+    def from_jsonl(cls, path: str, buffer_size: int = 1024) -> "StreamingDatasetSource":
+        def read():
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        return cls(read, buffer_size)
+
+    @classmethod
+    def from_parquet(
+        cls, path: str, batch_size: int = 4096, buffer_size: int = 1024
+    ) -> "StreamingDatasetSource":
+        if pq is None:
+            raise ImportError("pyarrow가 필요합니다: pip install pyarrow")
+
+        def read():
+            parquet_file = pq.ParquetFile(path)
+            for record_batch in parquet_file.iter_batches(batch_size=batch_size):
+                yield from record_batch.to_pylist()
+        return cls(read, buffer_size)
+
+    @classmethod
+    def from_langfuse(cls, langfuse: Langfuse, dataset_name: str, page_size: int = 100,
+                      buffer_size: int = 1024) -> "StreamingDatasetSource":
+        """Langfuse 데이터셋 아이템을 페이지 단위로 가져옵니다"""
+        def read():
+            page = 1
+            while True:
+                response = langfuse.client.dataset_items.list(
+                    dataset_name=dataset_name, page=page, limit=page_size
+                )
+                for item in response.data:
+                    yield {
+                        "id": item.id,
+                        "input": item.input,
+                        "expected_output": item.expected_output,
+                        "metadata": item.metadata or {}
+                    }
+                if page >= response.meta.total_pages:
+                    break
+                page += 1
+        return cls(read, buffer_size)
+
+    def __iter__(self):
+        buffer = queue.Queue(maxsize=self.buffer_size)
+        stop = threading.Event()
+
+        def put(value) -> bool:
+            while not stop.is_set():
+                try:
+                    buffer.put(value, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def prefetch():
+            try:
+                for item in self.reader():
+                    if not put(item):
+                        return
+                put(self._END)
+            except Exception as e:
+                put(e)
+
+        thread = threading.Thread(target=prefetch, name="dataset-prefetch", daemon=True)
+        thread.start()
+
+        try:
+            while True:
+                item = buffer.get()
+                if item is self._END:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # 소비자가 중간에 멈추면 프리페치 스레드도 종료합니다
+            stop.set()
+
+    def batches(self, size: int):
+        """size개씩 묶어서 내보냅니다"""
+        iterator = iter(self)
+        while True:
+            batch = list(itertools.islice(iterator, size))
+            if not batch:
+                return
+            yield batch
+
+
+# ============================================================
+# 데이터셋 아이템 일괄 동기화 (Bulk Upsert)
+# ============================================================
+
+def item_content_hash(item: Dict[str, Any]) -> str:
+    """input과 expected_output의 정규화된 JSON으로 만든 SHA-256 해시"""
+    payload = json.dumps(
+        {"input": item.get('input'), "expected_output": item.get('expected_output')},
+        sort_keys=True, ensure_ascii=False, separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def item_stable_id(item: Dict[str, Any]) -> str:
+    """아이템 id가 없으면 input 해시로 고정 id를 만듭니다 (정답이 바뀌어도 같은 아이템)"""
+    if item.get('id'):
+        return str(item['id'])
+    payload = json.dumps(item.get('input'), sort_keys=True, ensure_ascii=False)
+    return "item_" + hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+class DatasetItemSyncer:
+    """
+    로컬 데이터셋을 Langfuse 데이터셋과 동기화하는 일괄 업서트 파이프라인
+
+    각 아이템의 콘텐츠 해시를 기존 아이템 해시와 비교해 변경되지 않은 아이템은
+    건너뛰고, 새로 추가되거나 변경된 아이템만 동시 배치로 업로드합니다.
+    기존 해시는 로컬 manifest 파일에서 읽고, 없으면 API에서 페이지 단위로 가져옵니다.
+    """
+
+    def __init__(self, langfuse: Langfuse, dataset_name: str, manifest_path: Optional[str] = None,
+                 batch_size: int = 100, max_workers: int = 8):
+        self.langfuse = langfuse
+        self.dataset_name = dataset_name
+        self.manifest_path = manifest_path
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+
+    def load_existing_hashes(self) -> Dict[str, str]:
+        if self.manifest_path and os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding="utf-8") as f:
+                return json.load(f)
+
+        return {
+            item['id']: item_content_hash(item)
+            for item in StreamingDatasetSource.from_langfuse(self.langfuse, self.dataset_name)
+        }
+
+    def _save_manifest(self, hashes: Dict[str, str]):
+        if not self.manifest_path:
+            return
+        temp_path = self.manifest_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(hashes, f)
+        os.replace(temp_path, self.manifest_path)
+
+    def _upload_batch(self, batch: List[tuple]) -> List[tuple]:
+        """배치를 업로드하고 (id, hash, error) 목록을 반환합니다"""
+        uploaded = []
+        for item_id, content_hash, item in batch:
+            try:
+                self.langfuse.create_dataset_item(
+                    dataset_name=self.dataset_name,
+                    id=item_id,
+                    input=item.get('input'),
+                    expected_output=item.get('expected_output'),
+                    metadata={**(item.get('metadata') or {}), "content_hash": content_hash}
+                )
+                uploaded.append((item_id, content_hash, None))
+            except Exception as e:
+                uploaded.append((item_id, content_hash, f"{type(e).__name__}: {e}"))
+        return uploaded
+
+    def sync(self, items: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        아이템을 동기화하고 통계(new, changed, unchanged, failed, items_per_sec 등)를 반환합니다.
+
+        실패한 아이템은 manifest에 기록하지 않으므로 다음 동기화 때 다시 업로드됩니다.
+        """
+        start = time.monotonic()
+        existing = self.load_existing_hashes()
+        hashes = dict(existing)
+
+        stats = {"new": 0, "changed": 0, "unchanged": 0, "failed": 0, "errors": []}
+        uploaded_count = 0
+
+        def changed_batches():
+            batch = []
+            for item in items:
+                item_id = item_stable_id(item)
+                content_hash = item_content_hash(item)
+                previous = existing.get(item_id)
+
+                if previous == content_hash:
+                    stats["unchanged"] += 1
+                    continue
+
+                stats["new" if previous is None else "changed"] += 1
+                batch.append((item_id, content_hash, item))
+                if len(batch) >= self.batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            # 진행 중인 배치 수를 제한해 입력 전체를 메모리에 올리지 않습니다
+            in_flight = set()
+            for batch in changed_batches():
+                if len(in_flight) >= self.max_workers * 2:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    uploaded_count += self._collect(done, hashes, stats)
+                in_flight.add(pool.submit(self._upload_batch, batch))
+            uploaded_count += self._collect(in_flight, hashes, stats)
+
+        self.langfuse.flush()
+        self._save_manifest(hashes)
+
+        elapsed = time.monotonic() - start
+        stats["elapsed"] = elapsed
+        stats["uploaded"] = uploaded_count
+        stats["scanned"] = stats["new"] + stats["changed"] + stats["unchanged"]
+        stats["items_per_sec"] = stats["scanned"] / elapsed if elapsed > 0 else 0.0
+        stats["uploads_per_sec"] = uploaded_count / elapsed if elapsed > 0 else 0.0
+        return stats
+
+    @staticmethod
+    def _collect(futures, hashes: Dict[str, str], stats: Dict[str, Any]) -> int:
+        uploaded = 0
+        for future in futures:
+            for item_id, content_hash, error in future.result():
+                if error is None:
+                    hashes[item_id] = content_hash
+                    uploaded += 1
+                else:
+                    stats["failed"] += 1
+                    stats["errors"].append((item_id, error))
+        return uploaded
+
+
+# ============================================================
+# 컬럼 기반 결과 저장소 (Columnar Run Result Store)
+# ============================================================
+
+class RunResultStore:
+    """
+    데이터셋 실행 결과를 NumPy 배열로 저장하는 컬럼 저장소
+
+    문자열 컬럼(category, model, difficulty)은 사전 인코딩(int32 코드)으로,
+    수치 컬럼(correct, score, latency)은 연속 배열로 저장합니다.
+    배열은 용량을 두 배씩 늘려 append가 상수 시간에 가깝게 동작합니다.
+    """
+
+    CATEGORICAL_COLUMNS = ("item_id", "category", "model", "difficulty")
+    NUMERIC_COLUMNS = {"correct": np.bool_, "score": np.float64, "latency": np.float64}
+
+    def __init__(self, capacity: int = 1024):
+        self._size = 0
+        self._capacity = capacity
+        self._vocab: Dict[str, Dict[Any, int]] = {name: {} for name in self.CATEGORICAL_COLUMNS}
+        self._columns: Dict[str, np.ndarray] = {
+            name: np.zeros(capacity, dtype=np.int32) for name in self.CATEGORICAL_COLUMNS
+        }
+        for name, dtype in self.NUMERIC_COLUMNS.items():
+            self._columns[name] = np.zeros(capacity, dtype=dtype)
+
+    def __len__(self):
+        return self._size
+
+    @classmethod
+    def from_results(cls, results: Iterable[Dict[str, Any]], **defaults) -> "RunResultStore":
+        """결과 dict 목록으로 저장소를 만듭니다 (defaults로 model 등 공통 값 지정)"""
+        store = cls()
+        store.extend({**defaults, **result} for result in results)
+        return store
+
+    def _grow(self, required: int):
+        if required <= self._capacity:
+            return
+        capacity = self._capacity
+        while capacity < required:
+            capacity *= 2
+        for name, column in self._columns.items():
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
+        self._capacity = capacity
+
+    def _encode(self, name: str, value: Any) -> int:
+        vocab = self._vocab[name]
+        code = vocab.get(value)
+        if code is None:
+            code = len(vocab)
+            vocab[value] = code
+        return code
+
+    def append(self, row: Dict[str, Any]):
+        self.extend([row])
+
+    def extend(self, rows: Iterable[Dict[str, Any]]):
+        """여러 행을 추가합니다 (행 단위 dict 대신 컬럼 리스트로 모은 뒤 한 번에 기록)"""
+        buffers: Dict[str, list] = {name: [] for name in self._columns}
+        for row in rows:
+            for name in self.CATEGORICAL_COLUMNS:
+                buffers[name].append(self._encode(name, row.get(name)))
+            buffers["correct"].append(bool(row.get("correct", False)))
+            buffers["score"].append(float(row.get("score", 1.0 if row.get("correct") else 0.0)))
+            latency = row.get("latency")
+            buffers["latency"].append(np.nan if latency is None else float(latency))
+
+        count = len(buffers["correct"])
+        if count == 0:
+            return
+
+        self._grow(self._size + count)
+        for name, values in buffers.items():
+            self._columns[name][self._size:self._size + count] = values
+        self._size += count
+
+    def column(self, name: str) -> np.ndarray:
+        """컬럼 배열 (복사 없이 뷰를 반환)"""
+        return self._columns[name][:self._size]
+
+    def decode(self, name: str) -> List[Any]:
+        """사전 인코딩된 컬럼의 코드 → 값 목록"""
+        values = [None] * len(self._vocab[name])
+        for value, code in self._vocab[name].items():
+            values[code] = value
+        return values
+
+    def group_by(
+        self, keys: Sequence[str], percentiles: Sequence[float] = (50, 95, 99)
+    ) -> List[Dict[str, Any]]:
+        """
+        keys 컬럼으로 그룹화하여 정확도, 평균 점수, 레이턴시 백분위수를 계산합니다.
+
+        그룹 코드 계산, 건수/합계(bincount), 백분위수(lexsort 후 인덱스 보간)가
+        모두 벡터 연산이라 수백만 행도 몇 초 안에 집계됩니다.
+        """
+        if self._size == 0:
+            return []
+
+        keys = list(keys)
+        if keys:
+            sizes = [max(len(self._vocab[key]), 1) for key in keys]
+            combined = np.ravel_multi_index([self.column(key) for key in keys], sizes)
+            group_codes, inverse = np.unique(combined, return_inverse=True)
+            group_values = np.unravel_index(group_codes, sizes)
+        else:
+            group_codes = np.zeros(1, dtype=np.int64)
+            inverse = np.zeros(self._size, dtype=np.int64)
+            group_values = []
+
+        group_count = len(group_codes)
+        counts = np.bincount(inverse, minlength=group_count)
+        correct = np.bincount(inverse, weights=self.column("correct"), minlength=group_count)
+        score_sum = np.bincount(inverse, weights=self.column("score"), minlength=group_count)
+
+        # 레이턴시 백분위수: (그룹, 레이턴시) 순 정렬 후 각 그룹 구간에서 선형 보간
+        latency = self.column("latency")
+        valid = ~np.isnan(latency)
+        latency_groups = inverse[valid]
+        order = np.lexsort((latency[valid], latency_groups))
+        sorted_latency = latency[valid][order]
+        latency_counts = np.bincount(latency_groups, minlength=group_count)
+        starts = np.concatenate(([0], np.cumsum(latency_counts)[:-1]))
+
+        spans = np.maximum(latency_counts - 1, 0)
+        last_index = max(len(sorted_latency) - 1, 0)
+
+        latency_percentiles = {}
+        for q in percentiles:
+            if len(sorted_latency) == 0:
+                latency_percentiles[f"latency_p{q:g}"] = np.full(group_count, np.nan)
+                continue
+            position = starts + spans * (q / 100.0)
+            lower = np.minimum(np.floor(position).astype(np.int64), last_index)
+            upper = np.minimum(np.minimum(lower + 1, starts + spans), last_index)
+            fraction = position - lower
+            values = sorted_latency[lower] * (1 - fraction) + sorted_latency[upper] * fraction
+            latency_percentiles[f"latency_p{q:g}"] = np.where(latency_counts > 0, values, np.nan)
+
+        decoded = [self.decode(key) for key in keys]
+        rows = []
+        for g in range(group_count):
+            row = {key: decoded[k][group_values[k][g]] for k, key in enumerate(keys)}
+            row["count"] = int(counts[g])
+            row["accuracy"] = float(correct[g] / counts[g])
+            row["mean_score"] = float(score_sum[g] / counts[g])
+            for name, values in latency_percentiles.items():
+                row[name] = float(values[g])
+            rows.append(row)
+        return rows
+
+    def to_arrow(self):
+        """pyarrow Table로 변환합니다 (문자열 컬럼은 DictionaryArray)"""
+        if pa is None:
+            raise ImportError("pyarrow가 필요합니다: pip install pyarrow")
+
+        arrays = {}
+        for name in self.CATEGORICAL_COLUMNS:
+            codes = self.column(name)
+            null_code = self._vocab[name].get(None)
+            mask = codes == null_code if null_code is not None else None
+            dictionary = pa.array(
+                ["" if v is None else str(v) for v in self.decode(name)], type=pa.string()
+            )
+            arrays[name] = pa.DictionaryArray.from_arrays(pa.array(codes, mask=mask), dictionary)
+        for name in self.NUMERIC_COLUMNS:
+            arrays[name] = pa.array(self.column(name))
+        return pa.table(arrays)
+
+    def to_parquet(self, path: str):
+        """Parquet 파일로 내보냅니다"""
+        pq.write_table(self.to_arrow(), path)
+
+
+def print_group_stats(rows: List[Dict[str, Any]], keys: Sequence[str], indent: str = "    "):
+    """group_by 결과를 출력합니다"""
+    for row in rows:
+        label = " / ".join(str(row[key]) for key in keys)
+        correct = round(row['accuracy'] * row['count'])
+        line = f"{indent}- {label}: {correct}/{row['count']} ({row['accuracy']*100:.1f}%)"
+        if not np.isnan(row.get('latency_p50', np.nan)):
+            line += f", p50={row['latency_p50']*1000:.1f}ms, p95={row['latency_p95']*1000:.1f}ms"
+        print(line)
+
+
+# ============================================================
+# Generation 결과 캐시 (Generation Result Cache)
+# ============================================================
+
+class GenerationCache:
+    """
+    (model, model_parameters, 렌더링된 input)을 키로 하는 SQLite 응답 캐시
+
+    - 키는 세 값을 정규화한 JSON의 SHA-256 해시 (콘텐츠 주소 방식)
+    - 전체 크기가 max_bytes를 넘으면 가장 오래 사용되지 않은 항목부터 삭제 (LRU)
+    - deterministic_only=True이면 temperature=0 호출만 캐시합니다
+    - 적중 시 last_access 갱신은 메모리에 모았다가 flush_interval초 또는 max_pending개마다,
+      그리고 삽입/삭제 전에 한 트랜잭션으로 반영합니다
+    - 캐시에 없으면 None이 아닌 GenerationCache.MISS를 반환하므로 None 응답도 캐시됩니다
+    """
+
+    MISS = object()
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 256 * 1024 * 1024,
+        deterministic_only: bool = True,
+        flush_interval: float = 1.0,
+        max_pending: int = 1024,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.deterministic_only = deterministic_only
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.hits = 0
+        self.misses = 0
+        self._pending_access: Dict[str, float] = {}
+        self._last_flush = time.monotonic()
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS generations ("
+            "  key TEXT PRIMARY KEY,"
+            "  output TEXT NOT NULL,"
+            "  size INTEGER NOT NULL,"
+            "  last_access REAL NOT NULL"
+            ")"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON generations(last_access)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM generations"
+        ).fetchone()[0]
+
+    @staticmethod
+    def make_key(model: str, model_parameters: Optional[Dict[str, Any]], input: Any) -> str:
+        payload = json.dumps(
+            [model, model_parameters or {}, input],
+            sort_keys=True, ensure_ascii=False, separators=(",", ":")
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def is_cacheable(self, model_parameters: Optional[Dict[str, Any]]) -> bool:
+        if not self.deterministic_only:
+            return True
+        # OpenAI 기본 temperature는 1이므로 명시적으로 0인 경우만 결정적 호출로 봅니다
+        return (model_parameters or {}).get("temperature") == 0
+
+    def get(self, key: str) -> Any:
+        """캐시된 출력을 반환합니다 (없으면 GenerationCache.MISS)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT output FROM generations WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return self.MISS
+            self._pending_access[key] = time.time()
+            if (len(self._pending_access) >= self.max_pending
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush_access()
+                self._conn.commit()
+            self.hits += 1
+            return json.loads(row[0])
+
+    def _flush_access(self):
+        """모아둔 last_access 갱신을 반영합니다 (호출자가 lock을 잡고 commit)"""
+        if self._pending_access:
+            self._conn.executemany(
+                "UPDATE generations SET last_access = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._pending_access.items()]
+            )
+            self._pending_access.clear()
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            self._flush_access()
+            self._conn.commit()
+
+    def put(self, key: str, output: Any):
+        encoded = json.dumps(output, ensure_ascii=False)
+        size = len(encoded.encode("utf-8"))
+
+        with self._lock:
+            self._flush_access()
+            previous = self._conn.execute(
+                "SELECT size FROM generations WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO generations (key, output, size, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (key, encoded, size, time.time()),
+            )
+            self._total_bytes += size - (previous[0] if previous else 0)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM generations ORDER BY last_access LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self._total_bytes <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM generations WHERE key = ?", (key,))
+                self._total_bytes -= size
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM generations").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": self._total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+
+def cached_generation(trace, cache: GenerationCache, name: str, model: str,
+                      model_parameters: Optional[Dict[str, Any]], input: Any,
+                      call_model: Callable[[], Any]) -> Any:
+    """
+    캐시를 거쳐 모델을 호출하고 Generation으로 기록합니다.
+
+    캐시 적중도 일반 호출과 같은 Generation으로 남기되, metadata에 cache_hit과
+    cache_key를 기록하고 시작/종료 시각을 같게 하여 지연 시간이 0에 가깝게 보입니다.
+    call_model이 예외를 던지면 Generation을 level="ERROR"로 끝내고 예외를 다시 던집니다.
+    """
+    cacheable = cache.is_cacheable(model_parameters)
+    key = cache.make_key(model, model_parameters, input)
+
+    cached_output = cache.get(key) if cacheable else GenerationCache.MISS
+    if cached_output is not GenerationCache.MISS:
+        now = datetime.now()
+        trace.generation(
+            name=name,
+            model=model,
+            model_parameters=model_parameters,
+            input=input,
+            output=cached_output,
+            start_time=now,
+            end_time=now,
+            metadata={"cache_hit": True, "cache_key": key}
+        )
+        return cached_output
+
+    generation = trace.generation(
+        name=name,
+        model=model,
+        model_parameters=model_parameters,
+        input=input,
+        metadata={"cache_hit": False, "cache_key": key, "cacheable": cacheable}
+    )
+    try:
+        output = call_model()
+    except Exception as e:
+        generation.end(level="ERROR", status_message=f"{type(e).__name__}: {e}")
+        raise
+    generation.end(output=output)
+
+    if cacheable:
+        cache.put(key, output)
+    return output
+
+
+# ============================================================
+# 통계적 회귀 감지 (Statistical Regression Engine)
+# ============================================================
+
+class RegressionBaseline:
+    """
+    이전 실행의 아이템별 결과(정답 여부, 레이턴시)를 저장하는 기준선
+    """
+
+    def __init__(self, version: str, items: Optional[Dict[str, Dict[str, float]]] = None):
+        self.version = version
+        self.items = items or {}
+
+    @classmethod
+    def from_results(cls, version: str, results: Iterable[Dict[str, Any]]) -> "RegressionBaseline":
+        return cls(
+            version,
+            {
+                str(result['item_id']): {
+                    "correct": float(result['correct']),
+                    "latency": float(result['latency']),
+                }
+                for result in results
+            },
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "RegressionBaseline":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data['version'], data['items'])
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.version, "items": self.items}, f)
+
+
+class RegressionMonitor:
+    """
+    기준선과 새 실행을 아이템 단위로 짝지어 비교하는 회귀 감지기
+
+    아이템이 끝날 때마다 observe()로 결과를 넣으면, 확인 시점마다 짝지어진
+    아이템들로 정확도 차이와 레이턴시 백분위수 차이의 신뢰구간을 계산합니다.
+    신뢰구간 전체가 허용 범위를 벗어나면(회귀가 통계적으로 확실하면)
+    verdict를 반환하여 실행을 조기 중단할 수 있습니다.
+
+    부트스트랩은 Poisson(1) 가중치 온라인 방식입니다. 아이템마다 n_bootstrap개 복제본의
+    가중치를 뽑아 누적값(정답 차이 합, 로그 간격 레이턴시 히스토그램)만 갱신하므로
+    메모리와 확인 비용이 아이템 수와 무관합니다. 복제본의 표준오차로 구간을 만듭니다.
+
+    여러 번 확인해도 전체 오탐률이 1 - confidence를 넘지 않도록 alpha를 나눠 씁니다.
+    checkpoints를 정하면 그 시점에서만 확인하며 alpha를 균등하게 나누고, 정하지 않으면
+    min_items 이후 check_interval마다 확인하며 k번째 확인에 alpha * 6 / (π² k²)를 씁니다.
+    evaluate()를 직접 호출하는 것도 한 번의 확인으로 셉니다. 마지막 확인 이후 새 아이템이
+    없으면 이전 결과를 그대로 반환하고, checkpoints 수를 넘는 확인은 확인 횟수로 alpha를 나눕니다.
+    """
+
+    def __init__(self, baseline: RegressionBaseline, confidence: float = 0.95,
+                 n_bootstrap: int = 1000, accuracy_margin: float = 0.0,
+                 latency_percentile: float = 95, latency_margin: float = 0.0,
+                 min_items: int = 30, check_interval: int = 25,
+                 checkpoints: Optional[Sequence[int]] = None, seed: int = 0,
+                 latency_range: tuple = (1e-3, 1e3), latency_bins: int = 256):
+        self.baseline = baseline
+        self.confidence = confidence
+        self.n_bootstrap = n_bootstrap
+        self.accuracy_margin = accuracy_margin
+        self.latency_percentile = latency_percentile
+        self.latency_margin = latency_margin
+        self.min_items = min_items
+        self.check_interval = check_interval
+        self.checkpoints = sorted(set(checkpoints)) if checkpoints else None
+        self._rng = np.random.default_rng(seed)
+
+        # 0번 행은 가중치 1(원본 표본), 나머지는 부트스트랩 복제본
+        rows = n_bootstrap + 1
+        self._edges = np.geomspace(latency_range[0], latency_range[1], latency_bins + 1)
+        self._centers = np.sqrt(self._edges[:-1] * self._edges[1:])
+        self._weight = np.zeros(rows)
+        self._diff = np.zeros(rows)
+        self._base_correct = np.zeros(rows)
+        self._base_hist = np.zeros((rows, latency_bins), dtype=np.float32)
+        self._new_hist = np.zeros((rows, latency_bins), dtype=np.float32)
+        self._pending: List[tuple] = []
+        self.paired = 0
+        self.unpaired = 0
+        self.looks = 0
+        self._last_report: Optional[Dict[str, Any]] = None
+
+    def observe(self, item_id: Any, correct: bool, latency: float) -> Optional[Dict[str, Any]]:
+        """
+        아이템 결과를 추가합니다. 회귀가 확실해지면 평가 결과를 반환합니다.
+        """
+        base = self.baseline.items.get(str(item_id))
+        if base is None:
+            self.unpaired += 1
+            return None
+
+        self._pending.append((base['correct'], base['latency'], float(correct), float(latency)))
+        self.paired += 1
+        if len(self._pending) >= self.check_interval:
+            self._absorb()
+
+        if self.checkpoints is not None:
+            if self.paired not in self.checkpoints:
+                return None
+        elif self.paired < self.min_items or self.paired % self.check_interval != 0:
+            return None
+
+        report = self.evaluate()
+        return report if report['regressions'] else None
+
+    def _bin(self, latency: float) -> int:
+        index = int(np.searchsorted(self._edges, latency, side="right")) - 1
+        return min(max(index, 0), len(self._centers) - 1)
+
+    def _absorb(self):
+        """대기 중인 아이템을 복제본 누적값에 반영합니다"""
+        if not self._pending:
+            return
+        weights = self._rng.poisson(1.0, size=(len(self._pending), self.n_bootstrap + 1)).astype(
+            np.float64
+        )
+        weights[:, 0] = 1.0
+        for w, (base_correct, base_latency, new_correct, new_latency) in zip(
+            weights, self._pending
+        ):
+            self._weight += w
+            self._diff += w * (new_correct - base_correct)
+            self._base_correct += w * base_correct
+            self._base_hist[:, self._bin(base_latency)] += w
+            self._new_hist[:, self._bin(new_latency)] += w
+        self._pending.clear()
+
+    def _percentiles(self, hist: np.ndarray) -> np.ndarray:
+        """행별 가중 히스토그램의 백분위수 (빈 중심값 기준)"""
+        cumulative = np.cumsum(hist, axis=1)
+        targets = cumulative[:, -1:] * (self.latency_percentile / 100.0)
+        index = (cumulative < targets).sum(axis=1)
+        return self._centers[np.minimum(index, len(self._centers) - 1)]
+
+    def _look_alpha(self) -> float:
+        alpha = 1 - self.confidence
+        if self.checkpoints is not None:
+            return alpha / max(len(self.checkpoints), self.looks)
+        return alpha * 6 / (math.pi ** 2 * self.looks ** 2)
+
+    def evaluate(self) -> Dict[str, Any]:
+        """현재까지 짝지어진 아이템으로 신뢰구간과 회귀 여부를 계산합니다 (확인 1회로 셈)"""
+        self._absorb()
+        report = {"paired_items": self.paired, "unpaired_items": self.unpaired, "regressions": []}
+        if self.paired == 0:
+            return report
+        if self._last_report is not None and self._last_report['paired_items'] == self.paired:
+            return self._last_report
+
+        self.looks += 1
+        look_alpha = self._look_alpha()
+        z = NormalDist().inv_cdf(1 - look_alpha / 2)
+        report["look"] = self.looks
+        report["look_alpha"] = look_alpha
+
+        valid = self._weight > 0
+        accuracy_diffs = self._diff[valid] / self._weight[valid]
+        q = self.latency_percentile
+        base_latency = self._percentiles(self._base_hist[valid])
+        new_latency = self._percentiles(self._new_hist[valid])
+        latency_diffs = new_latency - base_latency
+
+        def interval(samples):
+            estimate, se = samples[0], samples[1:].std(ddof=1)
+            return float(estimate - z * se), float(estimate + z * se)
+
+        report["baseline_accuracy"] = float(self._base_correct[0] / self._weight[0])
+        report["new_accuracy"] = report["baseline_accuracy"] + float(accuracy_diffs[0])
+        report["accuracy_diff"] = float(accuracy_diffs[0])
+        report["accuracy_ci"] = interval(accuracy_diffs)
+
+        report[f"baseline_latency_p{q:g}"] = float(base_latency[0])
+        report[f"new_latency_p{q:g}"] = float(new_latency[0])
+        report["latency_diff"] = float(latency_diffs[0])
+        report["latency_ci"] = interval(latency_diffs)
+
+        if report["accuracy_ci"][1] < -self.accuracy_margin:
+            report["regressions"].append("accuracy")
+        if report["latency_ci"][0] > self.latency_margin:
+            report["regressions"].append(f"latency_p{q:g}")
+        self._last_report = report
+        return report
+
+
+# ============================================================
+# 정답 매칭 (Answer Matching)
+# ============================================================
+
+_ARTICLES = re.compile(r"\b(a|an|the)\b")
+_PUNCTUATION = str.maketrans("", "", string.punctuation)
+_NUMBER = re.compile(r"[-+]?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?(?:[eE][-+]?\d+)?")
+
+
+@lru_cache(maxsize=64)
+def _choice_patterns(options: str) -> List[re.Pattern]:
+    """선택지 문자 집합용 정규식 (문자 뒤에는 구분자나 문자열 끝이 와야 함)"""
+    letter = f"([{re.escape(options)}])"
+    end = r"(?=[\s.,):]|$)"
+    return [
+        re.compile(rf"(?i:answer|option|choice)\s*(?:(?i:is)|:)?\s*\(?{letter}\)?{end}"),
+        re.compile(rf"^\s*\(?{letter}[).:]"),
+        re.compile(rf"^\s*{letter}\s*$"),
+        re.compile(rf"\({letter}\)"),
+        # 'Answer: I think B'처럼 키워드와 선택지 사이에 다른 말이 있는 경우 (같은 문장 안)
+        re.compile(rf"(?i:answer|option|choice)\b[^.\n]*?(?<![\w']){letter}\)?{end}"),
+    ]
+
+
+@lru_cache(maxsize=65536)
+def normalize_answer(text: str) -> str:
+    """소문자화, 구두점/관사 제거, 공백 정리 (같은 문자열은 한 번만 정규화)"""
+    text = text.lower().translate(_PUNCTUATION)
+    text = _ARTICLES.sub(" ", text)
+    return " ".join(text.split())
+
+
+@lru_cache(maxsize=65536)
+def _answer_tokens(text: str) -> Counter:
+    return Counter(normalize_answer(text).split())
+
+
+@lru_cache(maxsize=65536)
+def parse_number(text: str) -> float:
+    """텍스트에서 첫 번째 숫자를 꺼냅니다 (없으면 NaN)"""
+    match = _NUMBER.search(text)
+    if match is None:
+        return float("nan")
+    return float(match.group(0).replace(",", ""))
+
+
+@lru_cache(maxsize=65536)
+def extract_choice(text: str, options: str = "ABCD") -> Optional[str]:
+    """
+    'The answer is B', '(C)', 'A) ...' 같은 응답에서 객관식 선택지 문자를 꺼냅니다
+
+    options에 없는 대문자('Answer: I think B'의 I)는 선택지로 보지 않습니다.
+    """
+    for pattern in _choice_patterns(options.upper()):
+        match = pattern.search(text)
+        if match:
+            return match.group(1).upper()
+    return None
+
+
+def _as_str_list(values: Iterable[Any]) -> List[str]:
+    return ["" if value is None else str(value) for value in values]
+
+
+def match_exact(predictions: Iterable[Any], references: Iterable[Any]) -> np.ndarray:
+    """문자열 완전 일치"""
+    return np.asarray(_as_str_list(predictions), dtype=object) == np.asarray(
+        _as_str_list(references), dtype=object
+    )
+
+
+def match_normalized(predictions: Iterable[Any], references: Iterable[Any]) -> np.ndarray:
+    """normalize_answer 적용 후 일치"""
+    return match_exact(
+        map(normalize_answer, _as_str_list(predictions)),
+        map(normalize_answer, _as_str_list(references))
+    )
+
+
+def match_contains(predictions: Iterable[Any], references: Iterable[Any]) -> np.ndarray:
+    """정규화된 정답이 정규화된 응답 안에 포함되는지"""
+    return np.fromiter(
+        (normalize_answer(ref) in normalize_answer(pred)
+         for pred, ref in zip(_as_str_list(predictions), _as_str_list(references))),
+        dtype=bool
+    )
+
+
+def match_numeric(predictions: Iterable[Any], references: Iterable[Any],
+                  rel_tol: float = 1e-6, abs_tol: float = 1e-9) -> np.ndarray:
+    """첫 번째 숫자끼리 허용 오차 내에서 비교 (숫자가 없으면 불일치)"""
+    predicted = np.fromiter(map(parse_number, _as_str_list(predictions)), dtype=np.float64)
+    expected = np.fromiter(map(parse_number, _as_str_list(references)), dtype=np.float64)
+    return np.isclose(predicted, expected, rtol=rel_tol, atol=abs_tol)
+
+
+def token_f1(predictions: Iterable[Any], references: Iterable[Any]) -> np.ndarray:
+    """정규화된 토큰 기준 F1 점수 (SQuAD 방식)"""
+    scores = []
+    for pred, ref in zip(_as_str_list(predictions), _as_str_list(references)):
+        pred_tokens = _answer_tokens(pred)
+        ref_tokens = _answer_tokens(ref)
+        common = sum((pred_tokens & ref_tokens).values())
+        if common == 0:
+            scores.append(float(not pred_tokens and not ref_tokens))
+            continue
+        precision = common / sum(pred_tokens.values())
+        recall = common / sum(ref_tokens.values())
+        scores.append(2 * precision * recall / (precision + recall))
+    return np.asarray(scores, dtype=np.float64)
+
+
+def match_multiple_choice(predictions: Iterable[Any], references: Iterable[Any],
+                          options: str = "ABCD") -> np.ndarray:
+    """응답에서 추출한 선택지 문자와 정답 문자를 비교"""
+    return match_exact(
+        (extract_choice(pred, options) or "" for pred in _as_str_list(predictions)),
+        (ref.strip().upper() for ref in _as_str_list(references))
+    )
+
+
+# ============================================================
+# 샤딩 벤치마크 (Sharded Benchmark)
+# ============================================================
+
+def shard_of(item_id: str, shard_count: int) -> int:
+    """
+    아이템 id의 SHA-256 해시로 샤드 번호를 정합니다.
+
+    파이썬 hash()는 프로세스마다 달라지므로 쓰지 않습니다.
+    """
+    digest = hashlib.sha256(str(item_id).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % shard_count
+
+
+def shard_result_path(output_dir: str, shard_index: int, shard_count: int) -> str:
+    return os.path.join(output_dir, f"shard-{shard_index:04d}-of-{shard_count:04d}.jsonl")
+
+
+def run_benchmark_shard(dataset_path: str, shard_index: int, shard_count: int, output_dir: str,
+                        task: Callable[[Dict[str, Any]], str], model: str,
+                        benchmark_name: str) -> Dict[str, Any]:
+    """
+    벤치마크의 shard_index번째 샤드(전체 shard_count개)를 실행합니다.
+
+    데이터셋 JSONL을 스트리밍으로 읽어 이 샤드에 배정된 아이템만 평가하고,
+    결과를 샤드 파일에 기록합니다. 임시 파일에 쓴 뒤 이름을 바꾸므로
+    완료된 샤드만 결과 파일로 보입니다. 별도 머신/잡에서 샤드별로 호출해도 됩니다.
+    """
+    langfuse = Langfuse()
+    start = time.time()
+
+    items = [
+        item for item in StreamingDatasetSource.from_jsonl(dataset_path)
+        if shard_of(item['id'], shard_count) == shard_index
+    ]
+
+    answers = []
+    latencies = []
+    for item in items:
+        item_start = time.perf_counter()
+        answers.append(task(item))
+        latencies.append(time.perf_counter() - item_start)
+
+    is_correct = match_multiple_choice(answers, [item['correct_answer'] for item in items])
+
+    final_path = shard_result_path(output_dir, shard_index, shard_count)
+    temp_path = final_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        for item, answer, correct, latency in zip(items, answers, is_correct, latencies):
+            trace = langfuse.trace(
+                name=f"benchmark_{item['id']}",
+                metadata={
+                    "benchmark_name": benchmark_name,
+                    "category": item['category'],
+                    "shard": f"{shard_index}/{shard_count}"
+                }
+            )
+            trace.generation(
+                name="multiple_choice_answer", model=model, input=item['question'], output=answer
+            )
+            trace.score(name="correctness", value=1.0 if correct else 0.0)
+
+            f.write(json.dumps({
+                "item_id": item['id'],
+                "category": item['category'],
+                "model": model,
+                "correct": bool(correct),
+                "latency": latency
+            }, ensure_ascii=False) + "\n")
+    os.replace(temp_path, final_path)
+
+    langfuse.flush()
+    return {"shard": shard_index, "items": len(items), "elapsed": time.time() - start}
+
+
+def run_sharded_benchmark(
+    dataset_path: str,
+    shard_count: int,
+    output_dir: str,
+    task: Callable[[Dict[str, Any]], str],
+    model: str,
+    benchmark_name: str,
+    processes: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    모든 샤드를 프로세스 풀에서 실행합니다 (task는 pickle 가능한 모듈 수준 함수여야 합니다)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=processes or os.cpu_count()) as pool:
+        futures = [
+            pool.submit(run_benchmark_shard, dataset_path, shard_index, shard_count,
+                        output_dir, task, model, benchmark_name)
+            for shard_index in range(shard_count)
+        ]
+        return [future.result() for future in futures]
+
+
+def merge_benchmark_shards(output_dir: str, shard_count: int) -> RunResultStore:
+    """
+    샤드 결과 파일을 모아 하나의 RunResultStore로 합칩니다.
+
+    누락된 샤드가 있으면 점수가 왜곡되므로 FileNotFoundError를 발생시킵니다.
+    """
+    paths = [shard_result_path(output_dir, i, shard_count) for i in range(shard_count)]
+    missing = [path for path in paths if not os.path.exists(path)]
+    if missing:
+        raise FileNotFoundError(f"누락된 샤드 결과: {', '.join(missing)}")
+
+    store = RunResultStore()
+    for path in paths:
+        store.extend(StreamingDatasetSource.from_jsonl(path))
+    return store
+
+
+def simulated_benchmark_model(item: Dict[str, Any]) -> str:
+    """
+    CPU를 사용하는 로컬 모델 시뮬레이션 (프로세스 풀에서 실행되도록 모듈 수준에 정의)
+    """
+    digest = item['question'].encode("utf-8")
+    for _ in range(1000):
+        digest = hashlib.sha256(digest).digest()
+    # 약 80% 정확도
+    if digest[0] < 205:
+        return f"The answer is {item['correct_answer']}"
+    return "The answer is Z"
+
+
+# ============================================================
+# 평가 샘플링 (Evaluation Sampling)
+# ============================================================
+
+def stratum_of(item: Dict[str, Any], keys: Sequence[str] = ("category", "difficulty")) -> tuple:
+    """metadata의 keys 값으로 층(stratum)을 정합니다"""
+    metadata = item.get('metadata') or {}
+    return tuple(metadata.get(key) for key in keys)
+
+
+def _z_value(confidence: float) -> float:
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+def wilson_interval(correct: int, total: int, confidence: float = 0.95):
+    """이항 비율의 Wilson 신뢰구간 (표본이 작거나 0%/100% 근처여도 안정적)"""
+    if total == 0:
+        return 0.0, 1.0
+    z = _z_value(confidence)
+    p = correct / total
+    denominator = 1 + z * z / total
+    center = (p + z * z / (2 * total)) / denominator
+    half_width = z * np.sqrt(p * (1 - p) / total + z * z / (4 * total * total)) / denominator
+    return float(center - half_width), float(center + half_width)
+
+
+def random_sample(
+    items: Sequence[Dict[str, Any]], budget: int, seed: int = 0
+) -> List[Dict[str, Any]]:
+    """고정 예산 단순 무작위 샘플링"""
+    rng = random.Random(seed)
+    return rng.sample(list(items), min(budget, len(items)))
+
+
+def stratified_sample(items: Sequence[Dict[str, Any]], budget: int,
+                      keys: Sequence[str] = ("category", "difficulty"),
+                      min_per_stratum: int = 2, seed: int = 0):
+    """
+    층 크기에 비례하여 예산을 배분하는 층화 샘플링
+
+    작은 층도 추정할 수 있도록 층마다 최소 min_per_stratum개를 뽑습니다.
+    (샘플, 층별 전체 크기)를 반환하며, 층별 크기는 estimate_accuracy의 가중치로 씁니다.
+    """
+    rng = random.Random(seed)
+    strata: Dict[tuple, List[Dict[str, Any]]] = {}
+    for item in items:
+        strata.setdefault(stratum_of(item, keys), []).append(item)
+
+    population = sum(len(members) for members in strata.values())
+    sample = []
+    for key, members in strata.items():
+        allocation = max(min_per_stratum, round(budget * len(members) / population))
+        sample.extend(rng.sample(members, min(allocation, len(members))))
+
+    strata_sizes = {key: len(members) for key, members in strata.items()}
+    return sample, strata_sizes
+
+
+def estimate_accuracy(
+    results: Iterable[Dict[str, Any]],
+    strata_sizes: Optional[Dict[tuple, int]] = None,
+    keys: Sequence[str] = ("category", "difficulty"),
+    confidence: float = 0.95,
+) -> Dict[str, Any]:
+    """
+    샘플 결과로 전체 정확도와 신뢰구간을 추정합니다.
+
+    strata_sizes가 없으면 단순 무작위 샘플(Wilson 구간)로, 있으면 층 크기 가중
+    평균과 층별 분산(유한 모집단 보정 포함)을 합친 정규 근사 구간으로 계산합니다.
+    결과 dict에는 item(원본 아이템)과 correct가 있어야 합니다.
+    """
+    per_stratum: Dict[tuple, List[int]] = {}
+    for result in results:
+        counts = per_stratum.setdefault(stratum_of(result['item'], keys), [0, 0])
+        counts[0] += int(bool(result['correct']))
+        counts[1] += 1
+
+    sampled = sum(total for _, total in per_stratum.values())
+    strata = {
+        key: {"correct": correct, "sampled": total, "accuracy": correct / total,
+              "ci": wilson_interval(correct, total, confidence)}
+        for key, (correct, total) in per_stratum.items()
+    }
+
+    if strata_sizes is None:
+        correct = sum(correct for correct, _ in per_stratum.values())
+        return {
+            "accuracy": correct / sampled if sampled else 0.0,
+            "ci": wilson_interval(correct, sampled, confidence),
+            "sampled": sampled,
+            "strata": strata
+        }
+
+    population = sum(strata_sizes.values())
+    accuracy = 0.0
+    variance = 0.0
+    for key, size in strata_sizes.items():
+        stats = strata.get(key)
+        if stats is None:
+            continue
+        weight = size / population
+        p, n = stats['accuracy'], stats['sampled']
+        accuracy += weight * p
+        if n > 1:
+            fpc = 1 - n / size
+            variance += weight * weight * p * (1 - p) / (n - 1) * fpc
+
+    half_width = _z_value(confidence) * np.sqrt(variance)
+    return {
+        "accuracy": accuracy,
+        "ci": (max(0.0, accuracy - half_width), min(1.0, accuracy + half_width)),
+        "sampled": sampled,
+        "strata": strata
+    }
+
+
+class AdaptiveSampler:
+    """
+    층별 정확도 추정치가 목표 정밀도에 도달하면 멈추는 적응형 샘플러
+
+    next_batch()는 Wilson 구간의 반폭이 target_half_width보다 넓은 층에서만
+    아이템을 뽑아 반환하고, observe()로 결과를 받아 구간을 갱신합니다.
+    모든 층이 목표에 도달하거나 층의 아이템을 다 쓰면 done이 됩니다.
+    """
+
+    def __init__(
+        self,
+        items: Sequence[Dict[str, Any]],
+        keys: Sequence[str] = ("category", "difficulty"),
+        target_half_width: float = 0.05,
+        confidence: float = 0.95,
+        batch_per_stratum: int = 10,
+        min_per_stratum: int = 20,
+        seed: int = 0,
+    ):
+        self.keys = tuple(keys)
+        self.target_half_width = target_half_width
+        self.confidence = confidence
+        self.batch_per_stratum = batch_per_stratum
+        self.min_per_stratum = min_per_stratum
+
+        rng = random.Random(seed)
+        self._remaining: Dict[tuple, List[Dict[str, Any]]] = {}
+        for item in items:
+            self._remaining.setdefault(stratum_of(item, self.keys), []).append(item)
+        for members in self._remaining.values():
+            rng.shuffle(members)
+
+        self.strata_sizes = {key: len(members) for key, members in self._remaining.items()}
+        self.results: List[Dict[str, Any]] = []
+        self._counts = {key: [0, 0] for key in self._remaining}
+
+    def _needs_more(self, key: tuple) -> bool:
+        correct, total = self._counts[key]
+        if not self._remaining[key]:
+            return False
+        if total < self.min_per_stratum:
+            return True
+        low, high = wilson_interval(correct, total, self.confidence)
+        return (high - low) / 2 > self.target_half_width
+
+    @property
+    def done(self) -> bool:
+        return not any(self._needs_more(key) for key in self._remaining)
+
+    def next_batch(self) -> List[Dict[str, Any]]:
+        batch = []
+        for key, members in self._remaining.items():
+            if self._needs_more(key):
+                take = min(self.batch_per_stratum, len(members))
+                batch.extend(members[-take:])
+                del members[-take:]
+        return batch
+
+    def observe(self, item: Dict[str, Any], correct: bool):
+        counts = self._counts[stratum_of(item, self.keys)]
+        counts[0] += int(bool(correct))
+        counts[1] += 1
+        self.results.append({"item": item, "correct": correct})
+
+    def estimate(self) -> Dict[str, Any]:
+        return estimate_accuracy(self.results, self.strata_sizes, self.keys, self.confidence)
+
+
+# ============================================================
+# 데이터셋 실행기 (Dataset Run Executor)
+# ============================================================
+
+def exact_match_scorer(item: Dict[str, Any], output: Any) -> float:
+    """정규화된 정확 일치 점수 (run_dataset_evaluation과 동일한 기준, 문자열이 아니면 str로 변환)"""
+    if output is None:
+        return 0.0
+    expected = str(item['expected_output']).strip().lower()
+    return 1.0 if str(output).strip().lower() == expected else 0.0
+
+
+class DatasetRunExecutor:
+    """
+    데이터셋 아이템을 동시에 평가하는 실행기
+
+    - 스레드 풀(run) 또는 asyncio(run_async)로 동시 실행
+    - 지수 백오프 재시도와 아이템별 타임아웃
+    - 결과를 batch_size 단위로 Langfuse에 기록하고 flush
+    - 체크포인트(JSONL) 파일로 중단된 실행 재개
+    - 리스트 또는 StreamingDatasetSource 같은 이터러블을 지연 소비
+
+    keep_results=False이면 결과 dict와 아이템 id를 메모리에 두지 않고, 집계용 수치 컬럼
+    (self.store, 아이템당 수십 바이트)과 배치 전송/체크포인트에만 남깁니다. 완료 여부는
+    입력 순서 위치의 비트맵(아이템당 1비트)으로 추적하므로, 체크포인트로 재개할 때는
+    같은 순서의 입력을 넘겨야 합니다.
+    스레드 모드의 타임아웃은 작업이 워커에서 시작된 시점부터 재며, 타임아웃된 작업은
+    결과만 버려지고 스레드는 끝날 때까지 실행됩니다 (run() 참고).
+    """
+
+    def __init__(
+        self,
+        langfuse: Langfuse,
+        run_name: str,
+        model_name: str,
+        scorer: Callable[[Dict[str, Any], str], float] = exact_match_scorer,
+        max_workers: int = 8,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        item_timeout: float = 30.0,
+        batch_size: int = 100,
+        checkpoint_path: Optional[str] = None,
+        progress_interval: int = 100,
+        keep_results: bool = True,
+        max_stuck_workers: Optional[int] = None
+    ):
+        self.langfuse = langfuse
+        self.run_name = run_name
+        self.model_name = model_name
+        self.scorer = scorer
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.item_timeout = item_timeout
+        self.batch_size = batch_size
+        self.checkpoint_path = checkpoint_path
+        self.progress_interval = progress_interval
+        self.keep_results = keep_results
+        self.max_stuck_workers = max_workers if max_stuck_workers is None else max_stuck_workers
+        self.timed_out = 0
+        self.replaced_pools = 0
+
+        self.results: List[Dict[str, Any]] = []
+        self.store = RunResultStore()
+        self._batch: List[Dict[str, Any]] = []
+        self._completed = bytearray()
+        self._done = 0
+        self._positions: Dict[str, int] = {}
+        self._total = 0
+        self._resumed = 0
+        self._started_at = 0.0
+        self._send_lock = threading.Lock()
+
+    # --------------------------------------------------------
+    # 체크포인트
+    # --------------------------------------------------------
+
+    def _load_checkpoint(self):
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return
+
+        with open(self.checkpoint_path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                result = json.loads(line)
+                if self._mark_done(result['index']):
+                    self._store_result(result)
+                    if self.keep_results:
+                        self.results.append(result)
+
+    def _is_done(self, index: int) -> bool:
+        byte = index >> 3
+        return byte < len(self._completed) and bool(self._completed[byte] & (1 << (index & 7)))
+
+    def _mark_done(self, index: int) -> bool:
+        """index 위치를 완료로 표시합니다 (이미 완료였으면 False)"""
+        byte = index >> 3
+        if byte >= len(self._completed):
+            self._completed.extend(
+                bytes(max(byte + 1 - len(self._completed), len(self._completed)))
+            )
+        mask = 1 << (index & 7)
+        if self._completed[byte] & mask:
+            return False
+        self._completed[byte] |= mask
+        self._done += 1
+        return True
+
+    def _write_checkpoint(self, batch: List[Dict[str, Any]]):
+        if not self.checkpoint_path:
+            return
+
+        with open(self.checkpoint_path, "a", encoding="utf-8") as f:
+            for result in batch:
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _pending_items(self, items: Iterable[Dict[str, Any]]):
+        """
+        완료되지 않은 (item_id, item)을 차례로 꺼내는 이터레이터를 반환합니다.
+
+        items는 리스트뿐 아니라 StreamingDatasetSource 같은 이터러블이어도 되며,
+        아이템을 미리 모두 읽지 않습니다.
+        """
+        self._load_checkpoint()
+        self._total = len(items) if hasattr(items, "__len__") else None
+        self._resumed = self._done
+        self._started_at = time.monotonic()
+        if self._done:
+            print(f"  체크포인트에서 재개: {self._done}개 완료")
+
+        def pending():
+            for index, item in enumerate(items):
+                if self._is_done(index):
+                    continue
+                item_id = str(item.get('id', index))
+                # 입력 위치는 실행 중인 아이템에 대해서만 보관합니다 (_record에서 제거)
+                self._positions[item_id] = index
+                yield item_id, item
+
+        return pending()
+
+    # --------------------------------------------------------
+    # 결과 기록 및 배치 전송
+    # --------------------------------------------------------
+
+    def _record(self, item_id: str, item: Dict[str, Any], output: Optional[str],
+                error: Optional[str], started_at: datetime, latency: float, attempts: int):
+        score = self.scorer(item, output) if error is None else 0.0
+        metadata = item.get('metadata') or {}
+
+        result = {
+            "item_id": item_id,
+            "index": self._positions.pop(item_id),
+            "category": metadata.get('category'),
+            "difficulty": metadata.get('difficulty'),
+            "input": item['input'],
+            "expected": item['expected_output'],
+            "actual": output,
+            "correct": score >= 1.0,
+            "score": score,
+            "latency": latency,
+            "attempts": attempts,
+            "error": error,
+            "started_at": started_at.isoformat()
+        }
+
+        if self.keep_results:
+            self.results.append(result)
+        self._store_result(result)
+        self._mark_done(result['index'])
+        self._batch.append(result)
+        self._report_progress()
+
+    def _store_result(self, result: Dict[str, Any]):
+        self.store.append({
+            # keep_results=False이면 item_id 사전이 아이템 수만큼 커지지 않도록 저장하지 않음
+            "item_id": result['item_id'] if self.keep_results else None,
+            "category": result['category'],
+            "difficulty": result.get('difficulty'),
+            "model": self.model_name,
+            "correct": result['correct'],
+            "score": result['score'],
+            "latency": result['latency']
+        })
+
+    def _take_batch(self, force: bool = False) -> List[Dict[str, Any]]:
+        """전송할 배치를 꺼냅니다 (배치가 다 차지 않았으면 빈 리스트)"""
+        if not self._batch or (len(self._batch) < self.batch_size and not force):
+            return []
+        batch, self._batch = self._batch, []
+        return batch
+
+    def _send_batch(self, batch: List[Dict[str, Any]]):
+        if not batch:
+            return
+
+        with self._send_lock:
+            self._ingest_batch(batch)
+
+    def _ingest_batch(self, batch: List[Dict[str, Any]]):
+        for result in batch:
+            started_at = datetime.fromisoformat(result['started_at'])
+
+            trace = self.langfuse.trace(
+                name=f"dataset_evaluation_{result['item_id']}",
+                metadata={
+                    "dataset_run": self.run_name,
+                    "dataset_item_id": result['item_id'],
+                    "category": result['category'],
+                    "attempts": result['attempts']
+                }
+            )
+
+            generation = trace.generation(
+                name="model_response",
+                model=self.model_name,
+                input=result['input'],
+                start_time=started_at
+            )
+            generation.end(
+                output=result['actual'],
+                end_time=started_at + timedelta(seconds=result['latency']),
+                level="ERROR" if result['error'] else "DEFAULT",
+                status_message=result['error']
+            )
+
+            trace.score(
+                name="accuracy",
+                value=result['score'],
+                comment=result['error'] or ("Exact match" if result['correct'] else "Mismatch")
+            )
+
+        # 배치 단위로 전송한 뒤에 체크포인트를 남겨야 재개 시 누락이 없습니다
+        self.langfuse.flush()
+        self._write_checkpoint(batch)
+
+    def _report_progress(self):
+        done = self._done
+        if done % self.progress_interval != 0 and done != self._total:
+            return
+
+        elapsed = time.monotonic() - self._started_at
+        rate = (done - self._resumed) / elapsed if elapsed > 0 else 0.0
+        if self._total:
+            print(
+                f"  진행: {done}/{self._total} ({done / self._total * 100:.1f}%) - {rate:.1f} items/s"
+            )
+        else:
+            print(f"  진행: {done} - {rate:.1f} items/s")
+
+    def _backoff(self, attempt: int) -> float:
+        return self.backoff_base * (2 ** attempt) * (1 + random.random() * 0.1)
+
+    # --------------------------------------------------------
+    # 스레드 풀 실행
+    # --------------------------------------------------------
+
+    @staticmethod
+    def _timed_task(
+        task: Callable[[Dict[str, Any]], str], item: Dict[str, Any], clock: Dict[str, Any]
+    ):
+        # 타임아웃은 작업이 워커에서 실제로 시작된 시점부터 잽니다
+        clock['started_at'] = datetime.now()
+        clock['started'] = time.monotonic()
+        return task(item)
+
+    def run(self, items: Iterable[Dict[str, Any]], task: Callable[[Dict[str, Any]], str]):
+        """
+        스레드 풀로 데이터셋을 평가합니다.
+
+        task는 아이템을 받아 모델 출력 문자열을 반환하는 동기 함수입니다.
+        아이템은 실행 슬롯이 빌 때마다 items에서 하나씩 꺼냅니다.
+
+        타임아웃된 작업의 스레드는 멈출 수 없으므로 끝날 때까지 '멈춘 워커'로 셉니다.
+        멈춘 워커가 차지한 슬롯에는 새 작업을 넣지 않고, 풀의 절반 이상이 멈추면
+        새 풀로 교체합니다. 멈춘 워커가 max_stuck_workers개에 이르면 교체하지 않고
+        그중 하나가 끝날 때까지 기다립니다.
+        """
+        source = self._pending_items(items)
+        source_exhausted = False
+        pending = deque()
+        retry_heap = []
+        retry_seq = 0
+        in_flight = {}
+        stuck = {}
+
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        pools = [pool]
+        try:
+            while not source_exhausted or pending or retry_heap or in_flight:
+                now = time.monotonic()
+                while retry_heap and retry_heap[0][0] <= now:
+                    _, _, entry = heapq.heappop(retry_heap)
+                    pending.append(entry)
+
+                for future in [future for future in stuck if future.done()]:
+                    del stuck[future]
+                stuck_in_pool = sum(1 for owner in stuck.values() if owner is pool)
+                if stuck_in_pool * 2 >= self.max_workers and len(stuck) < self.max_stuck_workers:
+                    pool.shutdown(wait=False)
+                    pool = ThreadPoolExecutor(max_workers=self.max_workers)
+                    pools.append(pool)
+                    self.replaced_pools += 1
+                    stuck_in_pool = 0
+
+                busy = stuck_in_pool + sum(1 for *_, owner in in_flight.values() if owner is pool)
+                while busy < self.max_workers:
+                    if pending:
+                        item_id, item, attempt = pending.popleft()
+                    elif not source_exhausted:
+                        next_item = next(source, None)
+                        if next_item is None:
+                            source_exhausted = True
+                            continue
+                        item_id, item = next_item
+                        attempt = 0
+                    else:
+                        break
+                    clock = {}
+                    future = pool.submit(self._timed_task, task, item, clock)
+                    in_flight[future] = (item_id, item, attempt, clock, time.monotonic(), pool)
+                    busy += 1
+
+                # 아직 시작하지 않은 작업은 제출 시각 기준으로 깨어나 다시 확인합니다
+                wake_times = [clock.get('started', submitted) + self.item_timeout
+                              for _, _, _, clock, submitted, _ in in_flight.values()]
+                if retry_heap:
+                    wake_times.append(retry_heap[0][0])
+                timeout = max(0.0, min(wake_times) - time.monotonic()) if wake_times else None
+
+                waiting = list(in_flight) + list(stuck)
+                if not waiting and timeout is None:
+                    break
+                done, _ = wait(waiting, timeout=timeout, return_when=FIRST_COMPLETED)
+
+                now = time.monotonic()
+                for future in list(in_flight):
+                    item_id, item, attempt, clock, submitted, owner = in_flight[future]
+                    started = clock.get('started')
+
+                    if future in done:
+                        error = future.exception()
+                    elif started is not None and now - started >= self.item_timeout:
+                        stuck[future] = owner
+                        self.timed_out += 1
+                        error = TimeoutError(f"item exceeded {self.item_timeout}s")
+                    else:
+                        continue
+
+                    del in_flight[future]
+                    latency = now - (started if started is not None else submitted)
+                    started_at = clock.get('started_at', datetime.now())
+
+                    if error is None:
+                        self._record(
+                            item_id, item, future.result(), None, started_at, latency, attempt + 1
+                        )
+                        self._send_batch(self._take_batch())
+                    elif attempt < self.max_retries:
+                        retry_seq += 1
+                        heapq.heappush(
+                            retry_heap,
+                            (now + self._backoff(attempt), retry_seq, (item_id, item, attempt + 1))
+                        )
+                    else:
+                        self._record(item_id, item, None, f"{type(error).__name__}: {error}",
+                                     started_at, latency, attempt + 1)
+                        self._send_batch(self._take_batch())
+        finally:
+            for owner in pools:
+                owner.shutdown(wait=False, cancel_futures=True)
+            self._send_batch(self._take_batch(force=True))
+
+        return self.results
+
+    # --------------------------------------------------------
+    # asyncio 실행
+    # --------------------------------------------------------
+
+    async def run_async(
+        self,
+        items: Iterable[Dict[str, Any]],
+        task: Callable[[Dict[str, Any]], Any],
+        fetch_size: int = 64,
+    ):
+        """
+        asyncio로 데이터셋을 평가합니다.
+
+        task는 아이템을 받아 모델 출력 문자열을 반환하는 코루틴 함수입니다.
+        아이템은 fetch_size개씩 스레드에서 읽어 크기가 제한된 큐로 워커에 전달합니다.
+        """
+        source = self._pending_items(items)
+        work_queue = asyncio.Queue(maxsize=self.max_workers * 2)
+
+        async def feed():
+            while True:
+                chunk = await asyncio.to_thread(lambda: list(itertools.islice(source, fetch_size)))
+                for entry in chunk:
+                    await work_queue.put(entry)
+                if len(chunk) < fetch_size:
+                    break
+            for _ in range(self.max_workers):
+                await work_queue.put(None)
+
+        async def evaluate(item_id, item):
+            for attempt in range(self.max_retries + 1):
+                started_at = datetime.now()
+                started = time.monotonic()
+                try:
+                    output = await asyncio.wait_for(task(item), timeout=self.item_timeout)
+                    error = None
+                except asyncio.TimeoutError:
+                    output = None
+                    error = f"TimeoutError: item exceeded {self.item_timeout}s"
+                except Exception as e:
+                    output = None
+                    error = f"{type(e).__name__}: {e}"
+
+                if error is None or attempt == self.max_retries:
+                    break
+                await asyncio.sleep(self._backoff(attempt))
+
+            latency = time.monotonic() - started
+            self._record(item_id, item, output, error, started_at, latency, attempt + 1)
+
+            # flush()와 체크포인트 기록은 블로킹이므로 이벤트 루프 밖에서 실행합니다
+            batch = self._take_batch()
+            if batch:
+                await asyncio.to_thread(self._send_batch, batch)
+
+        async def worker():
+            while True:
+                entry = await work_queue.get()
+                if entry is None:
+                    break
+                await evaluate(*entry)
+
+        try:
+            await asyncio.gather(feed(), *(worker() for _ in range(self.max_workers)))
+        finally:
+            self._send_batch(self._take_batch(force=True))
+
+        return self.results
+
+
 def create_dataset_example():
     """
     데이터셋 생성 예제
@@ -217,19 +1958,10 @@ def run_dataset_evaluation():
     print(f"  - 정확도: {correct_count}/{total_count} ({accuracy*100:.1f}%)")
 
     # 카테고리별 정확도
-    categories = {}
-    for result in results:
-        cat = result['category']
-        if cat not in categories:
-            categories[cat] = {'correct': 0, 'total': 0}
-        categories[cat]['total'] += 1
-        if result['correct']:
-            categories[cat]['correct'] += 1
+    store = RunResultStore.from_results(results, model=model_name)
 
     print(f"\n  카테고리별 정확도:")
-    for cat, stats in categories.items():
-        cat_accuracy = stats['correct'] / stats['total'] * 100
-        print(f"    - {cat}: {stats['correct']}/{stats['total']} ({cat_accuracy:.1f}%)")
+    print_group_stats(store.group_by(["category"]), ["category"])
 
     langfuse.flush()
 
@@ -261,13 +1993,11 @@ def compare_models_with_dataset():
     print(f"\n테스트 데이터셋: {len(test_dataset)}개 아이템")
     print(f"비교 모델: {len(models)}개\n")
 
-    comparison_results = {}
+    store = RunResultStore()
 
     for model in models:
         print(f"[{model}] 평가 중...")
 
-        model_results = []
-
         for i, item in enumerate(test_dataset):
             trace = langfuse.trace(
                 name=f"model_comparison_{model}_{i}",
@@ -301,19 +2031,18 @@ def compare_models_with_dataset():
 
             trace.end()
 
-            model_results.append(is_correct)
-
-        accuracy = sum(model_results) / len(model_results) * 100
-        comparison_results[model] = accuracy
+            store.append({"item_id": i, "model": model, "correct": is_correct})
 
+        model_stats = next(row for row in store.group_by(["model"]) if row['model'] == model)
+        accuracy = model_stats['accuracy'] * 100
         print(f"  정확도: {accuracy:.1f}%")
 
     # 비교 결과
     print(f"\n비교 결과:")
-    sorted_models = sorted(comparison_results.items(), key=lambda x: x[1], reverse=True)
+    sorted_models = sorted(store.group_by(["model"]), key=lambda x: x['accuracy'], reverse=True)
 
-    for rank, (model, accuracy) in enumerate(sorted_models, 1):
-        print(f"  {rank}. {model}: {accuracy:.1f}%")
+    for rank, row in enumerate(sorted_models, 1):
+        print(f"  {rank}. {row['model']}: {row['accuracy']*100:.1f}%")
 
     langfuse.flush()
 
@@ -323,6 +2052,8 @@ def regression_testing_example():
     회귀 테스트 예제
 
     모델 업데이트 후 성능 저하를 감지합니다.
+    이전 실행의 아이템별 결과를 기준선으로 저장하고, 새 버전의 결과와 짝지어
+    부트스트랩 신뢰구간으로 비교합니다. 회귀가 통계적으로 확실해지면 조기 중단합니다.
     """
     print("\n" + "=" * 60)
     print("4. 회귀 테스트")
@@ -330,39 +2061,59 @@ def regression_testing_example():
 
     langfuse = Langfuse()
 
-    # 기준 성능 (이전 버전)
-    baseline_results = {
-        "version": "v1.0",
-        "accuracy": 0.85,
-        "avg_response_time": 1.2
-    }
-
     # 테스트 데이터셋
-    regression_dataset = [
+    topics = [
         {"input": "What is AI?", "expected_contains": "artificial intelligence"},
         {"input": "Define machine learning", "expected_contains": "learning"},
         {"input": "Explain neural networks", "expected_contains": "network"}
     ]
+    regression_dataset = [
+        {**topics[i % len(topics)], "id": f"regression_{i:04d}"}
+        for i in range(600)
+    ]
 
-    print(f"\n기준 성능 (Baseline):")
-    print(f"  - Version: {baseline_results['version']}")
-    print(f"  - Accuracy: {baseline_results['accuracy']*100:.1f}%")
-    print(f"  - Avg Response Time: {baseline_results['avg_response_time']}s")
+    rng = random.Random(7)
+
+    def simulate_response(item, accuracy, latency_scale):
+        is_correct = rng.random() < accuracy
+        response = (
+            f"Response containing {item['expected_contains']}" if is_correct else "I am not sure."
+        )
+        response_time = rng.lognormvariate(0, 0.25) * latency_scale
+        return response, response_time
+
+    # 기준 성능 (이전 버전): 아이템별 결과를 기준선 파일로 저장
+    baseline_results = []
+    for item in regression_dataset:
+        response, response_time = simulate_response(item, accuracy=0.88, latency_scale=1.1)
+        baseline_results.append({
+            "item_id": item['id'],
+            "correct": item['expected_contains'] in response.lower(),
+            "latency": response_time
+        })
 
-    # 새 버전 테스트
+    baseline_path = os.path.join(tempfile.gettempdir(), "regression_baseline_v1.0.json")
+    RegressionBaseline.from_results("v1.0", baseline_results).save(baseline_path)
+    baseline = RegressionBaseline.load(baseline_path)
+
+    monitor = RegressionMonitor(baseline, confidence=0.95, min_items=50, check_interval=25)
+
+    print(f"\n기준선 (Baseline): {baseline.version}")
+    print(f"  - 아이템: {len(baseline.items)}개")
+    print(f"  - 저장 위치: {baseline_path}")
+
+    # 새 버전 테스트 (정확도가 떨어지고 느려진 버전 시뮬레이션)
     new_version = "v2.0"
     print(f"\n새 버전 테스트: {new_version}")
 
-    correct_count = 0
-    total_time = 0
-
-    for i, item in enumerate(regression_dataset):
+    verdict = None
+    for item in regression_dataset:
         trace = langfuse.trace(
-            name=f"regression_test_{i}",
+            name=f"regression_test_{item['id']}",
             metadata={
                 "test_type": "regression",
                 "version": new_version,
-                "baseline_version": baseline_results['version']
+                "baseline_version": baseline.version
             }
         )
 
@@ -372,9 +2123,7 @@ def regression_testing_example():
             input=item['input']
         )
 
-        # 응답 시뮬레이션
-        response = f"Response containing {item['expected_contains']}"
-        response_time = 1.1  # seconds
+        response, response_time = simulate_response(item, accuracy=0.78, latency_scale=1.3)
 
         generation.end(
             output=response,
@@ -383,10 +2132,6 @@ def regression_testing_example():
 
         # 검증
         is_correct = item['expected_contains'] in response.lower()
-        if is_correct:
-            correct_count += 1
-
-        total_time += response_time
 
         trace.score(
             name="correctness",
@@ -395,33 +2140,34 @@ def regression_testing_example():
 
         trace.end()
 
-    # 새 버전 결과
-    new_accuracy = correct_count / len(regression_dataset)
-    avg_response_time = total_time / len(regression_dataset)
-
-    print(f"\n새 버전 결과:")
-    print(f"  - Accuracy: {new_accuracy*100:.1f}%")
-    print(f"  - Avg Response Time: {avg_response_time:.2f}s")
+        verdict = monitor.observe(item['id'], is_correct, response_time)
+        if verdict:
+            break
+
+    report = verdict or monitor.evaluate()
+    q = monitor.latency_percentile
+
+    print(f"\n비교 결과 ({report['paired_items']}/{len(regression_dataset)}개 아이템):")
+    print(
+        f"  - Accuracy: {report['baseline_accuracy']*100:.1f}% → {report['new_accuracy']*100:.1f}% "
+        f"(차이 {report['accuracy_diff']*100:+.1f}%, "
+        f"CI [{report['accuracy_ci'][0]*100:+.1f}%, {report['accuracy_ci'][1]*100:+.1f}%])"
+    )
+    print(f"  - Latency p{q:g}: {report[f'baseline_latency_p{q:g}']:.2f}s → "
+          f"{report[f'new_latency_p{q:g}']:.2f}s (차이 {report['latency_diff']:+.2f}s, "
+          f"CI [{report['latency_ci'][0]:+.2f}s, {report['latency_ci'][1]:+.2f}s])")
+    print(f"  - 확인 {report['look']}회차, 이번 확인의 alpha {report['look_alpha']:.4f} "
+          f"(전체 오탐률 ≤ {(1 - monitor.confidence) * 100:.0f}%)")
 
     # 회귀 검사
     print(f"\n회귀 검사:")
-
-    accuracy_change = new_accuracy - baseline_results['accuracy']
-    time_change = avg_response_time - baseline_results['avg_response_time']
-
-    if accuracy_change < -0.05:  # 5% 이상 정확도 감소
-        print(f"  ⚠ 정확도 회귀 감지: {accuracy_change*100:.1f}%")
-    elif accuracy_change > 0.05:
-        print(f"  ✓ 정확도 개선: +{accuracy_change*100:.1f}%")
+    if verdict:
+        print(f"  ⚠ 회귀 감지: {', '.join(verdict['regressions'])} "
+              f"({verdict['paired_items']}개 아이템 후 조기 중단)")
     else:
-        print(f"  ✓ 정확도 유지: {accuracy_change*100:.1f}%")
+        print(f"  ✓ 통계적으로 확실한 회귀 없음")
 
-    if time_change > 0.3:  # 0.3초 이상 느려짐
-        print(f"  ⚠ 응답 시간 회귀 감지: +{time_change:.2f}s")
-    elif time_change < -0.3:
-        print(f"  ✓ 응답 시간 개선: {time_change:.2f}s")
-    else:
-        print(f"  ✓ 응답 시간 유지: {time_change:.2f}s")
+    os.remove(baseline_path)
 
     langfuse.flush()
 
@@ -464,8 +2210,8 @@ def dataset_with_golden_answers():
 
     print(f"\n정답 데이터셋: {len(golden_dataset)}개 아이템\n")
 
-    exact_matches = 0
-    partial_matches = 0
+    traces = []
+    model_answers = []
 
     for i, item in enumerate(golden_dataset, 1):
         trace = langfuse.trace(
@@ -496,16 +2242,20 @@ def dataset_with_golden_answers():
 
         generation.end(output=model_answer)
 
-        # 정답 비교
-        exact_match = model_answer.strip().lower() == item['golden_answer'].strip().lower()
-        partial_match = item['golden_answer'].lower() in model_answer.lower()
+        traces.append(trace)
+        model_answers.append(model_answer)
+
+    # 정답 비교 - 응답 컬럼 전체를 한 번에 매칭
+    golden_answers = [item['golden_answer'] for item in golden_dataset]
+    exact = match_normalized(model_answers, golden_answers)
+    partial = match_contains(model_answers, golden_answers) & ~exact
+    f1_scores = token_f1(model_answers, golden_answers)
 
-        if exact_match:
-            exact_matches += 1
+    for i, (item, trace, model_answer) in enumerate(zip(golden_dataset, traces, model_answers), 1):
+        if exact[i - 1]:
             match_type = "exact_match"
             score = 1.0
-        elif partial_match:
-            partial_matches += 1
+        elif partial[i - 1]:
             match_type = "partial_match"
             score = 0.7
         else:
@@ -518,20 +2268,28 @@ def dataset_with_golden_answers():
             comment=match_type
         )
 
+        trace.score(
+            name="token_f1",
+            value=float(f1_scores[i - 1])
+        )
+
         trace.end()
 
-        status = "✓" if exact_match else ("~" if partial_match else "✗")
+        status = "✓" if exact[i - 1] else ("~" if partial[i - 1] else "✗")
         print(f"[{i}] {status} {item['input'][:40]}...")
         print(f"    Expected: {item['golden_answer']}")
         print(f"    Got: {model_answer}")
-        print(f"    Match Type: {match_type}\n")
+        print(f"    Match Type: {match_type} (token F1: {f1_scores[i - 1]:.2f})\n")
 
     # 결과 요약
     total = len(golden_dataset)
+    exact_matches = int(exact.sum())
+    partial_matches = int(partial.sum())
     print(f"평가 결과:")
     print(f"  - Exact Matches: {exact_matches}/{total} ({exact_matches/total*100:.1f}%)")
     print(f"  - Partial Matches: {partial_matches}/{total} ({partial_matches/total*100:.1f}%)")
     print(f"  - No Matches: {total-exact_matches-partial_matches}/{total}")
+    print(f"  - Mean Token F1: {f1_scores.mean():.2f}")
 
     langfuse.flush()
 
@@ -577,7 +2335,11 @@ def benchmark_dataset_example():
     print(f"Model: {model}")
     print(f"Questions: {len(benchmark_dataset)}\n")
 
-    correct = 0
+    traces = []
+    model_answers = []
+
+    # 모델 응답 시뮬레이션 (100% 정확도, 응답 형식은 제각각)
+    simulated_answers = ["The answer is B) Python", "A) Central Processing Unit", "(B) 1991"]
 
     for i, item in enumerate(benchmark_dataset, 1):
         trace = langfuse.trace(
@@ -598,35 +2360,554 @@ def benchmark_dataset_example():
             input=prompt
         )
 
-        # 모델 응답 시뮬레이션
-        model_answer = item['correct_answer']  # 100% 정확도로 시뮬레이션
+        model_answer = simulated_answers[i - 1]
 
         generation.end(output=model_answer)
 
-        # 정답 확인
-        is_correct = model_answer == item['correct_answer']
-        if is_correct:
-            correct += 1
+        traces.append(trace)
+        model_answers.append(model_answer)
+
+    # 정답 확인 - 응답에서 선택지 문자를 추출하여 일괄 비교
+    correct_answers = [item['correct_answer'] for item in benchmark_dataset]
+    is_correct = match_multiple_choice(model_answers, correct_answers)
 
+    store = RunResultStore()
+    store.extend(
+        {"item_id": i, "category": item['category'], "model": model, "correct": bool(correct)}
+        for i, (item, correct) in enumerate(zip(benchmark_dataset, is_correct), 1)
+    )
+
+    for i, (item, trace, model_answer) in enumerate(
+        zip(benchmark_dataset, traces, model_answers), 1
+    ):
         trace.score(
             name="correctness",
-            value=1.0 if is_correct else 0.0
+            value=1.0 if is_correct[i - 1] else 0.0
         )
 
         trace.end()
 
-        status = "✓" if is_correct else "✗"
+        status = "✓" if is_correct[i - 1] else "✗"
         print(f"[{i}] {status} {item['category']}")
         print(f"    Q: {item['question'][:50]}...")
-        print(f"    Answer: {model_answer} (Correct: {item['correct_answer']})\n")
+        print(
+            f"    Answer: {model_answer} → {extract_choice(model_answer)} "
+            f"(Correct: {item['correct_answer']})\n"
+        )
 
     # 벤치마크 결과
-    accuracy = correct / len(benchmark_dataset) * 100
+    overall = store.group_by([])[0]
+    correct = int(store.column("correct").sum())
 
     print(f"벤치마크 결과:")
-    print(f"  - Score: {correct}/{len(benchmark_dataset)} ({accuracy:.1f}%)")
+    print(f"  - Score: {correct}/{len(benchmark_dataset)} ({overall['accuracy']*100:.1f}%)")
     print(f"  - Model: {model}")
     print(f"  - Benchmark: {benchmark_name}")
+    print(f"  - 카테고리별:")
+    print_group_stats(store.group_by(["category"]), ["category"])
+
+    langfuse.flush()
+
+
+def concurrent_dataset_evaluation_example():
+    """
+    대규모 데이터셋 동시 평가 예제
+
+    DatasetRunExecutor로 아이템을 병렬 평가하고, 중단 후 체크포인트에서 재개합니다.
+    """
+    print("\n" + "=" * 60)
+    print("7. 대규모 데이터셋 동시 평가")
+    print("=" * 60)
+
+    langfuse = Langfuse()
+
+    base_items = [
+        {
+            "input": "What is the capital of France?",
+            "expected_output": "Paris",
+            "metadata": {"category": "geography"},
+        },
+        {"input": "What is 15 * 24?", "expected_output": "360", "metadata": {"category": "math"}},
+        {
+            "input": "Who wrote Romeo and Juliet?",
+            "expected_output": "William Shakespeare",
+            "metadata": {"category": "literature"},
+        },
+    ]
+    answers = {item['input']: item['expected_output'] for item in base_items}
+
+    dataset_items = [
+        {**base_items[i % len(base_items)], "id": f"item_{i:05d}"}
+        for i in range(300)
+    ]
+
+    def simulated_model(item):
+        # 네트워크 지연과 일시적 오류 시뮬레이션
+        time.sleep(random.uniform(0.005, 0.02))
+        if random.random() < 0.05:
+            raise ConnectionError("transient API error")
+        return answers[item['input']]
+
+    async def simulated_model_async(item):
+        await asyncio.sleep(random.uniform(0.005, 0.02))
+        if random.random() < 0.05:
+            raise ConnectionError("transient API error")
+        return answers[item['input']]
+
+    model_name = "gpt-3.5-turbo"
+    run_name = f"concurrent_run_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    checkpoint_path = os.path.join(tempfile.gettempdir(), f"{run_name}.checkpoint.jsonl")
+
+    print(f"\n평가 실행: {run_name}")
+    print(f"테스트 아이템: {len(dataset_items)}개")
+    print(f"체크포인트: {checkpoint_path}\n")
+
+    # 1) 스레드 풀 실행 - 처음 절반에서 중단된 상황을 재현
+    print("[Thread Pool] 첫 실행 (절반에서 중단)")
+    executor = DatasetRunExecutor(
+        langfuse, run_name, model_name,
+        max_workers=16, max_retries=3, backoff_base=0.01, item_timeout=1.0,
+        batch_size=50, checkpoint_path=checkpoint_path, progress_interval=50
+    )
+    executor.run(dataset_items[:150], simulated_model)
+
+    print("\n[Thread Pool] 재실행 (체크포인트에서 재개)")
+    start = time.time()
+    executor = DatasetRunExecutor(
+        langfuse, run_name, model_name,
+        max_workers=16, max_retries=3, backoff_base=0.01, item_timeout=1.0,
+        batch_size=50, checkpoint_path=checkpoint_path, progress_interval=50
+    )
+    results = executor.run(dataset_items, simulated_model)
+    thread_elapsed = time.time() - start
+
+    # 2) asyncio 실행
+    print("\n[asyncio] 실행")
+    start = time.time()
+    async_executor = DatasetRunExecutor(
+        langfuse, f"{run_name}_async", model_name,
+        max_workers=32, max_retries=3, backoff_base=0.01, item_timeout=1.0,
+        batch_size=100, progress_interval=100
+    )
+    async_results = asyncio.run(async_executor.run_async(dataset_items, simulated_model_async))
+    async_elapsed = time.time() - start
+
+    for label, run_results, elapsed in [
+        ("Thread Pool", results, thread_elapsed),
+        ("asyncio", async_results, async_elapsed)
+    ]:
+        correct_count = sum(1 for r in run_results if r['correct'])
+        retried = sum(1 for r in run_results if r['attempts'] > 1)
+        failed = sum(1 for r in run_results if r['error'])
+
+        print(f"\n{label} 결과:")
+        print(
+            f"  - 정확도: {correct_count}/{len(run_results)} "
+            f"({correct_count/len(run_results)*100:.1f}%)"
+        )
+        print(f"  - 재시도된 아이템: {retried}개, 최종 실패: {failed}개")
+        print(f"  - 이번 실행 시간: {elapsed:.2f}s")
+
+    os.remove(checkpoint_path)
+
+    langfuse.flush()
+
+
+def columnar_result_analysis_example():
+    """
+    대규모 실행 결과 분석 예제
+
+    수백만 행의 실행 결과를 RunResultStore에 담아 그룹별로 집계하고 Parquet으로 내보냅니다.
+    """
+    print("\n" + "=" * 60)
+    print("8. 컬럼 기반 결과 분석")
+    print("=" * 60)
+
+    row_count = 1_000_000
+    categories = ["geography", "math", "literature", "science", "computer_science"]
+    models = ["gpt-3.5-turbo", "gpt-4", "claude-3-sonnet"]
+    difficulties = ["easy", "medium", "hard"]
+
+    print(f"\n시뮬레이션 결과: {row_count:,}행")
+
+    # 시뮬레이션된 실행 결과를 컬럼 단위로 생성
+    rng = np.random.default_rng(42)
+    category_codes = rng.integers(0, len(categories), row_count)
+    model_codes = rng.integers(0, len(models), row_count)
+    difficulty_codes = rng.integers(0, len(difficulties), row_count)
+    correct = rng.random(row_count) < (0.9 - 0.1 * difficulty_codes + 0.03 * model_codes)
+    latency = rng.lognormal(mean=-0.5 + 0.2 * model_codes, sigma=0.4)
+
+    start = time.time()
+    store = RunResultStore()
+    store.extend(
+        {
+            "category": categories[c],
+            "model": models[m],
+            "difficulty": difficulties[d],
+            "correct": ok,
+            "latency": lat
+        }
+        for c, m, d, ok, lat in zip(
+            category_codes.tolist(), model_codes.tolist(), difficulty_codes.tolist(),
+            correct.tolist(), latency.tolist()
+        )
+    )
+    load_time = time.time() - start
+
+    start = time.time()
+    by_model = store.group_by(["model"])
+    by_category_difficulty = store.group_by(["category", "difficulty"])
+    aggregate_time = time.time() - start
+
+    print(f"  - 적재 시간: {load_time:.2f}s")
+    print(f"  - 집계 시간: {aggregate_time:.2f}s")
+
+    print(f"\n모델별:")
+    print_group_stats(by_model, ["model"], indent="  ")
+
+    print(f"\n카테고리/난이도별 (상위 5개):")
+    top_groups = sorted(by_category_difficulty, key=lambda row: row['accuracy'], reverse=True)[:5]
+    print_group_stats(top_groups, ["category", "difficulty"], indent="  ")
+
+    if pa is not None:
+        parquet_path = os.path.join(tempfile.gettempdir(), "run_results.parquet")
+        store.to_parquet(parquet_path)
+        print(
+            f"\n✓ Parquet 내보내기: {parquet_path} "
+            f"({os.path.getsize(parquet_path) / 1024 / 1024:.1f}MB)"
+        )
+    else:
+        print("\n  (pyarrow 미설치: Parquet 내보내기 생략)")
+
+
+def streaming_dataset_evaluation_example():
+    """
+    스트리밍 데이터셋 평가 예제
+
+    JSONL 파일의 아이템을 한 번에 읽지 않고 버퍼 크기만큼 미리 읽어 가며 평가합니다.
+    """
+    print("\n" + "=" * 60)
+    print("9. 스트리밍 데이터셋 평가")
+    print("=" * 60)
+
+    langfuse = Langfuse()
+
+    # 대용량 데이터셋 파일 시뮬레이션 (실제로는 수십 GB의 JSONL/Parquet)
+    item_count = 20_000
+    dataset_path = os.path.join(tempfile.gettempdir(), "regression_dataset.jsonl")
+    categories = ["geography", "math", "literature"]
+
+    with open(dataset_path, "w", encoding="utf-8") as f:
+        for i in range(item_count):
+            f.write(json.dumps({
+                "id": f"item_{i:06d}",
+                "input": f"Question {i}",
+                "expected_output": f"Answer {i}",
+                "metadata": {"category": categories[i % len(categories)], "difficulty": "easy"}
+            }) + "\n")
+
+    source = StreamingDatasetSource.from_jsonl(dataset_path, buffer_size=256)
+
+    print(f"\n데이터셋 파일: {dataset_path}")
+    print(f"  - 아이템: {item_count:,}개 (메모리 버퍼: {source.buffer_size}개)")
+
+    def simulated_model(item):
+        number = int(item['input'].split()[-1])
+        return f"Answer {number}" if number % 10 else "I don't know"
+
+    executor = DatasetRunExecutor(
+        langfuse, f"streaming_run_{datetime.now().strftime('%Y%m%d_%H%M%S')}", "gpt-3.5-turbo",
+        max_workers=16, batch_size=500, progress_interval=5000, keep_results=False
+    )
+
+    start = time.time()
+    executor.run(source, simulated_model)
+    elapsed = time.time() - start
+
+    print(f"\n평가 결과 ({elapsed:.2f}s):")
+    print_group_stats(executor.store.group_by(["category"]), ["category"], indent="  ")
+
+    os.remove(dataset_path)
+
+    langfuse.flush()
+
+
+def bulk_dataset_sync_example():
+    """
+    데이터셋 아이템 일괄 동기화 예제
+
+    콘텐츠 해시로 변경된 아이템만 골라 업로드합니다.
+    """
+    print("\n" + "=" * 60)
+    print("10. 데이터셋 아이템 일괄 동기화")
+    print("=" * 60)
+
+    langfuse = Langfuse()
+
+    dataset_name = "golden_qa_dataset"
+    manifest_path = os.path.join(tempfile.gettempdir(), f"{dataset_name}.manifest.json")
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+    langfuse.create_dataset(
+        name=dataset_name,
+        description="Golden QA set synced with content hashing"
+    )
+
+    golden_items = [
+        {
+            "input": f"What is {i} + {i}?",
+            "expected_output": str(i * 2),
+            "metadata": {"category": "math", "difficulty": "easy"}
+        }
+        for i in range(2000)
+    ]
+
+    syncer = DatasetItemSyncer(langfuse, dataset_name, manifest_path=manifest_path,
+                               batch_size=100, max_workers=8)
+
+    def print_stats(label, stats):
+        print(f"\n[{label}]")
+        print(f"  - 신규: {stats['new']}, 변경: {stats['changed']}, 동일(건너뜀): {stats['unchanged']}")
+        print(f"  - 업로드: {stats['uploaded']}개, 실패: {stats['failed']}개")
+        print(f"  - 처리 속도: {stats['items_per_sec']:.0f} items/s, "
+              f"업로드 {stats['uploads_per_sec']:.0f} items/s ({stats['elapsed']:.2f}s)")
+
+    print(f"\n데이터셋: {dataset_name} ({len(golden_items)}개 아이템)")
+
+    # 1) 최초 동기화: 모든 아이템 업로드
+    print_stats("최초 동기화", syncer.sync(golden_items))
+
+    # 2) 일부 정답 수정 후 재동기화: 변경된 아이템만 업로드
+    for item in golden_items[:5]:
+        item['expected_output'] = f"The answer is {item['expected_output']}"
+    golden_items.append(
+        {
+            "input": "What is 2000 + 2000?",
+            "expected_output": "4000",
+            "metadata": {"category": "math"},
+        }
+    )
+
+    print_stats("수정 후 재동기화", syncer.sync(golden_items))
+
+    os.remove(manifest_path)
+
+
+def generation_cache_example():
+    """
+    Generation 결과 캐시 예제
+
+    변경되지 않은 평가 세트를 다시 실행할 때 모델을 호출하지 않고 캐시된 응답을 사용합니다.
+    """
+    print("\n" + "=" * 60)
+    print("11. Generation 결과 캐시")
+    print("=" * 60)
+
+    langfuse = Langfuse()
+
+    cache_path = os.path.join(tempfile.gettempdir(), "generation_cache.sqlite")
+    if os.path.exists(cache_path):
+        os.remove(cache_path)
+    cache = GenerationCache(cache_path, max_bytes=64 * 1024 * 1024, deterministic_only=True)
+
+    test_dataset = [
+        {"input": "Translate to Spanish: Hello", "expected": "Hola"},
+        {"input": "Translate to Spanish: Goodbye", "expected": "Adiós"},
+        {"input": "Translate to Spanish: Thank you", "expected": "Gracias"}
+    ]
+    models = ["gpt-3.5-turbo", "gpt-4", "claude-3-sonnet"]
+    model_parameters = {"temperature": 0, "max_tokens": 64}
+
+    def call_model(item):
+        # 실제 API 호출 지연 시뮬레이션
+        time.sleep(0.05)
+        return item['expected']
+
+    print(f"\n캐시: {cache_path}")
+    print(f"평가 세트: {len(test_dataset)}개 아이템 x {len(models)}개 모델\n")
+
+    for run in range(1, 3):
+        start = time.time()
+        correct = 0
+
+        for model in models:
+            for i, item in enumerate(test_dataset):
+                trace = langfuse.trace(
+                    name=f"cached_model_comparison_{model}_{i}",
+                    metadata={"experiment": "model_comparison", "model": model, "run": run}
+                )
+
+                output = cached_generation(
+                    trace, cache, "translation", model, model_parameters, item['input'],
+                    lambda: call_model(item)
+                )
+
+                is_correct = output == item['expected']
+                correct += is_correct
+                trace.score(name="accuracy", value=1.0 if is_correct else 0.0)
+                trace.end()
+
+        elapsed = time.time() - start
+        stats = cache.stats()
+        print(f"[Run {run}] 정확도: {correct}/{len(models) * len(test_dataset)}, "
+              f"소요 시간: {elapsed:.2f}s, 누적 캐시 적중: {stats['hits']}/{stats['hits'] + stats['misses']}")
+
+    stats = cache.stats()
+    print(f"\n캐시 상태: {stats['entries']}개 항목, {stats['bytes']} bytes")
+
+    cache.close()
+    os.remove(cache_path)
+
+    langfuse.flush()
+
+
+def sharded_benchmark_example():
+    """
+    다중 프로세스 샤딩 벤치마크 예제
+
+    벤치마크를 n개의 샤드로 나누어 여러 프로세스에서 실행한 뒤 결과를 합칩니다.
+    """
+    print("\n" + "=" * 60)
+    print("12. 다중 프로세스 샤딩 벤치마크")
+    print("=" * 60)
+
+    benchmark_name = "Custom Tech Benchmark (Large)"
+    model = "local-llm-simulated"
+    categories = ["programming", "computer_science", "programming_history", "math"]
+
+    work_dir = tempfile.mkdtemp(prefix="sharded_benchmark_")
+    dataset_path = os.path.join(work_dir, "benchmark.jsonl")
+    output_dir = os.path.join(work_dir, "results")
+
+    question_count = 2000
+    with open(dataset_path, "w", encoding="utf-8") as f:
+        for i in range(question_count):
+            f.write(json.dumps({
+                "id": f"q{i:05d}",
+                "question": f"Benchmark question {i}",
+                "correct_answer": "ABCD"[i % 4],
+                "category": categories[i % len(categories)]
+            }) + "\n")
+
+    shard_count = max(2, os.cpu_count() or 1)
+
+    print(f"\nBenchmark: {benchmark_name}")
+    print(f"Questions: {question_count}, Shards: {shard_count}, Processes: {os.cpu_count()}")
+
+    start = time.time()
+    shard_stats = run_sharded_benchmark(
+        dataset_path, shard_count, output_dir,
+        simulated_benchmark_model, model, benchmark_name
+    )
+    elapsed = time.time() - start
+
+    for stats in shard_stats:
+        print(
+            f"  - Shard {stats['shard']}/{shard_count}: {stats['items']}개 ({stats['elapsed']:.2f}s)"
+        )
+
+    store = merge_benchmark_shards(output_dir, shard_count)
+    overall = store.group_by([])[0]
+    correct = int(store.column("correct").sum())
+
+    print(f"\n병합된 벤치마크 결과 ({elapsed:.2f}s):")
+    print(f"  - Score: {correct}/{len(store)} ({overall['accuracy']*100:.1f}%)")
+    print(f"  - 카테고리별:")
+    print_group_stats(store.group_by(["category"]), ["category"])
+
+    for path in [dataset_path] + [
+        shard_result_path(output_dir, i, shard_count) for i in range(shard_count)
+    ]:
+        os.remove(path)
+    os.rmdir(output_dir)
+    os.rmdir(work_dir)
+
+
+def sampled_evaluation_example():
+    """
+    샘플링 평가 예제
+
+    전체 아이템 대신 무작위/층화/적응형 샘플만 평가하고 신뢰구간으로 전체 정확도를 추정합니다.
+    """
+    print("\n" + "=" * 60)
+    print("13. 층화/적응형 샘플링 평가")
+    print("=" * 60)
+
+    langfuse = Langfuse()
+
+    # 카테고리/난이도별로 정확도가 다른 데이터셋 시뮬레이션
+    categories = {"geography": 0.95, "math": 0.80, "literature": 0.90, "computer_science": 0.70}
+    difficulties = {"easy": 0.05, "medium": 0.0, "hard": -0.25}
+    rng = random.Random(11)
+
+    dataset_items = []
+    for i in range(20_000):
+        category = rng.choices(list(categories), weights=[50, 25, 20, 5])[0]
+        difficulty = rng.choice(list(difficulties))
+        dataset_items.append({
+            "id": f"item_{i:05d}",
+            "input": f"Question {i}",
+            "metadata": {"category": category, "difficulty": difficulty},
+            # 시뮬레이션: 모델이 이 아이템을 맞히는지 미리 결정
+            "_model_correct": rng.random() < categories[category] + difficulties[difficulty]
+        })
+
+    def evaluate(items, run_name):
+        results = []
+        for item in items:
+            correct = item['_model_correct']
+            trace = langfuse.trace(
+                name="sampled_evaluation",
+                metadata={
+                    "dataset_run": run_name,
+                    "dataset_item_id": item['id'],
+                    **item['metadata'],
+                },
+            )
+            trace.score(name="accuracy", value=1.0 if correct else 0.0)
+            results.append({"item": item, "correct": correct})
+        return results
+
+    true_accuracy = sum(item['_model_correct'] for item in dataset_items) / len(dataset_items)
+    budget = 2000
+
+    print(f"\n전체 아이템: {len(dataset_items):,}개 (전체 정확도: {true_accuracy*100:.2f}%)")
+    print(f"샘플 예산: {budget}개\n")
+
+    def print_estimate(label, estimate):
+        low, high = estimate['ci']
+        cost = estimate['sampled'] / len(dataset_items)
+        print(f"[{label}]")
+        print(f"  - 평가 아이템: {estimate['sampled']:,}개 (비용 {cost*100:.1f}%)")
+        print(
+            f"  - 추정 정확도: {estimate['accuracy']*100:.2f}% "
+            f"(95% CI [{low*100:.2f}%, {high*100:.2f}%], "
+            f"폭 ±{(high - low) / 2 * 100:.2f}%)"
+        )
+
+    # 1) 고정 예산 무작위 샘플링
+    sample = random_sample(dataset_items, budget, seed=1)
+    print_estimate("무작위 샘플링", estimate_accuracy(evaluate(sample, "random_sample")))
+
+    # 2) 층화 샘플링
+    sample, strata_sizes = stratified_sample(dataset_items, budget, seed=1)
+    print_estimate("층화 샘플링", estimate_accuracy(evaluate(sample, "stratified_sample"), strata_sizes))
+
+    # 3) 적응형 샘플링: 층별 정확도 구간 반폭이 ±7%가 되면 중단
+    sampler = AdaptiveSampler(dataset_items, target_half_width=0.07, seed=1)
+    while not sampler.done:
+        for result in evaluate(sampler.next_batch(), "adaptive_sample"):
+            sampler.observe(result['item'], result['correct'])
+    estimate = sampler.estimate()
+    print_estimate("적응형 샘플링", estimate)
+
+    print(f"\n  층별 추정 (적응형):")
+    for (category, difficulty), stats in sorted(estimate['strata'].items()):
+        low, high = stats['ci']
+        print(f"    - {category}/{difficulty}: {stats['accuracy']*100:.1f}% "
+              f"[{low*100:.1f}%, {high*100:.1f}%] ({stats['sampled']}개)")
 
     langfuse.flush()
 
@@ -656,6 +2937,27 @@ def main():
         # 6. 벤치마크
         benchmark_dataset_example()
 
+        # 7. 대규모 동시 평가
+        concurrent_dataset_evaluation_example()
+
+        # 8. 결과 분석
+        columnar_result_analysis_example()
+
+        # 9. 스트리밍 평가
+        streaming_dataset_evaluation_example()
+
+        # 10. 일괄 동기화
+        bulk_dataset_sync_example()
+
+        # 11. Generation 캐시
+        generation_cache_example()
+
+        # 12. 샤딩 벤치마크
+        sharded_benchmark_example()
+
+        # 13. 샘플링 평가
+        sampled_evaluation_example()
+
         print("\n" + "=" * 60)
         print("✓ 모든 Datasets 예제 완료!")
         print("=" * 60)
@@ -9,9 +9,30 @@ CallbackHandler를 사용하여 모든 Langchain 작업을 Langfuse에 기록합
 2. Chain 실행 추적
 3. Agent 실행 추적
 4. 비용 및 토큰 사용량 자동 기록
+5. 클라이언트를 공유하는 CallbackHandler 풀 (chain.batch 지원)
+6. Head/Tail 기반 추적 샘플링
+7. 페이로드 크기 제한/중복 제거/민감 필드 마스킹
+8. 로컬 벡터 검색 (Brute-force/IVF) 추적
+9. 메모리 매핑 임베딩 캐시
 """
 
 import os
+import re
+import json
+import zlib
+import struct
+import time
+import uuid
+import random
+import hashlib
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timezone
+from collections import Counter, OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import numpy as np
 from dotenv import load_dotenv
 from langfuse import Langfuse
 from langfuse.callback import CallbackHandler
@@ -19,11 +40,1066 @@ from langfuse.callback import CallbackHandler
 # Langchain imports (langchain 1.0.4)
 from langchain.chains import LLMChain
 from langchain.prompts import PromptTemplate
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableLambda
 
 load_dotenv()
 
 
+# ============================================================
+# 콜백 핸들러 풀 (Callback Handler Pool)
+# ============================================================
+
+class CallbackHandlerPool:
+    """
+    하나의 Langfuse 클라이언트를 공유하는 CallbackHandler 팩토리
+
+    CallbackHandler()를 매번 생성하면 핸들러마다 클라이언트, 이벤트 큐, flush 스레드가
+    새로 만들어집니다. 풀의 핸들러는 공유 클라이언트를 쓰고, 첫 콜백이 올 때 trace를 만든 뒤
+    trace.get_langchain_handler()에 위임하므로 사용되지 않은 핸들러는 아무것도 전송하지 않습니다.
+    """
+
+    def __init__(self, langfuse: Optional[Langfuse] = None, **trace_defaults):
+        self.langfuse = langfuse or Langfuse()
+        self.trace_defaults = trace_defaults
+        self.created = 0
+
+    def handler(self, name: str, metadata: Optional[Dict[str, Any]] = None,
+                **trace_kwargs) -> "_LazyTraceHandler":
+        """name trace에 연결될 핸들러를 반환합니다 (root chain의 입출력이 trace에 반영됨)"""
+        options = {**self.trace_defaults, **trace_kwargs}
+        options['metadata'] = {**self.trace_defaults.get('metadata', {}), **(metadata or {})}
+        return _LazyTraceHandler(self, name, options)
+
+    def _create_trace(self, name: str, options: Dict[str, Any]):
+        self.created += 1
+        return self.langfuse.trace(name=name, **options)
+
+    def batch_configs(
+        self,
+        inputs: Sequence[Any],
+        name: str = "batch_item",
+        name_fn: Optional[Callable[[int, Any], str]] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        **trace_kwargs,
+    ) -> List[Dict[str, Any]]:
+        """
+        chain.batch(inputs, config=...)에 넘길 아이템별 config 목록
+
+        아이템마다 별도 trace가 만들어지며, 이름은 name_fn(index, item) 또는 "{name}_{index}"입니다.
+        """
+        configs = []
+        for index, item in enumerate(inputs, 1):
+            trace_name = name_fn(index, item) if name_fn else f"{name}_{index}"
+            handler = self.handler(
+                trace_name,
+                metadata={**(metadata or {}), "item_index": index, "total_items": len(inputs)},
+                **trace_kwargs
+            )
+            configs.append({"callbacks": [handler], "run_name": trace_name})
+        return configs
+
+    def flush(self):
+        self.langfuse.flush()
+
+
+class _LazyTraceHandler(BaseCallbackHandler):
+    """첫 콜백에서 trace를 만들고 그 trace의 CallbackHandler로 위임하는 핸들러"""
+
+    def __init__(self, pool: CallbackHandlerPool, name: str, options: Dict[str, Any]):
+        self._pool = pool
+        self._name = name
+        self._options = options
+        self._handler: Optional[CallbackHandler] = None
+        self.trace = None
+
+    def _delegate(self) -> CallbackHandler:
+        if self._handler is None:
+            self.trace = self._pool._create_trace(self._name, self._options)
+            self._handler = self.trace.get_langchain_handler(update_parent=True)
+        return self._handler
+
+    def on_chain_start(self, *args, **kwargs):
+        return self._delegate().on_chain_start(*args, **kwargs)
+
+    def on_chain_end(self, *args, **kwargs):
+        return self._delegate().on_chain_end(*args, **kwargs)
+
+    def on_chain_error(self, *args, **kwargs):
+        return self._delegate().on_chain_error(*args, **kwargs)
+
+    def on_llm_start(self, *args, **kwargs):
+        return self._delegate().on_llm_start(*args, **kwargs)
+
+    def on_chat_model_start(self, *args, **kwargs):
+        return self._delegate().on_chat_model_start(*args, **kwargs)
+
+    def on_llm_new_token(self, *args, **kwargs):
+        return self._delegate().on_llm_new_token(*args, **kwargs)
+
+    def on_llm_end(self, *args, **kwargs):
+        return self._delegate().on_llm_end(*args, **kwargs)
+
+    def on_llm_error(self, *args, **kwargs):
+        return self._delegate().on_llm_error(*args, **kwargs)
+
+    def on_tool_start(self, *args, **kwargs):
+        return self._delegate().on_tool_start(*args, **kwargs)
+
+    def on_tool_end(self, *args, **kwargs):
+        return self._delegate().on_tool_end(*args, **kwargs)
+
+    def on_tool_error(self, *args, **kwargs):
+        return self._delegate().on_tool_error(*args, **kwargs)
+
+    def on_retriever_start(self, *args, **kwargs):
+        return self._delegate().on_retriever_start(*args, **kwargs)
+
+    def on_retriever_end(self, *args, **kwargs):
+        return self._delegate().on_retriever_end(*args, **kwargs)
+
+    def on_retriever_error(self, *args, **kwargs):
+        return self._delegate().on_retriever_error(*args, **kwargs)
+
+    def on_agent_action(self, *args, **kwargs):
+        return self._delegate().on_agent_action(*args, **kwargs)
+
+    def on_agent_finish(self, *args, **kwargs):
+        return self._delegate().on_agent_finish(*args, **kwargs)
+
+
+# ============================================================
+# 추적 샘플링 (Head/Tail Sampling)
+# ============================================================
+
+class HeadSampler:
+    """
+    trace 시작 시점에 추적 여부를 결정하는 head 기반 샘플러
+
+    always_users/always_tags는 항상, never_tags는 절대 추적하지 않고,
+    나머지는 trace id 해시로 rate 비율만큼 결정적으로 추적합니다.
+    """
+
+    def __init__(self, rate: float = 0.1, always_users: Sequence[str] = (),
+                 always_tags: Sequence[str] = (), never_tags: Sequence[str] = ()):
+        self.rate = rate
+        self.always_users = frozenset(always_users)
+        self.always_tags = frozenset(always_tags)
+        self.never_tags = frozenset(never_tags)
+        # uuid4의 하위 62비트는 버전/변형 비트가 없는 순수 난수
+        self._threshold = int(rate * (1 << 62))
+
+    def sample(
+        self, trace_id: uuid.UUID, user_id: Optional[str] = None, tags: Sequence[str] = ()
+    ) -> bool:
+        if tags and not self.never_tags.isdisjoint(tags):
+            return False
+        if user_id in self.always_users or (tags and not self.always_tags.isdisjoint(tags)):
+            return True
+        return (trace_id.int & ((1 << 62) - 1)) < self._threshold
+
+
+class TailSampler:
+    """
+    실행이 끝난 뒤 결과를 보고 추적 여부를 결정하는 tail 기반 샘플러
+
+    에러, slow_seconds 이상 지연, min_score 미만 점수인 trace를 보존하고,
+    나머지는 baseline_rate 비율만 정상 트래픽 비교용으로 남깁니다.
+    """
+
+    def __init__(
+        self,
+        keep_errors: bool = True,
+        slow_seconds: Optional[float] = 5.0,
+        min_score: Optional[float] = None,
+        baseline_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.keep_errors = keep_errors
+        self.slow_seconds = slow_seconds
+        self.min_score = min_score
+        self.baseline_rate = baseline_rate
+        self._rng = random.Random(seed)
+
+    @property
+    def needs_score(self) -> bool:
+        return self.min_score is not None
+
+    def reason(self, error: bool, duration: Optional[float], score: Optional[float],
+               baseline: bool = True) -> Optional[str]:
+        """보존 사유를 반환합니다 (None이면 버림)"""
+        if self.keep_errors and error:
+            return "error"
+        if self.slow_seconds is not None and duration is not None and duration >= self.slow_seconds:
+            return "slow"
+        if self.min_score is not None and score is not None and score < self.min_score:
+            return "low_score"
+        if baseline and self.baseline_rate and self._rng.random() < self.baseline_rate:
+            return "baseline"
+        return None
+
+
+class _BufferedRun:
+    """콜백으로 관찰한 Langchain run 하나 (보존 결정 후 span/generation으로 변환)"""
+
+    __slots__ = ("run_id", "parent_run_id", "name", "kind", "input", "output", "start_time",
+                 "end_time", "level", "status_message", "model", "usage")
+
+    def __init__(
+        self, run_id, parent_run_id, name: str, kind: str, input: Any, model: Optional[str] = None
+    ):
+        self.run_id = str(run_id)
+        self.parent_run_id = str(parent_run_id) if parent_run_id is not None else None
+        self.name = name
+        self.kind = kind
+        self.input = input
+        self.output = None
+        self.start_time = datetime.now(timezone.utc)
+        self.end_time: Optional[datetime] = None
+        self.level: Optional[str] = None
+        self.status_message: Optional[str] = None
+        self.model = model
+        self.usage: Optional[Dict[str, Any]] = None
+
+
+def _run_name(serialized: Optional[Dict[str, Any]], kwargs: Dict[str, Any], default: str) -> str:
+    if kwargs.get('name'):
+        return kwargs['name']
+    serialized = serialized or {}
+    return serialized.get('name') or (serialized.get('id') or [default])[-1]
+
+
+class _TailBufferHandler(BaseCallbackHandler):
+    """
+    tail 샘플링용 Langchain 콜백 (공개 BaseCallbackHandler 훅만 사용)
+
+    run 정보를 메모리에만 모으고 Langfuse로는 아무것도 보내지 않습니다.
+    root run이 끝나면 SampledTrace에 알리고, 보존이 결정되면 SampledTrace가
+    공개 클라이언트 API(trace/span/generation)로 기록합니다.
+    """
+
+    def __init__(self, sampled: "SampledTrace"):
+        self._sampled = sampled
+        self.runs: Dict[str, _BufferedRun] = {}
+        self.root: Optional[_BufferedRun] = None
+
+    def _start(
+        self, run_id, parent_run_id, name: str, kind: str, input: Any, model: Optional[str] = None
+    ):
+        run = _BufferedRun(run_id, parent_run_id, name, kind, input, model)
+        self.runs[run.run_id] = run
+        if parent_run_id is None:
+            self.root = run
+
+    def _end(self, run_id, output: Any = None, error: Optional[BaseException] = None):
+        run = self.runs.get(str(run_id))
+        if run is None:
+            return
+        run.end_time = datetime.now(timezone.utc)
+        run.output = output
+        if error is not None:
+            run.level, run.status_message = "ERROR", f"{type(error).__name__}: {error}"
+            self._sampled.error = True
+        if run is self.root:
+            self._sampled._root_finished((run.end_time - run.start_time).total_seconds())
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, _run_name(serialized, kwargs, "chain"), "span", inputs)
+
+    def on_chain_end(self, outputs, *, run_id, parent_run_id=None, **kwargs):
+        self._end(run_id, outputs)
+
+    def on_chain_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        self._end(run_id, error=error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, _run_name(serialized, kwargs, "tool"), "span", input_str)
+
+    def on_tool_end(self, output, *, run_id, parent_run_id=None, **kwargs):
+        self._end(run_id, output)
+
+    def on_tool_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        self._end(run_id, error=error)
+
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs):
+        self._start(
+            run_id, parent_run_id, _run_name(serialized, kwargs, "retriever"), "span", query
+        )
+
+    def on_retriever_end(self, documents, *, run_id, parent_run_id=None, **kwargs):
+        self._end(run_id, documents)
+
+    def on_retriever_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        self._end(run_id, error=error)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        model = (kwargs.get('invocation_params') or {}).get('model_name')
+        self._start(
+            run_id,
+            parent_run_id,
+            _run_name(serialized, kwargs, "llm"),
+            "generation",
+            prompts,
+            model,
+        )
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        model = (kwargs.get('invocation_params') or {}).get('model_name')
+        self._start(
+            run_id,
+            parent_run_id,
+            _run_name(serialized, kwargs, "chat_model"),
+            "generation",
+            [
+                [
+                    {"role": getattr(m, 'type', None), "content": getattr(m, 'content', m)}
+                    for m in batch
+                ]
+                for batch in messages
+            ],
+            model,
+        )
+
+    def on_llm_end(self, response, *, run_id, parent_run_id=None, **kwargs):
+        generations = getattr(response, 'generations', None) or [[]]
+        output = generations[-1][-1].text if generations[-1] else None
+        run = self.runs.get(str(run_id))
+        llm_output = getattr(response, 'llm_output', None) or {}
+        if run is not None:
+            run.usage = llm_output.get('token_usage')
+            run.model = run.model or llm_output.get('model_name')
+        self._end(run_id, output)
+
+    def on_llm_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        self._end(run_id, error=error)
+
+
+class SampledTrace:
+    """
+    샘플링 결정 대상 trace 하나
+
+    config를 Langchain 호출에 넘기고, 실행 후 finish(score=...)로 결정을 마무리합니다.
+    tail 샘플링에서는 결정 전까지 run 정보가 콜백 버퍼에만 쌓이고, 보존될 때만
+    공개 클라이언트 API로 trace와 span/generation이 만들어집니다.
+    """
+
+    def __init__(
+        self, pool: "SamplingHandlerPool", trace_id: str, mode: str, trace_kwargs: Dict[str, Any]
+    ):
+        self.pool = pool
+        self.trace_id = trace_id
+        self.mode = mode
+        self.error = False
+        self.duration: Optional[float] = None
+        self.kept: Optional[bool] = None
+        self.reason: Optional[str] = None
+
+        self._trace_kwargs = trace_kwargs
+        if mode == "tail":
+            # 결정 전까지는 trace를 만들지 않음 (보존될 때 _emit에서 생성)
+            self._buffer = _TailBufferHandler(self)
+            self._trace = None
+            handler = self._buffer
+        else:
+            self._buffer = None
+            self._trace = pool.langfuse.trace(id=trace_id, **trace_kwargs)
+            handler = self._trace.get_langchain_handler(update_parent=True)
+            self.kept, self.reason = True, "head"
+
+        self.config = {"callbacks": [handler], "run_name": trace_kwargs.get('name')}
+
+    def _emit(self):
+        """버퍼의 run들을 공개 클라이언트 API로 trace/span/generation으로 기록합니다"""
+        buffer = self._buffer
+        root = buffer.root
+        trace_kwargs = dict(self._trace_kwargs)
+        if root is not None:
+            trace_kwargs.setdefault('input', root.input)
+            trace_kwargs.setdefault('output', root.output)
+        self._trace = self.pool.langfuse.trace(id=self.trace_id, **trace_kwargs)
+
+        clients = {}
+        for run in sorted(buffer.runs.values(), key=lambda r: r.start_time):
+            parent = clients.get(run.parent_run_id, self._trace)
+            options = dict(id=run.run_id, name=run.name, input=run.input, output=run.output,
+                           start_time=run.start_time, end_time=run.end_time,
+                           level=run.level, status_message=run.status_message)
+            if run.kind == "generation":
+                clients[run.run_id] = parent.generation(model=run.model, usage=run.usage, **options)
+            else:
+                clients[run.run_id] = parent.span(**options)
+
+    def _root_finished(self, duration: float):
+        self.duration = duration
+        # 점수가 필요 없거나 이미 보존 사유가 생긴 경우 즉시 결정
+        if not self.pool.tail.needs_score or self.pool.tail.reason(
+            self.error, duration, None, baseline=False
+        ):
+            self.finish()
+
+    def finish(self, score: Optional[float] = None, score_name: str = "quality",
+               error: Optional[bool] = None, duration: Optional[float] = None) -> bool:
+        """tail 샘플링 결정을 내리고 보존 여부를 반환합니다 (error/duration으로 측정값을 덮어쓸 수 있음)"""
+        if self.kept is not None and self._buffer is None:
+            if score is not None and self.kept:
+                self._trace.score(name=score_name, value=score)
+            return self.kept
+
+        if error is not None:
+            self.error = error
+        if duration is not None:
+            self.duration = duration
+
+        self.reason = self.pool.tail.reason(self.error, self.duration, score)
+        self.kept = self.reason is not None
+        if self.kept:
+            self._emit()
+            if score is not None:
+                self._trace.score(name=score_name, value=score)
+        self._buffer = None
+        self.pool._record(self)
+        return self.kept
+
+
+class _DroppedTrace:
+    """head 샘플링에서 제외된 trace (콜백 없음, 결정 비용 외 추가 작업 없음)"""
+
+    __slots__ = ()
+    kept = False
+    reason = "head_dropped"
+    config = {"callbacks": []}
+
+    def finish(self, *args, **kwargs) -> bool:
+        return False
+
+
+_DROPPED_TRACE = _DroppedTrace()
+
+
+class SamplingHandlerPool(CallbackHandlerPool):
+    """
+    head/tail 샘플링을 적용하는 CallbackHandler 풀
+
+    head 샘플러가 제외한 요청은 콜백 없이 실행되고, 통과한 요청은 tail 샘플러가 있으면
+    버퍼링 후 실행 결과로, 없으면 바로 추적됩니다.
+    """
+
+    def __init__(self, langfuse: Optional[Langfuse] = None, head: Optional[HeadSampler] = None,
+                 tail: Optional[TailSampler] = None, **trace_defaults):
+        super().__init__(langfuse, **trace_defaults)
+        self.head = head
+        self.tail = tail
+        self.stats = Counter()
+
+    def start(self, name: str, user_id: Optional[str] = None, tags: Sequence[str] = (),
+              metadata: Optional[Dict[str, Any]] = None, **trace_kwargs):
+        self.stats['started'] += 1
+        trace_uuid = uuid.uuid4()
+        if self.head is not None and not self.head.sample(trace_uuid, user_id, tags):
+            self.stats['head_dropped'] += 1
+            return _DROPPED_TRACE
+
+        options = {**self.trace_defaults, **trace_kwargs}
+        options['metadata'] = {**self.trace_defaults.get('metadata', {}), **(metadata or {})}
+        options.update(name=name, user_id=user_id, tags=list(tags) or options.get('tags'))
+        self.created += 1
+
+        if self.tail is None:
+            self.stats['kept'] += 1
+            return SampledTrace(self, str(trace_uuid), "head", options)
+        return SampledTrace(self, str(trace_uuid), "tail", options)
+
+    def _record(self, sampled: SampledTrace):
+        if sampled.kept:
+            self.stats['kept'] += 1
+            self.stats[f"kept_{sampled.reason}"] += 1
+        else:
+            self.stats['tail_dropped'] += 1
+
+
+# ============================================================
+# 페이로드 처리 (Payload Processing)
+# ============================================================
+
+class PayloadProcessor:
+    """
+    전송 직전의 input/output을 줄이는 Langfuse mask 함수
+
+    Langfuse(mask=...) 또는 CallbackHandler(mask=...)에 넘기면 전송 스레드가 직렬화 전에
+    호출합니다. 한 번의 재귀 순회로 다음을 처리합니다.
+      - redact_keys에 해당하는 필드 값을 마스킹
+      - dedupe_min_chars 이상인 문자열이 한 페이로드 안에서 다시 나오면 두 번째부터
+        콘텐츠 해시 참조(<blob sha256:…>)로 대체 (첫 번째는 아래 길이 제한만 적용)
+      - max_string_chars/max_list_items를 넘는 문자열과 리스트를 잘라냄
+
+    blob_store 디렉터리를 주면 긴 문자열 전체를 sha256 이름으로 저장하고, 잘린 문자열의
+    표시에도 해시를 남깁니다. 이미 저장된 문자열은 다른 페이로드(다른 trace)에서도 참조로
+    대체되며, 참조나 잘린 문자열은 load_blob()으로 원문을 찾을 수 있습니다. blob_store가
+    없으면 참조는 같은 페이로드의 첫 번째(잘린) 사본과 같은 내용이라는 표시일 뿐입니다.
+    저장 여부는 최근 max_known_blobs개 해시까지 메모리에 기억해 파일 확인을 건너뜁니다.
+
+    원본은 수정하지 않으며, 변경이 생긴 컨테이너만 얕게 새로 만들고 나머지는 그대로 공유합니다.
+    """
+
+    def __init__(
+        self,
+        max_string_chars: int = 2000,
+        max_list_items: int = 50,
+        dedupe_min_chars: int = 1000,
+        redact_keys: Sequence[str] = ("api_key", "password", "authorization", "ssn"),
+        max_depth: int = 20,
+        blob_store: Optional[str] = None,
+        max_known_blobs: int = 100_000,
+    ):
+        self.max_string_chars = max_string_chars
+        self.max_list_items = max_list_items
+        self.dedupe_min_chars = dedupe_min_chars
+        self.redact_keys = frozenset(key.lower() for key in redact_keys)
+        self.max_depth = max_depth
+        self.blob_store = blob_store
+        if blob_store:
+            os.makedirs(blob_store, exist_ok=True)
+        self.max_known_blobs = max_known_blobs
+        self.stats = Counter()
+        self._known_blobs: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, *, data: Any) -> Any:
+        return self.process(data)
+
+    def process(self, data: Any) -> Any:
+        stats = Counter()
+        # 페이로드 단위 상태: 문자열 객체별 해시와 이미 내보낸 긴 문자열의 해시
+        scope = {"digests": {}, "seen": set()}
+        result = self._process(data, 0, stats, scope)
+        with self._lock:
+            self.stats.update(stats)
+        return result
+
+    def _digest(self, text: str, scope: Dict[str, Any]) -> str:
+        digest = scope['digests'].get(id(text))
+        if digest is None:
+            digest = hashlib.sha256(text.encode('utf-8', 'surrogatepass')).hexdigest()
+            scope['digests'][id(text)] = digest
+        return digest
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_store, f"{digest}.txt")
+
+    def _store_blob(self, digest: str, text: str) -> bool:
+        """blob을 저장하고, 이미 저장되어 있었으면 True를 반환합니다"""
+        with self._lock:
+            if digest in self._known_blobs:
+                self._known_blobs.move_to_end(digest)
+                return True
+        path = self._blob_path(digest)
+        stored_before = os.path.exists(path)
+        if not stored_before:
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, "w", encoding="utf-8", errors="surrogatepass") as f:
+                f.write(text)
+            os.replace(temp_path, path)
+        with self._lock:
+            self._known_blobs[digest] = None
+            if len(self._known_blobs) > self.max_known_blobs:
+                self._known_blobs.popitem(last=False)
+        return stored_before
+
+    def load_blob(self, reference: str) -> Optional[str]:
+        """<blob sha256:…> 참조나 잘린 문자열에 남은 해시로 blob_store의 원문을 읽습니다"""
+        match = re.search(r"sha256:([0-9a-f]{64})", reference)
+        if not self.blob_store or not match or not os.path.exists(self._blob_path(match.group(1))):
+            return None
+        with open(self._blob_path(match.group(1)), encoding="utf-8", errors="surrogatepass") as f:
+            return f.read()
+
+    def _process_string(self, text: str, stats: Counter, scope: Dict[str, Any]) -> str:
+        digest = None
+        if len(text) >= self.dedupe_min_chars:
+            digest = self._digest(text, scope)
+            stored_before = False
+            if digest not in scope['seen'] and self.blob_store:
+                stored_before = self._store_blob(digest, text)
+                if not stored_before:
+                    stats['blobs_stored'] += 1
+            if digest in scope['seen'] or stored_before:
+                reference = f"<blob sha256:{digest} ({len(text)} chars)>"
+                stats['blobs_deduped'] += 1
+                stats['chars_saved'] += len(text) - len(reference)
+                return reference
+            scope['seen'].add(digest)
+        if len(text) > self.max_string_chars:
+            omitted = len(text) - self.max_string_chars
+            stats['strings_truncated'] += 1
+            stats['chars_saved'] += omitted
+            blob = f", blob sha256:{digest}" if digest and self.blob_store else ""
+            return f"{text[:self.max_string_chars]}…[truncated {omitted} chars{blob}]"
+        return text
+
+    def _process(self, value: Any, depth: int, stats: Counter, scope: Dict[str, Any]) -> Any:
+        if isinstance(value, str):
+            return self._process_string(value, stats, scope)
+        if depth >= self.max_depth and isinstance(value, (dict, list, tuple)):
+            return "<max depth exceeded>"
+
+        if isinstance(value, dict):
+            result = None
+            for key, item in value.items():
+                if isinstance(key, str) and key.lower() in self.redact_keys:
+                    processed = "<redacted>"
+                    stats['fields_redacted'] += 1
+                else:
+                    processed = self._process(item, depth + 1, stats, scope)
+                if processed is not item and result is None:
+                    result = dict(value)
+                if result is not None:
+                    result[key] = processed
+            return value if result is None else result
+
+        if isinstance(value, (list, tuple)):
+            items = value
+            overflow = len(value) - self.max_list_items
+            if overflow > 0:
+                items = value[:self.max_list_items]
+                stats['lists_truncated'] += 1
+            result = None
+            for index, item in enumerate(items):
+                processed = self._process(item, depth + 1, stats, scope)
+                if processed is not item and result is None:
+                    result = list(items[:index])
+                if result is not None:
+                    result.append(processed)
+            if result is None and overflow <= 0:
+                return value
+            result = list(items) if result is None else result
+            if overflow > 0:
+                result.append(f"…[+{overflow} items]")
+            return result
+
+        # Langchain Document 등 page_content를 가진 객체
+        page_content = getattr(value, 'page_content', None)
+        if isinstance(page_content, str):
+            return {
+                "page_content": self._process_string(page_content, stats, scope),
+                "metadata": self._process(getattr(value, 'metadata', None), depth + 1, stats, scope)
+            }
+        return value
+
+
+# ============================================================
+# 로컬 벡터 검색 (Vector Retrieval)
+# ============================================================
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=200_000)
+def _feature_bucket(feature: str, dim: int):
+    """feature를 (차원, 부호)로 해싱합니다 (프로세스 간에도 동일한 crc32 사용)"""
+    h = zlib.crc32(feature.encode('utf-8'))
+    return h % dim, 1.0 if (h // dim) & 1 else -1.0
+
+
+class HashingEmbedder:
+    """
+    외부 모델 없이 동작하는 결정적 해싱 임베딩 (unigram + bigram)
+
+    실제 환경에서는 OpenAIEmbeddings 등으로 교체하며, embed_documents/embed_query
+    인터페이스와 L2 정규화된 float32 행렬 출력은 동일하게 유지합니다.
+    """
+
+    def __init__(self, dim: int = 256, model: str = "local-hashing-256"):
+        self.dim = dim
+        self.model = model
+
+    def embed_documents(self, texts: Sequence[str]) -> np.ndarray:
+        rows, cols, signs = [], [], []
+        for row, text in enumerate(texts):
+            words = _WORD_PATTERN.findall(text.lower())
+            features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+            for feature in features:
+                col, sign = _feature_bucket(feature, self.dim)
+                rows.append(row)
+                cols.append(col)
+                signs.append(sign)
+
+        flat = np.asarray(rows, dtype=np.int64) * self.dim + np.asarray(cols, dtype=np.int64)
+        vectors = np.bincount(flat, weights=np.asarray(signs), minlength=len(texts) * self.dim)
+        vectors = vectors.reshape(len(texts), self.dim).astype(np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.embed_documents([text])[0]
+
+
+def _top_k(scores: np.ndarray, k: int):
+    """점수 상위 k개의 (위치, 점수)를 내림차순으로 반환합니다"""
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return top, scores[top]
+
+
+class BruteForceIndex:
+    """모든 벡터와 내적을 계산하는 정확한 인덱스"""
+
+    kind = "flat"
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+
+    def search(self, query: np.ndarray, k: int):
+        """(인덱스, 점수, 스캔한 후보 수)를 반환합니다"""
+        indices, scores = _top_k(self.vectors @ query, k)
+        return indices, scores, len(self.vectors)
+
+
+class IVFIndex:
+    """
+    k-means 파티션 기반 근사 인덱스 (Inverted File)
+
+    벡터를 n_lists개 클러스터로 나누고, 검색 시 질의와 가까운 n_probe개 클러스터의
+    벡터만 비교합니다. n_probe를 늘리면 recall이 오르고 스캔 비용도 늘어납니다.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, vectors: np.ndarray, n_lists: int = 64, n_probe: int = 8,
+                 iterations: int = 10, seed: int = 0):
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.n_lists = min(n_lists, len(vectors))
+        self.n_probe = n_probe
+
+        rng = np.random.default_rng(seed)
+        centroids = self.vectors[rng.choice(len(vectors), self.n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(self.vectors @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, self.vectors)
+            counts = np.bincount(assignment, minlength=self.n_lists)
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = self.vectors[rng.choice(len(vectors), int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.maximum(norms, 1e-12)
+
+        self.centroids = centroids.astype(np.float32)
+        assignment = np.argmax(self.vectors @ self.centroids.T, axis=1)
+        self._members = np.argsort(assignment, kind='stable')
+        self._offsets = np.concatenate(
+            [[0], np.cumsum(np.bincount(assignment, minlength=self.n_lists))]
+        )
+
+    def search(self, query: np.ndarray, k: int, n_probe: Optional[int] = None):
+        """(인덱스, 점수, 스캔한 후보 수)를 반환합니다"""
+        probes, _ = _top_k(self.centroids @ query, n_probe or self.n_probe)
+        candidates = np.concatenate(
+            [self._members[self._offsets[p] : self._offsets[p + 1]] for p in probes]
+        )
+        top, scores = _top_k(self.vectors[candidates] @ query, k)
+        return candidates[top], scores, len(candidates) + self.n_lists
+
+
+class EmbeddingCache:
+    """
+    (model, 텍스트 해시)를 키로 하는 디스크 임베딩 캐시
+
+    모델마다 두 파일을 사용합니다.
+      - {model}.f32: float32 벡터 행렬 (np.memmap, 용량이 차면 두 배로 확장)
+      - {model}.idx: 헤더(매직, 버전, 차원) + 행 순서대로 이어 붙인
+        (16바이트 SHA-256 다이제스트, 벡터 행의 crc32) 레코드 (인덱스 파일)
+
+    벡터를 먼저 기록/flush한 뒤 키를 추가합니다. 열 때 인덱스의 쓰다 만 꼬리 레코드는
+    잘라내고, 각 행의 crc32를 벡터 파일과 대조해 맞지 않는 행은 색인에서 제외합니다
+    (해당 텍스트는 캐시 미스로 다시 임베딩되어 새 행에 저장됩니다).
+    """
+
+    KEY_BYTES = 16
+    MAGIC = b"EMBIDX"
+    VERSION = 1
+    _HEADER = struct.Struct("<6sHI")
+    _RECORD = struct.Struct("<16sI")
+
+    def __init__(self, directory: str, model: str, dim: int, initial_capacity: int = 1024):
+        os.makedirs(directory, exist_ok=True)
+        slug = re.sub(r"[^\w.-]", "_", model)
+        self.model = model
+        self.dim = dim
+        self.vectors_path = os.path.join(directory, f"{slug}.f32")
+        self.keys_path = os.path.join(directory, f"{slug}.idx")
+        self.hits = 0
+        self.misses = 0
+        self.corrupted_rows = 0
+        self._lock = threading.Lock()
+
+        header = self._HEADER.pack(self.MAGIC, self.VERSION, dim)
+        index = b""
+        if os.path.exists(self.keys_path):
+            with open(self.keys_path, "rb") as f:
+                index = f.read()
+        if len(index) < self._HEADER.size:
+            index = header
+        elif index[:self._HEADER.size] != header:
+            magic, version, stored_dim = self._HEADER.unpack_from(index)
+            raise ValueError(f"{self.keys_path} is not a v{self.VERSION} index for dim={dim} "
+                             f"(magic={magic!r}, version={version}, dim={stored_dim})")
+
+        # 쓰다 만 꼬리 레코드는 잘라낸 뒤 이어서 추가합니다
+        self._count = (len(index) - self._HEADER.size) // self._RECORD.size
+        valid_bytes = self._HEADER.size + self._count * self._RECORD.size
+        with open(self.keys_path, "ab") as f:
+            if f.tell() == 0:
+                f.write(header)
+            f.truncate(valid_bytes)
+
+        row_bytes = dim * 4
+        stored_rows = (
+            os.path.getsize(self.vectors_path) // row_bytes
+            if os.path.exists(self.vectors_path)
+            else 0
+        )
+        self._capacity = max(initial_capacity, stored_rows, self._count)
+        self._open(self._capacity)
+
+        self._rows = {}
+        for row, (digest, checksum) in enumerate(
+            self._RECORD.iter_unpack(index[self._HEADER.size : valid_bytes])
+        ):
+            if row < stored_rows and zlib.crc32(self._vectors[row].tobytes()) == checksum:
+                self._rows[digest] = row
+            else:
+                self.corrupted_rows += 1
+        self._keys_file = open(self.keys_path, "ab")
+
+    def _open(self, capacity: int):
+        with open(self.vectors_path, "ab") as f:
+            if f.tell() < capacity * self.dim * 4:
+                f.truncate(capacity * self.dim * 4)
+        self._vectors = np.memmap(
+            self.vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim)
+        )
+
+    @classmethod
+    def digest(cls, text: str) -> bytes:
+        return hashlib.sha256(text.encode("utf-8")).digest()[:cls.KEY_BYTES]
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get_many(self, texts: Sequence[str]):
+        """(벡터 행렬, 캐시에 없는 위치 목록)을 반환합니다 (없는 위치의 행은 0)"""
+        digests = [self.digest(text) for text in texts]
+        result = np.zeros((len(texts), self.dim), dtype=np.float32)
+        with self._lock:
+            rows = [self._rows.get(digest) for digest in digests]
+            found = [i for i, row in enumerate(rows) if row is not None]
+            if found:
+                result[found] = self._vectors[[rows[i] for i in found]]
+            missing = [i for i, row in enumerate(rows) if row is None]
+            self.hits += len(found)
+            self.misses += len(missing)
+        return result, missing
+
+    def put_many(self, texts: Sequence[str], vectors: np.ndarray):
+        """텍스트와 벡터를 일괄 추가합니다 (이미 있는 텍스트는 건너뜀)"""
+        with self._lock:
+            new_rows, new_keys = [], []
+            seen = set()
+            for i, text in enumerate(texts):
+                digest = self.digest(text)
+                if digest not in self._rows and digest not in seen:
+                    seen.add(digest)
+                    new_rows.append(i)
+                    new_keys.append(digest)
+            if not new_rows:
+                return
+
+            start = self._count
+            end = start + len(new_rows)
+            if end > self._capacity:
+                self._vectors.flush()
+                while end > self._capacity:
+                    self._capacity *= 2
+                self._open(self._capacity)
+
+            self._vectors[start:end] = vectors[new_rows]
+            self._vectors.flush()
+            self._keys_file.write(b"".join(
+                self._RECORD.pack(digest, zlib.crc32(self._vectors[start + offset].tobytes()))
+                for offset, digest in enumerate(new_keys)
+            ))
+            self._keys_file.flush()
+            for offset, digest in enumerate(new_keys):
+                self._rows[digest] = start + offset
+            self._count = end
+
+    def close(self):
+        with self._lock:
+            self._vectors.flush()
+            self._keys_file.close()
+
+
+class CachedEmbedder:
+    """
+    EmbeddingCache를 거치는 임베더 래퍼
+
+    일괄 조회 후 캐시에 없는 텍스트만 한 번의 embed_documents 호출로 임베딩하고 저장합니다.
+    last_hits/last_misses에 직전 호출의 적중 수가 남습니다.
+    """
+
+    def __init__(self, embedder: HashingEmbedder, cache: EmbeddingCache):
+        if cache.model != embedder.model or cache.dim != embedder.dim:
+            raise ValueError(
+                f"Cache is for {cache.model}/{cache.dim}, "
+                f"embedder is {embedder.model}/{embedder.dim}"
+            )
+        self.embedder = embedder
+        self.cache = cache
+        self.model = embedder.model
+        self.dim = embedder.dim
+        self.last_hits = 0
+        self.last_misses = 0
+
+    def embed_documents(self, texts: Sequence[str]) -> np.ndarray:
+        vectors, missing = self.cache.get_many(texts)
+        if missing:
+            # 같은 배치 안의 중복 텍스트는 한 번만 임베딩
+            unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+            embedded = self.embedder.embed_documents(unique_texts)
+            self.cache.put_many(unique_texts, embedded)
+            positions = {text: row for row, text in enumerate(unique_texts)}
+            vectors[missing] = embedded[[positions[texts[i]] for i in missing]]
+        self.last_hits = len(texts) - len(missing)
+        self.last_misses = len(missing)
+        return vectors
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.embed_documents([text])[0]
+
+
+class VectorRetriever:
+    """
+    문서를 임베딩해 인덱싱하고, 검색을 retriever span으로 추적하는 로컬 검색기
+
+    span에는 질의 임베딩 시간, 검색 시간, 상위 k개 점수, 스캔한 후보 수가 기록됩니다.
+    trace를 넘기면 문서 임베딩 단계도 embed_documents span으로 기록하며,
+    CachedEmbedder를 쓰면 두 span 모두에 캐시 적중 정보가 추가됩니다.
+    """
+
+    def __init__(self, documents: Sequence[Dict[str, Any]], embedder=None,
+                 index: str = "flat", trace=None, **index_options):
+        self.documents = list(documents)
+        self.embedder = embedder or HashingEmbedder()
+
+        span = trace.span(
+            name="embed_documents",
+            metadata={"embedding_model": self.embedder.model, "documents": len(self.documents)}
+        ) if trace is not None else None
+        start = time.perf_counter()
+        vectors = self.embedder.embed_documents([doc['content'] for doc in self.documents])
+        if span is not None:
+            span.end(metadata={"embedding_ms": round((time.perf_counter() - start) * 1000, 3),
+                               **self._cache_metadata()})
+
+        if index == "ivf":
+            self.index = IVFIndex(vectors, **index_options)
+        else:
+            self.index = BruteForceIndex(vectors)
+
+    def retrieve(
+        self, query: str, k: int = 3, trace=None, **search_options
+    ) -> List[Dict[str, Any]]:
+        span = trace.span(
+            name="retriever",
+            input={"query": query},
+            metadata={"index": self.index.kind, "top_k": k, "embedding_model": self.embedder.model,
+                      "corpus_size": len(self.documents)}
+        ) if trace is not None else None
+
+        start = time.perf_counter()
+        query_vector = self.embedder.embed_query(query)
+        embedded = time.perf_counter()
+        indices, scores, scanned = self.index.search(query_vector, k, **search_options)
+        searched = time.perf_counter()
+
+        results = [
+            {**self.documents[i], "score": round(float(score), 4)}
+            for i, score in zip(indices.tolist(), scores.tolist())
+        ]
+
+        if span is not None:
+            span.end(
+                output=[{"source": doc.get('source'), "score": doc['score']} for doc in results],
+                metadata={
+                    "index": self.index.kind,
+                    "embedding_ms": round((embedded - start) * 1000, 3),
+                    "search_ms": round((searched - embedded) * 1000, 3),
+                    "top_k_scores": [doc['score'] for doc in results],
+                    "candidates_scanned": scanned,
+                    **self._cache_metadata()
+                }
+            )
+        return results
+
+    def _cache_metadata(self) -> Dict[str, Any]:
+        if not isinstance(self.embedder, CachedEmbedder):
+            return {}
+        embedder = self.embedder
+        total = embedder.last_hits + embedder.last_misses
+        return {
+            "cache_hits": embedder.last_hits,
+            "cache_misses": embedder.last_misses,
+            "cache_hit_rate": round(embedder.last_hits / total, 4) if total else 0.0,
+            "cache_hit_rate_total": round(embedder.cache.hit_rate, 4)
+        }
+
+
+RAG_DOCUMENTS = [
+    {
+        "content": "Langfuse provides comprehensive LLM observability "
+        "with traces, spans and generations.",
+        "source": "docs/intro.md",
+    },
+    {
+        "content": "With Langfuse, you can track costs, latency, and quality of every LLM call.",
+        "source": "docs/features.md",
+    },
+    {
+        "content": "Langfuse integrates seamlessly with Langchain through the CallbackHandler.",
+        "source": "docs/integrations.md",
+    },
+    {
+        "content": "Prompt management in Langfuse versions prompts and links them to generations.",
+        "source": "docs/prompts.md",
+    },
+    {
+        "content": "Datasets and experiments let you benchmark models on fixed test cases.",
+        "source": "docs/datasets.md",
+    },
+    {
+        "content": "Scores capture user feedback and automated evaluation results for traces.",
+        "source": "docs/scores.md",
+    },
+    {
+        "content": "Sessions group multi-turn conversations so you can replay a whole chat.",
+        "source": "docs/sessions.md",
+    },
+    {
+        "content": "Self-hosting Langfuse requires Postgres and can run with Docker Compose.",
+        "source": "docs/self-hosting.md",
+    },
+]
+
+
 def simple_llm_call_with_callback():
     """
     기본 LLM 호출 + Langfuse 콜백 예제
@@ -255,38 +1331,35 @@ def retrieval_qa_with_callback():
     print("5. RAG (Retrieval Augmented Generation) 추적")
     print("=" * 60)
 
-    langfuse_handler = CallbackHandler()
+    # 대용량 컨텍스트를 전송 전에 줄이는 mask 함수 (잘린 원문은 실행별 blob 디렉터리에 보관)
+    blob_dir = tempfile.mkdtemp(prefix="langfuse_blobs_")
+    payload_processor = PayloadProcessor(max_string_chars=1000, dedupe_min_chars=500,
+                                         blob_store=blob_dir)
+    langfuse = Langfuse(mask=payload_processor)
 
-    langfuse_handler.trace(
+    # 검색 span과 Chain 실행이 같은 trace에 기록되도록 trace에서 핸들러를 얻음
+    trace = langfuse.trace(
         name="rag_pipeline",
         metadata={
             "pipeline_type": "retrieval_qa",
-            "vector_store": "chroma"
+            "vector_store": "local_numpy"
         }
     )
+    langfuse_handler = trace.get_langchain_handler(update_parent=True)
+
+    # 디스크 임베딩 캐시 (실행별 디렉터리, 재사용 효과는 embedding_cache_example 참고)
+    embedder = HashingEmbedder()
+    cache_dir = tempfile.mkdtemp(prefix="embedding_cache_")
+    cache = EmbeddingCache(cache_dir, model=embedder.model, dim=embedder.dim)
+    retriever = VectorRetriever(
+        RAG_DOCUMENTS, embedder=CachedEmbedder(embedder, cache), trace=trace
+    )
 
-    # RAG 파이프라인 시뮬레이션
     print("\n[Step 1] 문서 검색 (Retrieval)")
 
     query = "What are the benefits of using Langfuse?"
 
-    retrieved_docs = [
-        {
-            "content": "Langfuse provides comprehensive LLM observability...",
-            "score": 0.92,
-            "source": "docs/intro.md"
-        },
-        {
-            "content": "With Langfuse, you can track costs, latency, and quality...",
-            "score": 0.88,
-            "source": "docs/features.md"
-        },
-        {
-            "content": "Langfuse integrates seamlessly with Langchain...",
-            "score": 0.85,
-            "source": "docs/integrations.md"
-        }
-    ]
+    retrieved_docs = retriever.retrieve(query, k=3, trace=trace)
 
     print(f"  Query: {query}")
     print(f"  Retrieved: {len(retrieved_docs)} documents")
@@ -312,8 +1385,54 @@ Question: {query}"""
     print(f"  Context Length: {len(context)} chars")
     print(f"  Generated Answer: {answer[:80]}...")
 
+    # 실제 규모의 컨텍스트로 전송 페이로드 비교 (청크 40개, 수백 KB)
+    print("\n[Step 3] 전송 페이로드 처리 (mask)")
+
+    large_docs = [
+        {
+            "content": f"[chunk {i}] " + doc['content'] * 150,
+            "score": doc['score'],
+            "source": doc['source'],
+        }
+        for i, doc in enumerate(retrieved_docs * 14)
+    ][:40]
+    large_context = "\n\n".join(doc['content'] for doc in large_docs)
+    large_prompt = (
+        "Answer the question based on the following context:\n\n"
+        f"{large_context}\n\nQuestion: {query}"
+    )
+
+    # 콜백이 전송하는 input/output: retriever 출력, 중첩 chain 입력(같은 컨텍스트 반복), LLM 입력
+    events = [
+        {"documents": large_docs},
+        {"question": query, "context": large_context},
+        {"question": query, "context": large_context},
+        {"prompt": large_prompt, "api_key": "sk-live-..."}
+    ]
+
+    raw_bytes = sum(len(json.dumps(event, ensure_ascii=False)) for event in events)
+    start = time.perf_counter()
+    processed = [payload_processor(data=event) for event in events]
+    elapsed = time.perf_counter() - start
+    processed_bytes = sum(len(json.dumps(event, ensure_ascii=False)) for event in processed)
+
+    print(f"  원본 페이로드: {raw_bytes / 1024:.1f}KB → 처리 후: {processed_bytes / 1024:.1f}KB "
+          f"({elapsed * 1000:.2f}ms)")
+    print(f"  처리 통계: {dict(payload_processor.stats)}")
+    truncated = payload_processor.load_blob(processed[1]['context'])
+    restored = payload_processor.load_blob(processed[2]['context'])
+    print(f"  잘린 context 원문 복원: {truncated == large_context}, "
+          f"반복 context 참조 복원: {restored == large_context}")
+    shutil.rmtree(blob_dir, ignore_errors=True)
+
+    cache.close()
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    langfuse.flush()
+
+    print(f"\n  임베딩 캐시: {len(cache)}개 저장, 적중률 {cache.hit_rate * 100:.0f}%")
+
     print("\n✓ RAG 파이프라인 전체가 Langfuse에 추적됨")
-    print("  - 검색된 문서와 관련성 점수")
+    print("  - 검색된 문서와 관련성 점수 (retriever span)")
     print("  - 컨텍스트 구성")
     print("  - 최종 생성 결과")
     print("  - 전체 파이프라인 실행 시간")
@@ -447,7 +1566,8 @@ def batch_processing_with_callback():
     print("8. 배치 처리 + Langfuse 추적")
     print("=" * 60)
 
-    langfuse = Langfuse()
+    # 모든 아이템 핸들러가 하나의 클라이언트와 전송 큐를 공유
+    pool = CallbackHandlerPool(tags=["batch"])
 
     batch_id = "batch_20240101_001"
     items = [
@@ -461,20 +1581,57 @@ def batch_processing_with_callback():
     print(f"\nBatch ID: {batch_id}")
     print(f"Items: {len(items)}개\n")
 
-    for i, item in enumerate(items, 1):
-        langfuse_handler = CallbackHandler()
+    # 아이템별 trace 이름과 핸들러를 담은 config 목록
+    configs = pool.batch_configs(
+        items,
+        name_fn=lambda index, item: f"batch_item_{index}",
+        metadata={"batch_id": batch_id}
+    )
 
-        langfuse_handler.trace(
-            name=f"batch_item_{i}",
-            metadata={
-                "batch_id": batch_id,
-                "item_index": i,
-                "total_items": len(items)
-            }
-        )
+    # 실제 chain.batch 호출 (LLM 대신 요약을 흉내 내는 RunnableLambda 사용)
+    def summarize(prompt_value):
+        text = prompt_value.to_string() if hasattr(prompt_value, "to_string") else str(prompt_value)
+        return f"Summary of '{text.rsplit(':', 1)[-1].strip()}'"
 
+    chain = PromptTemplate.from_template("Summarize the following task: {task}") | RunnableLambda(
+        summarize
+    )
+    results = chain.batch([{"task": item} for item in items], config=configs)
+
+    for i, (item, config, result) in enumerate(zip(items, configs, results), 1):
         print(f"[{i}/{len(items)}] Processing: {item}")
-        print(f"  Status: ✓ Completed")
+        print(f"  Trace: {config['run_name']}")
+        print(f"  Output: {result}")
+
+    pool.flush()
+
+    # 핸들러 생성 비용 비교 (둘 다 콜백이 오기 전에는 trace를 만들지 않으므로 전송 없음)
+    created_before = pool.created
+    iterations = 200
+    start = time.perf_counter()
+    for i in range(iterations):
+        pool.handler(f"handler_cost_{i}", metadata={"batch_id": batch_id})
+    pooled_us = (time.perf_counter() - start) / iterations * 1e6
+
+    # 아이템마다 CallbackHandler()를 만들면 클라이언트와 전송 스레드가 매번 새로 생김
+    standalone_iterations = 20
+    standalone = []
+    start = time.perf_counter()
+    for i in range(standalone_iterations):
+        standalone.append(
+            CallbackHandler(
+                trace_name=f"handler_cost_{i}", metadata={"batch_id": batch_id}, tags=["batch"]
+            )
+        )
+    standalone_us = (time.perf_counter() - start) / standalone_iterations * 1e6
+    for handler in standalone:
+        if getattr(handler, "langfuse", None) is not None:
+            handler.langfuse.shutdown()
+
+    print(f"\n핸들러 생성 비용 (풀): {pooled_us:.1f}µs/개 ({iterations}개 생성)")
+    print(f"핸들러 생성 비용 (CallbackHandler()): {standalone_us:.1f}µs/개 ({standalone_iterations}개 생성)")
+    print(f"  - 풀은 클라이언트 1개, 전송 큐 1개 공유 "
+          f"(측정 중 생성된 trace: {pool.created - created_before}개)")
 
     print(f"\n✓ 배치 처리 완료")
     print(f"  - 모든 항목이 개별 trace로 기록됨")
@@ -482,6 +1639,235 @@ def batch_processing_with_callback():
     print(f"  - 배치 전체 성능 분석 가능")
 
 
+def sampled_tracing_example():
+    """
+    추적 샘플링 예제
+
+    대량 트래픽에서 head 샘플링으로 일부만 추적하고, tail 샘플링으로
+    에러/지연/저품질 요청만 골라 보존합니다.
+    """
+    print("\n" + "=" * 60)
+    print("9. Head/Tail 기반 추적 샘플링")
+    print("=" * 60)
+
+    rng = random.Random(7)
+    requests = []
+    for i in range(2000):
+        requests.append({
+            "user_id": "vip_user" if i % 200 == 0 else f"user_{i % 50}",
+            "tags": ["debug"] if i % 500 == 0 else [],
+            "latency": rng.lognormvariate(0.0, 0.6),
+            "error": rng.random() < 0.02,
+            "score": rng.betavariate(8, 2)
+        })
+
+    def simulate_chain_run(config, request):
+        # 실제 사용 시: chain.invoke(inputs, config=sampled.config)
+        run_id = uuid.uuid4()
+        for handler in config['callbacks']:
+            handler.on_chain_start(
+                {"name": "qa_chain"}, {"question": "..."}, run_id=run_id, parent_run_id=None
+            )
+            if request['error']:
+                handler.on_chain_error(
+                    RuntimeError("upstream timeout"), run_id=run_id, parent_run_id=None
+                )
+            else:
+                handler.on_chain_end({"answer": "..."}, run_id=run_id, parent_run_id=None)
+
+    def run(label, pool):
+        start = time.perf_counter()
+        for request in requests:
+            sampled = pool.start("sampled_qa", user_id=request['user_id'], tags=request['tags'])
+            simulate_chain_run(sampled.config, request)
+            # 지연 시간은 시뮬레이션 값, 점수는 실행 후 평가 결과
+            sampled.finish(
+                score=request['score'], duration=request['latency'], error=request['error']
+            )
+        elapsed = time.perf_counter() - start
+        pool.flush()
+
+        stats = pool.stats
+        print(f"\n[{label}]")
+        print(f"  - 요청: {stats['started']}개, 추적 보존: {stats['kept']}개 "
+              f"({stats['kept'] / stats['started'] * 100:.1f}%)")
+        reasons = {key[5:]: value for key, value in stats.items() if key.startswith("kept_")}
+        if reasons:
+            print(f"  - 보존 사유: {reasons}")
+        if stats['head_dropped'] or stats['tail_dropped']:
+            print(f"  - 제외: head {stats['head_dropped']}개, tail {stats['tail_dropped']}개")
+        print(f"  - 요청당 추적 오버헤드: {elapsed / len(requests) * 1e6:.1f}µs")
+
+    langfuse = Langfuse()
+
+    run("Head 샘플링 (5%, vip_user/debug 태그는 항상)", SamplingHandlerPool(
+        langfuse, head=HeadSampler(rate=0.05, always_users=["vip_user"], always_tags=["debug"])
+    ))
+
+    run("Tail 샘플링 (에러, 3초 이상, 점수 0.5 미만, 정상 1%)", SamplingHandlerPool(
+        langfuse, tail=TailSampler(slow_seconds=3.0, min_score=0.5, baseline_rate=0.01, seed=7)
+    ))
+
+    run("Head 50% + Tail", SamplingHandlerPool(
+        langfuse, head=HeadSampler(rate=0.5),
+        tail=TailSampler(slow_seconds=3.0, min_score=0.5, baseline_rate=0.01, seed=7)
+    ))
+
+    print("\n✓ 보존된 trace만 Langfuse로 전송됨")
+    print("  - head 제외 요청은 콜백 없이 실행")
+    print("  - tail 대상은 결정 전까지 메모리 버퍼에만 기록")
+
+
+def vector_retrieval_benchmark_example():
+    """
+    벡터 검색 벤치마크 예제
+
+    Brute-force와 IVF 인덱스의 검색 지연 시간과 recall@k를 오프라인으로 비교하고,
+    각 질의를 retriever span으로 기록합니다.
+    """
+    print("\n" + "=" * 60)
+    print("10. 벡터 검색 벤치마크 (Brute-force vs IVF)")
+    print("=" * 60)
+
+    # 주제별 어휘로 합성 문서 생성
+    rng = random.Random(3)
+    topics = {
+        "billing": "invoice payment refund charge subscription plan price card",
+        "auth": "login password token session sso oauth account lockout",
+        "tracing": "trace span generation latency callback handler observation flush",
+        "datasets": "dataset item experiment benchmark run evaluation baseline score",
+        "deploy": "docker kubernetes postgres migration helm upgrade backup replica",
+        "prompts": "prompt template version label variable compile cache rollout",
+    }
+    vocabulary = {topic: words.split() for topic, words in topics.items()}
+    common = "the a how to with for in of and is not my our".split()
+
+    def synthetic_text(topic):
+        words = rng.choices(vocabulary[topic], k=12) + rng.choices(common, k=8)
+        rng.shuffle(words)
+        return " ".join(words)
+
+    documents = []
+    for i in range(20_000):
+        topic = rng.choice(list(topics))
+        documents.append({"content": synthetic_text(topic), "source": f"kb/{topic}/{i}.md"})
+    queries = [synthetic_text(rng.choice(list(topics))) for _ in range(200)]
+
+    embedder = HashingEmbedder()
+    start = time.perf_counter()
+    vectors = embedder.embed_documents([doc['content'] for doc in documents])
+    print(f"\n문서 {len(documents):,}개 임베딩: {time.perf_counter() - start:.2f}s (dim={embedder.dim})")
+
+    flat = BruteForceIndex(vectors)
+    start = time.perf_counter()
+    ivf = IVFIndex(vectors, n_lists=64, n_probe=4)
+    print(f"IVF 학습 (64 lists): {time.perf_counter() - start:.2f}s")
+
+    query_vectors = embedder.embed_documents(queries)
+    k = 10
+    exact = [set(flat.search(q, k)[0].tolist()) for q in query_vectors]
+
+    langfuse = Langfuse()
+    trace = langfuse.trace(
+        name="vector_retrieval_benchmark", metadata={"corpus_size": len(documents), "k": k}
+    )
+
+    print(f"\n{'인덱스':<16} {'p50':>9} {'p95':>9} {'recall@10':>10} {'스캔 후보':>10}")
+    configurations = [("flat", flat, {})] + [
+        (f"ivf n_probe={p}", ivf, {"n_probe": p}) for p in (1, 4, 16)
+    ]
+    for label, index, options in configurations:
+        latencies, recalls, scanned = [], [], []
+        for q, truth in zip(query_vectors, exact):
+            start = time.perf_counter()
+            indices, _, candidates = index.search(q, k, **options)
+            latencies.append(time.perf_counter() - start)
+            recalls.append(len(truth & set(indices.tolist())) / k)
+            scanned.append(candidates)
+
+        p50, p95 = np.percentile(latencies, [50, 95]) * 1000
+        recall = float(np.mean(recalls))
+        print(f"{label:<16} {p50:>7.3f}ms {p95:>7.3f}ms {recall:>10.3f} {np.mean(scanned):>10,.0f}")
+
+        trace.span(
+            name=f"index_{label.replace(' ', '_')}",
+            metadata={
+                "p50_ms": round(p50, 3),
+                "p95_ms": round(p95, 3),
+                f"recall_at_{k}": round(recall, 4),
+                "mean_candidates_scanned": float(np.mean(scanned)),
+            },
+        ).end()
+
+    # 같은 trace 안에서 retriever span으로 개별 질의 기록
+    retriever = VectorRetriever(
+        documents[:2000], embedder=embedder, index="ivf", n_lists=16, n_probe=4
+    )
+    for query in queries[:5]:
+        retriever.retrieve(query, k=3, trace=trace)
+
+    langfuse.flush()
+
+    print("\n✓ 인덱스별 지연 시간/recall과 retriever span이 Langfuse에 기록됨")
+
+
+def embedding_cache_example():
+    """
+    임베딩 캐시 예제
+
+    같은 코퍼스를 여러 번 인덱싱할 때 캐시된 벡터를 재사용하고 적중률을 trace에 기록합니다.
+    """
+    print("\n" + "=" * 60)
+    print("11. 메모리 매핑 임베딩 캐시")
+    print("=" * 60)
+
+    cache_dir = tempfile.mkdtemp(prefix="embedding_cache_")
+    embedder = HashingEmbedder()
+
+    rng = random.Random(5)
+    words = "trace span latency cost prompt dataset score session token model cache flush".split()
+    corpus = [f"chunk {i}: " + " ".join(rng.choices(words, k=40)) for i in range(20_000)]
+
+    langfuse = Langfuse()
+
+    for run in range(1, 4):
+        # 실행마다 캐시 파일을 다시 열어 프로세스 재시작을 흉내냄
+        cache = EmbeddingCache(cache_dir, model=embedder.model, dim=embedder.dim)
+        cached_embedder = CachedEmbedder(embedder, cache)
+
+        # 3번째 실행에서는 코퍼스 10%가 새로 추가됨
+        documents = (
+            corpus
+            if run < 3
+            else corpus
+            + [f"new chunk {i}: " + " ".join(rng.choices(words, k=40)) for i in range(2_000)]
+        )
+
+        trace = langfuse.trace(
+            name="embedding_cache_run", metadata={"run": run, "documents": len(documents)}
+        )
+        span = trace.span(name="embed_corpus", metadata={"embedding_model": embedder.model})
+        start = time.perf_counter()
+        vectors = cached_embedder.embed_documents(documents)
+        elapsed = time.perf_counter() - start
+        span.end(metadata={
+            "embedding_ms": round(elapsed * 1000, 3),
+            "cache_hits": cached_embedder.last_hits,
+            "cache_misses": cached_embedder.last_misses,
+            "cache_hit_rate": round(cached_embedder.last_hits / len(documents), 4)
+        })
+
+        print(f"\n[Run {run}] 문서 {len(documents):,}개 → {vectors.shape}")
+        print(f"  - 적중: {cached_embedder.last_hits:,}, 미스(임베딩 호출): {cached_embedder.last_misses:,}")
+        print(f"  - 소요 시간: {elapsed:.3f}s, 캐시 크기: {len(cache):,}행")
+        cache.close()
+
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    langfuse.flush()
+
+    print("\n✓ 임베딩 캐시 적중률이 Langfuse에 기록됨")
+
+
 def main():
     """메인 실행 함수"""
     print("\n" + "=" * 60)
@@ -513,6 +1899,15 @@ def main():
         # 8. 배치 처리
         batch_processing_with_callback()
 
+        # 9. 추적 샘플링
+        sampled_tracing_example()
+
+        # 10. 벡터 검색 벤치마크
+        vector_retrieval_benchmark_example()
+
+        # 11. 임베딩 캐시
+        embedding_cache_example()
+
         print("\n" + "=" * 60)
         print("✓ 모든 Langchain 통합 예제 완료!")
         print("=" * 60)
@@ -526,6 +1921,9 @@ def main():
         print("  from langfuse.callback import CallbackHandler")
         print("  handler = CallbackHandler()")
         print("  llm.invoke(prompt, config={'callbacks': [handler]})")
+        print("\n대량 호출 시 (핸들러 풀):")
+        print("  pool = CallbackHandlerPool()")
+        print("  chain.batch(inputs, config=pool.batch_configs(inputs))")
 
     except Exception as e:
         print(f"\n❌ 오류 발생: {str(e)}")
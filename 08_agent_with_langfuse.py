@@ -9,12 +9,43 @@ Agent는 도구를 사용하여 복잡한 작업을 수행하는 자율적인 
 2. 커스텀 도구 정의
 3. Agent 실행 추적
 4. 의사결정 과정 기록
+5. 의존성 DAG 기반 병렬 도구 실행
+6. 정책 기반 도구 결과 메모이제이션
+7. 역색인 + BM25 지식 베이스
+8. AST 기반 안전한 계산기 (캐시, 크기/시간 제한, 벡터화)
+9. 정규식 기반 의도 라우팅
+10. 토큰 예산 기반 Agent 메모리 (링 버퍼, 요약, 검색)
+11. 데드라인/도구 타임아웃/반복/토큰 예산 실행 제어
+12. 질의 모음 기반 Agent 전략 벤치마크 (질의별 백분위수, 기준 대비 비율)
+13. 로그 구조 메모 저장소 (백그라운드 writer, 일괄 fsync, 세션/시간 색인)
+14. 기록된 trace 기반 결정적 리플레이 (divergence, 단계별 지연 비교)
 """
 
 import os
+import re
+import ast
 import json
+import math
+import operator
+import time
+import heapq
+import random
+import inspect
+import atexit
+import bisect
+import queue
+import zlib
+import itertools
+import shutil
+import tempfile
+import threading
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 from datetime import datetime
-from typing import List, Dict, Any
+from functools import lru_cache
+from typing import List, Dict, Any, Callable, Optional
+import numpy as np
 from dotenv import load_dotenv
 
 from langfuse import Langfuse
@@ -28,10 +59,910 @@ from langchain.prompts import PromptTemplate
 load_dotenv()
 
 
+# ============================================================
+# 지식 베이스 (Knowledge Base)
+# ============================================================
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from how i in is it me of on or that the this to was what when "
+    "where which who why with about tell search find please".split()
+)
+
+
+@lru_cache(maxsize=65536)
+def _light_stem(token: str) -> str:
+    """영어 복수형 어미만 제거하는 가벼운 어간 추출 (agents → agent, queries → query)"""
+    if len(token) <= 3 or not token.isascii():
+        return token
+    if token.endswith("ies") and not token.endswith(("eies", "aies")):
+        return token[:-3] + "y"
+    if token.endswith("es") and not token.endswith(("aes", "ees", "oes")):
+        return token[:-1]
+    if token.endswith("s") and not token.endswith(("us", "ss", "is")):
+        return token[:-1]
+    return token
+
+
+def kb_tokenize(text: str) -> List[str]:
+    return [
+        _light_stem(token)
+        for token in _TOKEN_PATTERN.findall(text.lower())
+        if token not in _STOPWORDS
+    ]
+
+
+class KnowledgeBase:
+    """
+    역색인과 BM25 랭킹을 사용하는 지식 베이스
+
+    - 색인: term → {doc_id: 빈도} 역색인과 문서 길이를 유지하며, 문서 추가/수정/삭제 시
+      해당 문서의 term만 갱신합니다 (전체 재색인 없음)
+    - 검색: 질의 term의 posting만 훑어 BM25 점수를 누적하고 상위 k개를 반환합니다
+    - 로딩: JSONL 파일 또는 .md/.txt 디렉터리 (refresh_directory는 변경된 파일만 재색인)
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._lengths: Dict[str, int] = {}
+        self._total_length = 0
+        self._file_versions: Dict[str, tuple] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    @classmethod
+    def from_dict(cls, entries: Dict[str, str]) -> "KnowledgeBase":
+        kb = cls()
+        for key, content in entries.items():
+            kb.upsert(key, content, title=key)
+        return kb
+
+    @classmethod
+    def from_jsonl(cls, path: str) -> "KnowledgeBase":
+        """{"id", "content", "title"?, ...} 형식의 JSONL 파일을 불러옵니다"""
+        kb = cls()
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    kb.upsert(entry.pop('id'), entry.pop('content'), **entry)
+        return kb
+
+    def upsert(self, doc_id: str, content: str, title: str = "", **metadata):
+        """문서를 추가하거나 교체합니다"""
+        counts = Counter(kb_tokenize(f"{title} {content}"))
+        length = sum(counts.values())
+        with self._lock:
+            if doc_id in self.documents:
+                self._unindex(doc_id)
+            self.documents[doc_id] = {"id": doc_id, "title": title, "content": content, **metadata}
+            postings = self._postings
+            for term, count in counts.items():
+                posting = postings.get(term)
+                if posting is None:
+                    posting = postings[term] = {}
+                posting[doc_id] = count
+            self._lengths[doc_id] = length
+            self._total_length += length
+
+    def remove(self, doc_id: str) -> bool:
+        with self._lock:
+            if doc_id not in self.documents:
+                return False
+            self._unindex(doc_id)
+            del self.documents[doc_id]
+            return True
+
+    def _unindex(self, doc_id: str):
+        document = self.documents[doc_id]
+        for term in set(kb_tokenize(f"{document['title']} {document['content']}")):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._lengths.pop(doc_id)
+
+    def refresh_directory(self, directory: str, extensions=(".md", ".txt")) -> Dict[str, int]:
+        """디렉터리의 파일을 문서로 동기화합니다 (mtime/크기가 바뀐 파일만 재색인)"""
+        stats = Counter()
+        seen = set()
+        for root, _, files in os.walk(directory):
+            for filename in files:
+                if not filename.endswith(tuple(extensions)):
+                    continue
+                path = os.path.join(root, filename)
+                doc_id = os.path.relpath(path, directory)
+                seen.add(doc_id)
+                stat = os.stat(path)
+                version = (stat.st_mtime_ns, stat.st_size)
+                if self._file_versions.get(doc_id) == version:
+                    stats['unchanged'] += 1
+                    continue
+                with open(path, "r", encoding="utf-8") as f:
+                    content = f.read()
+                stats['updated' if doc_id in self._file_versions else 'added'] += 1
+                self.upsert(doc_id, content, title=os.path.splitext(filename)[0], source=path)
+                self._file_versions[doc_id] = version
+
+        for doc_id in [doc_id for doc_id in self._file_versions if doc_id not in seen]:
+            self.remove(doc_id)
+            del self._file_versions[doc_id]
+            stats['removed'] += 1
+        return dict(stats)
+
+    def search(self, query: str, k: int = 3, span=None) -> List[Dict[str, Any]]:
+        """
+        BM25 상위 k개 문서를 점수와 함께 반환합니다
+
+        span을 넘기면 점수, 훑은 posting 수, 검색 시간을 메타데이터로 기록합니다.
+        """
+        results, stats = self.search_with_stats(query, k)
+        if span is not None:
+            span.update(metadata=stats)
+        return results
+
+    def search_with_stats(self, query: str, k: int = 3):
+        """(상위 k개 문서, span에 기록할 랭킹/검색 통계)를 반환합니다"""
+        start = time.perf_counter()
+        terms = set(kb_tokenize(query))
+        scores: Dict[str, float] = {}
+        scanned = 0
+        with self._lock:
+            n = len(self.documents)
+            average_length = self._total_length / n if n else 0.0
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                scanned += len(postings)
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (
+                        tf + norm
+                    )
+
+            top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            results = [
+                {**self.documents[doc_id], "score": round(score, 4)} for doc_id, score in top
+            ]
+
+        stats = {
+            "kb_results": [{"id": doc['id'], "score": doc['score']} for doc in results],
+            "kb_postings_scanned": scanned,
+            "kb_documents": n,
+            "kb_search_ms": round((time.perf_counter() - start) * 1000, 3)
+        }
+        return results, stats
+
+
+KNOWLEDGE_BASE = KnowledgeBase.from_dict({
+    "langfuse": "Langfuse is an open-source LLM engineering platform that helps teams "
+                "collaboratively debug, analyze, and iterate on their LLM applications.",
+    "langchain": "LangChain is a framework for developing applications powered by language models.",
+    "python": "Python is a high-level, interpreted programming language "
+              "known for its simplicity and versatility.",
+    "agent": "An agent is an autonomous system that uses an LLM "
+             "to determine which actions to take and in what order."
+})
+
+
+# ============================================================
+# 실행 제어 (Execution Controller)
+# ============================================================
+
+class BudgetExceeded(RuntimeError):
+    """실행 예산(데드라인/반복 횟수/토큰)을 넘었거나 실행이 취소됨"""
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+class ToolTimeout(TimeoutError):
+    """도구 호출이 제한 시간 안에 끝나지 않음"""
+
+
+class ExecutionController:
+    """
+    Agent 실행 한 번의 예산을 관리하는 컨트롤러
+
+    - deadline_seconds: 실행 전체 제한 시간
+    - max_iterations: step() 호출 횟수 제한
+    - token_budget: consume_tokens()로 누적한 토큰 제한
+    - tool_timeouts: 도구별 제한 시간 (남은 데드라인보다 길 수 없음)
+
+    도구는 스레드 풀에서 실행되며, 제한 시간을 넘기거나 cancel()되면 결과를 버립니다.
+    도구 함수가 cancel_event 인자를 받으면 취소 신호를 전달해 즉시 중단할 수 있게 합니다.
+    step()이 만든 span에는 해당 단계까지의 예산 사용량이 기록됩니다.
+    """
+
+    def __init__(
+        self,
+        deadline_seconds: float = 10.0,
+        max_iterations: int = 8,
+        token_budget: int = 4000,
+        tool_timeouts: Optional[Dict[str, float]] = None,
+        default_tool_timeout: float = 2.0,
+        max_workers: int = 4,
+    ):
+        self.deadline_seconds = deadline_seconds
+        self.max_iterations = max_iterations
+        self.token_budget = token_budget
+        self.tool_timeouts = tool_timeouts or {}
+        self.default_tool_timeout = default_tool_timeout
+        self.iterations = 0
+        self.tokens_used = 0
+        self.tool_calls = 0
+        self.tool_timeouts_hit = 0
+        self.cancel_reason: Optional[str] = None
+        self._cancel_event = threading.Event()
+        self._in_flight: Dict[Any, threading.Event] = {}
+        self._started = time.perf_counter()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent-tool")
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._started
+
+    @property
+    def remaining_seconds(self) -> float:
+        return self.deadline_seconds - self.elapsed
+
+    def budget(self) -> Dict[str, Any]:
+        return {
+            "iteration": self.iterations,
+            "max_iterations": self.max_iterations,
+            "elapsed_ms": round(self.elapsed * 1000, 1),
+            "remaining_ms": round(max(0.0, self.remaining_seconds) * 1000, 1),
+            "tokens_used": self.tokens_used,
+            "token_budget": self.token_budget,
+            "tool_calls": self.tool_calls,
+            "tool_timeouts": self.tool_timeouts_hit
+        }
+
+    def check(self):
+        if self._cancel_event.is_set():
+            raise BudgetExceeded("cancelled", f"Execution cancelled: {self.cancel_reason}")
+        if self.remaining_seconds <= 0:
+            raise BudgetExceeded("deadline", f"Deadline of {self.deadline_seconds}s exceeded")
+        if self.tokens_used > self.token_budget:
+            raise BudgetExceeded("tokens", f"Token budget of {self.token_budget} exceeded")
+
+    def cancel(self, reason: str = "cancelled by caller"):
+        """실행을 취소하고 진행 중인 모든 도구 호출에 취소 신호를 보냅니다"""
+        self.cancel_reason = reason
+        self._cancel_event.set()
+        for event in list(self._in_flight.values()):
+            event.set()
+
+    def consume_tokens(self, tokens: int):
+        self.tokens_used += tokens
+        self.check()
+
+    def begin_iteration(self):
+        """반복 한 번을 시작합니다 (예산 확인 후 반복 횟수 증가)"""
+        self.check()
+        if self.iterations >= self.max_iterations:
+            raise BudgetExceeded(
+                "iterations", f"Maximum of {self.max_iterations} iterations reached"
+            )
+        self.iterations += 1
+
+    def step(self, trace, name: str, **metadata):
+        """반복 한 번을 span으로 감싸는 컨텍스트 매니저 (진입 시 예산 확인)"""
+        controller = self
+
+        class _Step:
+            def __enter__(self):
+                controller.begin_iteration()
+                self.span = trace.span(
+                    name=name, metadata={"iteration": controller.iterations, **metadata}
+                )
+                return self.span
+
+            def __exit__(self, exc_type, exc, tb):
+                extra = {"budget": controller.budget()}
+                if exc is not None:
+                    self.span.end(level="ERROR", status_message=str(exc),
+                                  metadata={**extra, "error_type": exc_type.__name__})
+                else:
+                    self.span.end(metadata=extra)
+                return False
+
+        return _Step()
+
+    def call_tool(
+        self, tool_name: str, tool_obj: Any, tool_input: Any, session_id: Optional[str] = None
+    ) -> Any:
+        """제한 시간 안에 도구를 실행합니다 (ToolTimeout/BudgetExceeded 발생 가능)"""
+        self.check()
+        timeout = min(
+            self.tool_timeouts.get(tool_name, self.default_tool_timeout), self.remaining_seconds
+        )
+        cancel_event = threading.Event()
+        func = getattr(tool_obj, "func", tool_obj)
+        accepts_cancel = "cancel_event" in inspect.signature(func).parameters
+
+        def run():
+            if accepts_cancel:
+                if isinstance(tool_input, dict):
+                    return func(**tool_input, cancel_event=cancel_event)
+                return func(tool_input, cancel_event=cancel_event)
+            return invoke_tool(tool_obj, tool_input, session_id=session_id)
+
+        future = self._pool.submit(run)
+        self._in_flight[future] = cancel_event
+        self.tool_calls += 1
+        try:
+            return future.result(timeout=max(0.0, timeout))
+        except FuturesTimeoutError:
+            cancel_event.set()
+            future.cancel()
+            self.tool_timeouts_hit += 1
+            self.check()
+            raise ToolTimeout(f"{tool_name} timed out after {timeout:.2f}s") from None
+        finally:
+            self._in_flight.pop(future, None)
+
+    def close(self):
+        for event in list(self._in_flight.values()):
+            event.set()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+# ============================================================
+# Agent 메모리 (Bounded Agent Memory)
+# ============================================================
+
+def estimate_tokens(text: str) -> int:
+    """토크나이저 없이 쓰는 근사 토큰 수 (영어 기준 약 4자당 1토큰)"""
+    return (len(text) + 3) // 4
+
+
+class AgentMemory:
+    """
+    토큰 예산 안에서 대화 컨텍스트를 구성하는 메모리
+
+    - 최근 recent_turns개 턴은 원문 그대로 링 버퍼(deque)에 보관
+    - 버퍼에서 밀려난 턴은 짧은 요약으로 압축하고, 원문은 BM25 색인에 보관해 검색에 사용
+    - 요약은 최대 max_summaries개까지 유지하며 넘치면 가장 오래된 것부터 제거 (색인에서도 삭제)
+    - build_context()는 최근 턴 → 질의와 관련된 과거 턴 → 요약 순으로 token_budget까지 채웁니다
+    """
+
+    def __init__(self, token_budget: int = 300, recent_turns: int = 4, max_summaries: int = 50,
+                 summary_chars: int = 80, retrieve_k: int = 2):
+        self.token_budget = token_budget
+        self.max_summaries = max_summaries
+        self.summary_chars = summary_chars
+        self.retrieve_k = retrieve_k
+        self.recent: deque = deque(maxlen=recent_turns)
+        self.summaries: deque = deque()
+        self.archive = KnowledgeBase()
+        self.turn_count = 0
+        self.evicted_turns = 0
+
+    def _summarize(self, turn: Dict[str, Any]) -> str:
+        # 추출식 요약: 사용자 질문과 응답의 첫 문장을 잘라 사용
+        answer = re.split(r"(?<=[.!?])\s", turn['agent'], maxsplit=1)[0]
+        question = turn['user'][:self.summary_chars]
+        return f"[Turn {turn['turn']}] Q: {question} / A: {answer[:self.summary_chars]}"
+
+    def add_turn(self, user: str, agent: str):
+        self.turn_count += 1
+        if len(self.recent) == self.recent.maxlen:
+            oldest = self.recent[0]
+            self.summaries.append((oldest['turn'], self._summarize(oldest)))
+            self.archive.upsert(
+                f"turn_{oldest['turn']}", oldest['agent'], title=oldest['user'], turn=oldest['turn']
+            )
+            if len(self.summaries) > self.max_summaries:
+                dropped_turn, _ = self.summaries.popleft()
+                self.archive.remove(f"turn_{dropped_turn}")
+                self.evicted_turns += 1
+        self.recent.append({"turn": self.turn_count, "user": user, "agent": agent})
+
+    @staticmethod
+    def _format_turn(turn: Dict[str, Any]) -> str:
+        return f"[Turn {turn['turn']}] User: {turn['user']}\nAgent: {turn['agent']}"
+
+    # 섹션 제목과 구분자에 쓰이는 토큰은 미리 예산에서 제외
+    _SECTION_OVERHEAD = estimate_tokens(
+        "Earlier conversation (summaries):\n\n\nRelevant past turns:\n\n\nRecent turns:\n"
+    )
+
+    def build_context(self, query: str, span=None) -> str:
+        remaining = self.token_budget - self._SECTION_OVERHEAD
+        dropped = 0
+
+        recent = []
+        for turn in reversed(self.recent):
+            text = self._format_turn(turn)
+            cost = estimate_tokens(text + "\n")
+            if cost > remaining:
+                dropped += 1
+                continue
+            recent.append(text)
+            remaining -= cost
+
+        start = time.perf_counter()
+        retrieved_docs = self.archive.search(query, k=self.retrieve_k) if len(self.archive) else []
+        retrieval_ms = (time.perf_counter() - start) * 1000
+
+        relevant, relevant_turns = [], set()
+        for doc in retrieved_docs:
+            text = f"[Turn {doc['turn']}] User: {doc['title']}\nAgent: {doc['content']}"
+            cost = estimate_tokens(text + "\n")
+            if cost > remaining:
+                dropped += 1
+                continue
+            relevant.append(text)
+            relevant_turns.add(doc['turn'])
+            remaining -= cost
+
+        summaries = []
+        for turn_number, summary in reversed(self.summaries):
+            if turn_number in relevant_turns:
+                continue
+            cost = estimate_tokens(summary + "\n")
+            if cost > remaining:
+                dropped += 1
+                continue
+            summaries.append(summary)
+            remaining -= cost
+
+        sections = []
+        if summaries:
+            sections.append("Earlier conversation (summaries):\n" + "\n".join(reversed(summaries)))
+        if relevant:
+            sections.append("Relevant past turns:\n" + "\n".join(relevant))
+        if recent:
+            sections.append("Recent turns:\n" + "\n".join(reversed(recent)))
+        context = "\n\n".join(sections)
+
+        if span is not None:
+            span.update(metadata={
+                "memory_turns_total": self.turn_count,
+                "memory_recent_turns": len(self.recent),
+                "memory_summaries": len(self.summaries),
+                "memory_archived_turns": len(self.archive),
+                "memory_evicted_turns": self.evicted_turns,
+                "context_items_dropped": dropped,
+                "context_tokens": estimate_tokens(context),
+                "token_budget": self.token_budget,
+                "retrieval_ms": round(retrieval_ms, 3),
+                "retrieved_turns": sorted(relevant_turns)
+            })
+        return context
+
+
+# ============================================================
+# 안전한 계산기 (Safe Arithmetic Evaluator)
+# ============================================================
+
+class CalculationError(ValueError):
+    """허용되지 않은 표현식이거나 제한을 넘은 계산"""
+
+
+class SafeArithmeticEvaluator:
+    """
+    AST를 검증한 뒤 클로저 트리로 컴파일해 실행하는 산술 계산기
+
+    - 숫자, 변수, 사칙/거듭제곱/나머지 연산과 허용된 함수만 사용할 수 있습니다
+    - 컴파일 결과는 표현식 문자열 기준으로 캐시되어 반복 호출 시 파싱을 건너뜁니다
+    - 표현식 길이, 노드 수, 정수 결과 비트 수, 거듭제곱 지수, 실행 시간을 제한합니다
+    - evaluate_many는 같은 표현식을 변수 배열 전체에 NumPy로 한 번에 계산합니다
+    """
+
+    BINARY_OPERATORS = {
+        ast.Add: operator.add,
+        ast.Sub: operator.sub,
+        ast.Mult: operator.mul,
+        ast.Div: operator.truediv,
+        ast.FloorDiv: operator.floordiv,
+        ast.Mod: operator.mod,
+        ast.Pow: operator.pow,
+    }
+    UNARY_OPERATORS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+    FUNCTIONS = {
+        "abs": (abs, np.abs), "round": (round, np.round), "sqrt": (math.sqrt, np.sqrt),
+        "log": (math.log, np.log), "exp": (math.exp, np.exp),
+        "min": (min, np.minimum), "max": (max, np.maximum),
+    }
+
+    def __init__(self, max_length: int = 1000, max_nodes: int = 200, max_int_bits: int = 4096,
+                 max_exponent: int = 1000, timeout: float = 0.05, cache_size: int = 4096):
+        self.max_length = max_length
+        self.max_nodes = max_nodes
+        self.max_int_bits = max_int_bits
+        self.max_exponent = max_exponent
+        self.timeout = timeout
+        self._compile_cached = lru_cache(maxsize=cache_size)(self._compile_expression)
+
+    def evaluate(self, expression: str, variables: Optional[Dict[str, Any]] = None):
+        program, _ = self._compile_cached(expression, False)
+        deadline = time.perf_counter() + self.timeout
+        return program(variables or {}, deadline)
+
+    def evaluate_many(self, expression: str, bindings: Dict[str, Any]) -> np.ndarray:
+        """bindings의 각 변수 배열(같은 길이)에 대해 표현식을 한 번에 계산합니다"""
+        program, names = self._compile_cached(expression, True)
+        missing = names - bindings.keys()
+        if missing:
+            raise CalculationError(f"Missing variables: {', '.join(sorted(missing))}")
+        arrays = {name: np.asarray(bindings[name], dtype=np.float64) for name in names}
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            return np.asarray(program(arrays, None), dtype=np.float64)
+
+    def cache_info(self):
+        return self._compile_cached.cache_info()
+
+    def _compile_expression(self, expression: str, vectorized: bool):
+        if len(expression) > self.max_length:
+            raise CalculationError(f"Expression is longer than {self.max_length} characters")
+        try:
+            tree = ast.parse(expression.strip(), mode="eval")
+        except SyntaxError as e:
+            raise CalculationError(f"Invalid expression: {e.msg}") from None
+
+        node_count = sum(1 for _ in ast.walk(tree))
+        if node_count > self.max_nodes:
+            raise CalculationError(f"Expression has more than {self.max_nodes} nodes")
+
+        names = set()
+        program = self._compile_node(tree.body, vectorized, names)
+        return program, frozenset(names)
+
+    def _compile_node(self, node: ast.AST, vectorized: bool, names: set):
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            value = node.value
+            return lambda env, deadline: value
+
+        if isinstance(node, ast.Name):
+            name = node.id
+            names.add(name)
+
+            def load(env, deadline):
+                try:
+                    return env[name]
+                except KeyError:
+                    raise CalculationError(f"Unknown variable: {name}") from None
+            return load
+
+        if isinstance(node, ast.UnaryOp) and type(node.op) in self.UNARY_OPERATORS:
+            op = self.UNARY_OPERATORS[type(node.op)]
+            operand = self._compile_node(node.operand, vectorized, names)
+            return lambda env, deadline: op(operand(env, deadline))
+
+        if isinstance(node, ast.BinOp) and type(node.op) in self.BINARY_OPERATORS:
+            op = self.BINARY_OPERATORS[type(node.op)]
+            left = self._compile_node(node.left, vectorized, names)
+            right = self._compile_node(node.right, vectorized, names)
+            if vectorized:
+                return lambda env, deadline: op(left(env, deadline), right(env, deadline))
+            return self._checked_binary(op, left, right)
+
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+                and node.func.id in self.FUNCTIONS and not node.keywords):
+            scalar_func, vector_func = self.FUNCTIONS[node.func.id]
+            func = vector_func if vectorized else scalar_func
+            args = [self._compile_node(arg, vectorized, names) for arg in node.args]
+            if vectorized and node.func.id in ("min", "max"):
+                if len(args) < 2:
+                    raise CalculationError(f"{node.func.id}() needs at least two arguments")
+
+                def reduce_call(env, deadline):
+                    result = args[0](env, deadline)
+                    for arg in args[1:]:
+                        result = func(result, arg(env, deadline))
+                    return result
+                return reduce_call
+            return lambda env, deadline: func(*(arg(env, deadline) for arg in args))
+
+        raise CalculationError(f"Unsupported syntax: {type(node).__name__}")
+
+    def _checked_binary(self, op, left, right):
+        max_bits, max_exponent = self.max_int_bits, self.max_exponent
+
+        def evaluate(env, deadline):
+            a = left(env, deadline)
+            b = right(env, deadline)
+            if op is operator.pow:
+                if isinstance(b, (int, float)) and abs(b) > max_exponent:
+                    raise CalculationError(f"Exponent {b} exceeds limit of {max_exponent}")
+                if (
+                    isinstance(a, int)
+                    and isinstance(b, int)
+                    and b > 0
+                    and a.bit_length() * b > max_bits
+                ):
+                    raise CalculationError(f"Result exceeds {max_bits} bits")
+            elif op is operator.mul and isinstance(a, int) and isinstance(b, int):
+                if a.bit_length() + b.bit_length() > max_bits:
+                    raise CalculationError(f"Result exceeds {max_bits} bits")
+            result = op(a, b)
+            if time.perf_counter() > deadline:
+                raise CalculationError("Calculation timed out")
+            return result
+        return evaluate
+
+
+CALCULATOR = SafeArithmeticEvaluator()
+
+
+# ============================================================
+# 메모 저장소 (Log-Structured Note Store)
+# ============================================================
+
+class NoteStore:
+    """
+    로그 구조(append-only) 메모 저장소
+
+    append()는 메모를 쓰기 대기열에 넣고 바로 반환하며, 백그라운드 writer 스레드가
+    대기열을 모아(max_batch개 또는 flush_interval초) 한 번에 파일에 쓰고 fsync합니다.
+    flush()는 그때까지 추가된 메모가 디스크에 기록될 때까지 기다립니다.
+
+    레코드는 "crc32 JSON" 한 줄이며, 다시 열 때 CRC가 맞지 않는 꼬리(쓰다 만 레코드)는 잘라냅니다.
+    메모는 타임스탬프 순 목록과 세션별 목록으로 색인되고, 본문은 파일 오프셋으로 읽습니다.
+    """
+
+    def __init__(self, directory: str, max_batch: int = 64, flush_interval: float = 0.05,
+                 filename: str = "notes.log"):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, filename)
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._durable = threading.Condition(self._lock)
+        self._queue: queue.Queue = queue.Queue()
+        self._timestamps: List[float] = []
+        self._ids: List[str] = []
+        self._sessions: Dict[str, List[int]] = {}
+        self._locations: Dict[str, tuple] = {}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._enqueued = 0
+        self._persisted = 0
+        self._error: Optional[OSError] = None
+        self._closed = False
+        self.batches = 0
+        self.bytes_written = 0
+        self.truncated_bytes = 0
+        self._size = self._recover()
+        self._file = open(self.path, "ab")
+        self._reader = open(self.path, "rb")
+        self._writer = threading.Thread(target=self._write_loop, name="note-writer", daemon=True)
+        self._writer.start()
+
+    @staticmethod
+    def _encode(record: Dict[str, Any]) -> bytes:
+        payload = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return b"%08x " % zlib.crc32(payload) + payload + b"\n"
+
+    @staticmethod
+    def _decode(line: bytes) -> Optional[Dict[str, Any]]:
+        if len(line) < 10 or not line.endswith(b"\n") or line[8:9] != b" ":
+            return None
+        payload = line[9:-1]
+        try:
+            if int(line[:8], 16) != zlib.crc32(payload):
+                return None
+            return json.loads(payload)
+        except ValueError:
+            return None
+
+    def _recover(self) -> int:
+        """기존 로그를 읽어 색인을 다시 만들고, 손상된 꼬리를 잘라낸 뒤 유효한 길이를 반환합니다"""
+        if not os.path.exists(self.path):
+            return 0
+        offset = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                record = self._decode(line)
+                if record is None:
+                    break
+                self._index(record, (offset, len(line)))
+                offset += len(line)
+        size = os.path.getsize(self.path)
+        if size > offset:
+            self.truncated_bytes = size - offset
+            with open(self.path, "r+b") as f:
+                f.truncate(offset)
+        return offset
+
+    def _index(self, record: Dict[str, Any], location: Optional[tuple]):
+        self._timestamps.append(record['ts'])
+        self._ids.append(record['id'])
+        if record.get('session_id') is not None:
+            self._sessions.setdefault(record['session_id'], []).append(len(self._ids) - 1)
+        if location is not None:
+            self._locations[record['id']] = location
+
+    def append(self, content: str, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """메모를 쓰기 대기열에 넣고 (note_id, timestamp, queue_depth)를 반환합니다 (디스크 I/O 대기 없음)"""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("NoteStore is closed")
+            if self._error is not None:
+                raise self._error
+            ts = max(time.time(), self._timestamps[-1] if self._timestamps else 0.0)
+            record = {"id": f"note_{len(self._ids) + 1:08d}", "ts": ts, "session_id": session_id,
+                      "content": content}
+            self._index(record, None)
+            self._pending[record['id']] = record
+            self._enqueued += 1
+            self._queue.put((self._enqueued, record))
+        return {"note_id": record['id'], "timestamp": ts, "session_id": session_id,
+                "queue_depth": self._queue.qsize()}
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch, stop = [item], False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._write_batch(batch)
+            if stop:
+                return
+
+    def _write_batch(self, batch: List[tuple]):
+        data = bytearray()
+        locations = []
+        for _, record in batch:
+            line = self._encode(record)
+            locations.append((record['id'], (self._size + len(data), len(line))))
+            data += line
+        try:
+            self._file.write(data)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except OSError as e:
+            with self._durable:
+                self._error = e
+                self._durable.notify_all()
+            return
+
+        with self._durable:
+            self._size += len(data)
+            for note_id, location in locations:
+                self._locations[note_id] = location
+                self._pending.pop(note_id, None)
+            self._persisted = batch[-1][0]
+            self.batches += 1
+            self.bytes_written += len(data)
+            self._durable.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """지금까지 추가된 메모가 모두 fsync될 때까지 기다립니다"""
+        with self._durable:
+            target = self._enqueued
+            done = self._durable.wait_for(
+                lambda: self._persisted >= target or self._error is not None, timeout
+            )
+            if self._error is not None:
+                raise self._error
+            return done
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def get(self, note_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if note_id in self._pending:
+                return dict(self._pending[note_id])
+            location = self._locations.get(note_id)
+            if location is None:
+                return None
+            self._reader.seek(location[0])
+            return self._decode(self._reader.read(location[1]))
+
+    def by_session(self, session_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """세션의 메모를 시간순으로 반환합니다 (limit이면 최근 limit개)"""
+        with self._lock:
+            positions = self._sessions.get(session_id, [])
+            ids = [self._ids[position] for position in (positions[-limit:] if limit else positions)]
+        return [self.get(note_id) for note_id in ids]
+
+    def between(self, start: float, end: float) -> List[Dict[str, Any]]:
+        """start <= ts < end 인 메모를 시간순으로 반환합니다"""
+        with self._lock:
+            lo = bisect.bisect_left(self._timestamps, start)
+            hi = bisect.bisect_left(self._timestamps, end)
+            ids = self._ids[lo:hi]
+        return [self.get(note_id) for note_id in ids]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            persisted = len(self._ids) - len(self._pending)
+            return {
+                "notes": len(self._ids),
+                "pending": len(self._pending),
+                "queue_depth": self._queue.qsize(),
+                "batches": self.batches,
+                "avg_batch_size": round(persisted / self.batches, 2) if self.batches else 0.0,
+                "bytes_written": self.bytes_written,
+                "truncated_bytes": self.truncated_bytes
+            }
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._writer.join()
+        self._file.close()
+        self._reader.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+_NOTE_STORE: Optional[NoteStore] = None
+_NOTE_STORE_LOCK = threading.Lock()
+
+
+def get_note_store() -> NoteStore:
+    """
+    save_note 도구가 쓰는 공용 저장소 (프로세스 종료 시 남은 메모를 기록하고 닫음)
+
+    AGENT_NOTES_DIR이 있으면 그 디렉터리에 계속 쌓고, 없으면 실행마다 임시 디렉터리를 만들어
+    종료 시 지웁니다 (예제 실행끼리 메모가 섞이거나 누적되지 않음).
+    """
+    global _NOTE_STORE
+    with _NOTE_STORE_LOCK:
+        if _NOTE_STORE is None:
+            directory = os.getenv("AGENT_NOTES_DIR")
+            _NOTE_STORE = NoteStore(directory or tempfile.mkdtemp(prefix="langfuse_agent_notes_"))
+            atexit.register(_close_note_store, _NOTE_STORE, remove=directory is None)
+        return _NOTE_STORE
+
+
+def _close_note_store(store: NoteStore, remove: bool):
+    store.close()
+    if remove:
+        shutil.rmtree(os.path.dirname(store.path), ignore_errors=True)
+
+
 # ============================================================
 # 커스텀 도구 정의
 # ============================================================
 
+class ToolResult(str):
+    """도구 출력 문자열에 도구 span에 기록할 metadata를 함께 싣습니다 (문자열처럼 그대로 사용 가능)"""
+
+    def __new__(cls, text: str, span_metadata: Optional[Dict[str, Any]] = None):
+        result = super().__new__(cls, text)
+        result.span_metadata = span_metadata or {}
+        return result
+
+
 @tool
 def calculate(expression: str) -> str:
     """
@@ -44,8 +975,8 @@ def calculate(expression: str) -> str:
         계산 결과
     """
     try:
-        # 안전한 계산을 위해 eval 대신 간단한 파싱 사용
-        result = eval(expression, {"__builtins__": {}}, {})
+        # eval 대신 검증된 AST만 실행하는 계산기 사용 (컴파일 결과 캐시)
+        result = CALCULATOR.evaluate(expression)
         return f"계산 결과: {result}"
     except Exception as e:
         return f"계산 오류: {str(e)}"
@@ -74,21 +1005,13 @@ def search_knowledge_base(query: str) -> str:
     Returns:
         검색 결과
     """
-    # 시뮬레이션된 지식 베이스
-    knowledge_base = {
-        "langfuse": "Langfuse is an open-source LLM engineering platform that helps teams collaboratively debug, analyze, and iterate on their LLM applications.",
-        "langchain": "LangChain is a framework for developing applications powered by language models.",
-        "python": "Python is a high-level, interpreted programming language known for its simplicity and versatility.",
-        "agent": "An agent is an autonomous system that uses an LLM to determine which actions to take and in what order."
-    }
+    # 랭킹과 BM25 점수는 결과에 실어 보내 호출한 쪽이 도구 span에 기록합니다
+    results, stats = KNOWLEDGE_BASE.search_with_stats(query, k=3)
 
-    query_lower = query.lower()
+    if results:
+        return ToolResult(f"검색 결과: {results[0]['content']}", stats)
 
-    for key, value in knowledge_base.items():
-        if key in query_lower:
-            return f"검색 결과: {value}"
-
-    return "검색 결과를 찾을 수 없습니다. 다른 키워드를 시도해보세요."
+    return ToolResult("검색 결과를 찾을 수 없습니다. 다른 키워드를 시도해보세요.", stats)
 
 
 @tool
@@ -120,35 +1043,1407 @@ def get_weather(location: str) -> str:
 
 
 @tool
-def save_note(content: str) -> str:
+def save_note(content: str, session_id: Optional[str] = None) -> str:
     """
     메모를 저장합니다.
 
     Args:
         content: 저장할 메모 내용
+        session_id: 메모를 묶을 세션 ID (선택)
 
     Returns:
         저장 결과
     """
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"note_{timestamp}.txt"
-
     try:
-        # 실제로는 파일에 저장하지만, 여기서는 시뮬레이션
-        return f"메모가 저장되었습니다: {filename}\n내용: {content[:50]}..."
+        # 쓰기 대기열에 넣고 바로 반환 (백그라운드 writer가 모아서 fsync)
+        receipt = get_note_store().append(content, session_id=session_id)
+        return f"메모가 저장되었습니다: {receipt['note_id']}\n내용: {content[:50]}..."
     except Exception as e:
         return f"메모 저장 실패: {str(e)}"
 
 
+AGENT_TOOLS = {
+    "calculate": calculate,
+    "get_current_time": get_current_time,
+    "search_knowledge_base": search_knowledge_base,
+    "get_weather": get_weather,
+    "save_note": save_note,
+}
+
+
+# 도구 span에 함께 기록할 상태 (도구 이름 → metadata를 만드는 함수)
+TOOL_SPAN_METADATA: Dict[str, Callable[[], Dict[str, Any]]] = {
+    "save_note": lambda: {"write_queue_depth": get_note_store().queue_depth()},
+}
+
+
+def tool_span_metadata(tool_name: str, output: Any = None) -> Dict[str, Any]:
+    """도구 상태와 도구가 결과에 실어 보낸 metadata(ToolResult)를 합칩니다"""
+    provider = TOOL_SPAN_METADATA.get(tool_name)
+    metadata = provider() if provider else {}
+    return {**metadata, **getattr(output, "span_metadata", {})}
+
+
+# ============================================================
+# 도구 메모이제이션 (Tool Memoization)
+# ============================================================
+
+# 도구별 캐시 정책
+#   never       - 캐시하지 않음 (부수 효과가 있는 도구)
+#   per_trace   - 같은 trace(한 번의 agent 실행) 안에서만 재사용
+#   per_session - 같은 세션 안에서 재사용
+#   ttl         - 세션과 무관하게 ttl초 동안 재사용
+DEFAULT_TOOL_CACHE_POLICIES = {
+    "calculate": {"policy": "ttl", "ttl": 3600},
+    "get_current_time": {"policy": "per_trace"},
+    "search_knowledge_base": {"policy": "per_session"},
+    "get_weather": {"policy": "ttl", "ttl": 300},
+    "save_note": {"policy": "never"},
+}
+
+TOOL_CACHE_POLICIES = ("never", "per_trace", "per_session", "ttl")
+
+
+class ToolMemoizer:
+    """
+    도구 호출 결과를 정책에 따라 재사용하는 LRU 캐시
+
+    키는 (도구 이름, 범위 id, 정규화한 입력)이며 범위 id는 정책에 따라 trace id,
+    세션 id 또는 없음입니다. 전체 항목 수가 max_entries를 넘으면 가장 오래 사용되지
+    않은 항목부터 제거합니다. 예외가 난 호출은 캐시하지 않습니다.
+    """
+
+    def __init__(
+        self,
+        policies: Optional[Dict[str, Dict[str, Any]]] = None,
+        max_entries: int = 1024,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.policies = dict(DEFAULT_TOOL_CACHE_POLICIES if policies is None else policies)
+        for name, policy in self.policies.items():
+            if policy['policy'] not in TOOL_CACHE_POLICIES:
+                raise ValueError(f"Unknown cache policy for {name}: {policy['policy']}")
+        self.max_entries = max_entries
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def policy_of(self, tool_name: str) -> Dict[str, Any]:
+        return self.policies.get(tool_name, {"policy": "never"})
+
+    def _key(
+        self, tool_name: str, tool_input: Any, trace_id: Optional[str], session_id: Optional[str]
+    ):
+        policy = self.policy_of(tool_name)['policy']
+        if policy == "never":
+            return None
+        if policy == "per_trace":
+            scope = trace_id
+        elif policy == "per_session":
+            scope = session_id
+        else:
+            scope = ""
+        if scope is None:
+            return None
+        return (
+            tool_name,
+            scope,
+            json.dumps(tool_input, sort_keys=True, ensure_ascii=False, default=str),
+        )
+
+    def call(self, tool_name: str, tool_obj: Any, tool_input: Any, trace_id: Optional[str] = None,
+             session_id: Optional[str] = None):
+        """(출력, 캐시 메타데이터)를 반환합니다. 메타데이터는 도구 span에 그대로 기록합니다"""
+        policy = self.policy_of(tool_name)
+        key = self._key(tool_name, tool_input, trace_id, session_id)
+        if key is None:
+            return (invoke_tool(tool_obj, tool_input, session_id=session_id),
+                    {"cache": "bypass", "cache_policy": policy['policy']})
+
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > now):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0], {"cache": "hit", "cache_policy": policy['policy'],
+                                  "cache_age_s": round(now - entry[2], 3)}
+            self.misses += 1
+
+        output = invoke_tool(tool_obj, tool_input, session_id=session_id)
+
+        ttl = policy.get('ttl') if policy['policy'] == "ttl" else None
+        with self._lock:
+            self._entries[key] = (output, now + ttl if ttl is not None else None, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return output, {"cache": "miss", "cache_policy": policy['policy']}
+
+    def clear_scope(self, scope_id: str):
+        """끝난 trace/세션의 항목을 제거합니다"""
+        with self._lock:
+            for key in [key for key in self._entries if key[1] == scope_id]:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions
+        }
+
+
+# ============================================================
+# 병렬 도구 실행기 (Parallel Tool Executor)
+# ============================================================
+
+@lru_cache(maxsize=256)
+def _accepts_session_id(func: Callable) -> bool:
+    try:
+        return "session_id" in inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def invoke_tool(tool_obj: Any, tool_input: Any, session_id: Optional[str] = None) -> Any:
+    """
+    @tool 객체 또는 일반 함수를 입력 형태에 맞게 호출합니다
+
+    session_id를 넘기면 session_id 인자를 받는 도구(save_note 등)에 함께 전달합니다.
+    """
+    func = getattr(tool_obj, "func", tool_obj)
+    extra = (
+        {"session_id": session_id} if session_id is not None and _accepts_session_id(func) else {}
+    )
+    if tool_input is None or tool_input == "":
+        return func(**extra)
+    if isinstance(tool_input, dict):
+        return func(**{**extra, **tool_input})
+    return func(tool_input, **extra)
+
+
+class ParallelToolExecutor:
+    """
+    계획된 도구 호출을 의존성 DAG로 만들어 독립적인 호출을 동시에 실행하는 실행기
+
+    각 action은 {"id", "tool", "input", "depends_on"} 형태이며, 문자열 input의
+    "{action_id}" 자리에는 의존 action의 출력이 채워집니다.
+    도구 호출은 부모 span의 자식 span으로 기록되고, 부모 span과 trace에는
+    전체 실행 시간, 도구 시간 합계, critical path와 그 길이가 기록됩니다.
+    memoizer를 넘기면 도구 결과를 정책에 따라 재사용하고 span에 적중 여부를 남깁니다.
+    """
+
+    def __init__(self, tools: Optional[Dict[str, Any]] = None, max_workers: int = 4,
+                 memoizer: Optional[ToolMemoizer] = None):
+        self.tools = tools or AGENT_TOOLS
+        self.max_workers = max_workers
+        self.memoizer = memoizer
+
+    def build_graph(self, actions: List[Dict[str, Any]]):
+        """(action id → action, 의존 action 목록, 위상 정렬 순서)를 반환합니다"""
+        by_id = {}
+        for action in actions:
+            if action['id'] in by_id:
+                raise ValueError(f"Duplicate action id: {action['id']}")
+            if action['tool'] not in self.tools:
+                raise ValueError(f"Unknown tool: {action['tool']}")
+            by_id[action['id']] = action
+
+        dependents = {action_id: [] for action_id in by_id}
+        remaining = {}
+        for action_id, action in by_id.items():
+            deps = action.get('depends_on', [])
+            for dep in deps:
+                if dep not in by_id:
+                    raise ValueError(f"Action {action_id} depends on unknown action {dep}")
+                dependents[dep].append(action_id)
+            remaining[action_id] = len(deps)
+
+        order = []
+        ready = [action_id for action_id, count in remaining.items() if count == 0]
+        while ready:
+            action_id = ready.pop()
+            order.append(action_id)
+            for child in dependents[action_id]:
+                remaining[child] -= 1
+                if remaining[child] == 0:
+                    ready.append(child)
+        if len(order) != len(by_id):
+            raise ValueError("Action dependencies contain a cycle")
+        return by_id, dependents, order
+
+    @staticmethod
+    def _resolve_input(action: Dict[str, Any], outputs: Dict[str, Any]) -> Any:
+        tool_input = action.get('input')
+        if isinstance(tool_input, str) and action.get('depends_on'):
+            return tool_input.format_map({dep: outputs[dep] for dep in action['depends_on']})
+        return tool_input
+
+    def _run_action(self, parent_span, action: Dict[str, Any], tool_input: Any,
+                    trace_id: Optional[str], session_id: Optional[str]):
+        span = parent_span.span(
+            name=f"agent_{action['id']}",
+            input=tool_input,
+            metadata={"tool": action['tool'], "depends_on": action.get('depends_on', [])}
+        )
+        cache_metadata = {}
+        start = time.perf_counter()
+        try:
+            tool_obj = self.tools[action['tool']]
+            if self.memoizer is not None:
+                output, cache_metadata = self.memoizer.call(
+                    action['tool'], tool_obj, tool_input, trace_id=trace_id, session_id=session_id
+                )
+            else:
+                output = invoke_tool(tool_obj, tool_input, session_id=session_id)
+        except Exception as e:
+            end = time.perf_counter()
+            span.end(level="ERROR", status_message=str(e),
+                     metadata={"duration_ms": round((end - start) * 1000, 3)})
+            return None, e, start, end
+        end = time.perf_counter()
+        span.end(
+            output=output,
+            metadata={
+                "duration_ms": round((end - start) * 1000, 3),
+                **cache_metadata,
+                **tool_span_metadata(action['tool'], output),
+            },
+        )
+        return output, None, start, end
+
+    def run(self, actions: List[Dict[str, Any]], trace, name: str = "parallel_tool_execution",
+            session_id: Optional[str] = None) -> Dict[str, Any]:
+        by_id, dependents, order = self.build_graph(actions)
+        remaining = {
+            action_id: len(action.get('depends_on', [])) for action_id, action in by_id.items()
+        }
+
+        parent_span = trace.span(
+            name=name, input=actions, metadata={"max_workers": self.max_workers}
+        )
+        outputs, errors, skipped, timings = {}, {}, [], {}
+
+        run_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {}
+
+            def submit_ready(action_ids):
+                for action_id in action_ids:
+                    action = by_id[action_id]
+                    if any(dep in errors or dep in skipped for dep in action.get('depends_on', [])):
+                        skipped.append(action_id)
+                        submit_ready(self._release(action_id, dependents, remaining))
+                        continue
+                    tool_input = self._resolve_input(action, outputs)
+                    future = pool.submit(
+                        self._run_action, parent_span, action, tool_input, trace.id, session_id
+                    )
+                    futures[future] = action_id
+
+            submit_ready([action_id for action_id in order if remaining[action_id] == 0])
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    action_id = futures.pop(future)
+                    output, error, start, end = future.result()
+                    timings[action_id] = (start - run_start, end - run_start)
+                    if error is not None:
+                        errors[action_id] = error
+                    else:
+                        outputs[action_id] = output
+                    submit_ready(self._release(action_id, dependents, remaining))
+        wall = time.perf_counter() - run_start
+
+        critical_path, critical_seconds = self._critical_path(by_id, order, timings)
+        tool_seconds = sum(end - start for start, end in timings.values())
+        summary = {
+            "wall_ms": round(wall * 1000, 3),
+            "tool_time_sum_ms": round(tool_seconds * 1000, 3),
+            "critical_path": critical_path,
+            "critical_path_ms": round(critical_seconds * 1000, 3),
+            "errors": {action_id: str(error) for action_id, error in errors.items()},
+            "skipped": skipped
+        }
+        parent_span.end(output=outputs, metadata=summary, level="ERROR" if errors else None)
+        trace.update(
+            metadata={
+                "critical_path_ms": summary['critical_path_ms'],
+                "tool_wall_ms": summary['wall_ms'],
+            }
+        )
+
+        return {"outputs": outputs, "timings": timings, **summary}
+
+    @staticmethod
+    def _release(
+        action_id: str, dependents: Dict[str, List[str]], remaining: Dict[str, int]
+    ) -> List[str]:
+        released = []
+        for child in dependents[action_id]:
+            remaining[child] -= 1
+            if remaining[child] == 0:
+                released.append(child)
+        return released
+
+    @staticmethod
+    def _critical_path(by_id, order, timings):
+        """도구 실행 시간 기준 가장 긴 의존 경로와 길이(초)"""
+        finish, previous = {}, {}
+        for action_id in order:
+            if action_id not in timings:
+                continue
+            start, end = timings[action_id]
+            best_dep = max((dep for dep in by_id[action_id].get('depends_on', []) if dep in finish),
+                           key=finish.get, default=None)
+            finish[action_id] = (end - start) + (finish[best_dep] if best_dep else 0.0)
+            previous[action_id] = best_dep
+
+        if not finish:
+            return [], 0.0
+        node = max(finish, key=finish.get)
+        total = finish[node]
+        path = []
+        while node is not None:
+            path.append(node)
+            node = previous[node]
+        return path[::-1], total
+
+
+# ============================================================
+# 의도 라우팅 (Intent Router)
+# ============================================================
+
+def _trie_regex(words: List[str]) -> str:
+    """키워드 목록을 공통 접두사를 공유하는 trie 형태 정규식으로 만듭니다"""
+    trie: Dict[str, Any] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict[str, Any]) -> str:
+        terminal = "" in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if terminal:
+            return f"(?:{body})?"
+        return body
+
+    return build(trie)
+
+
+class _MissingArguments(dict):
+    def __missing__(self, key):
+        return ""
+
+
+class IntentRouter:
+    """
+    규칙별 트리거 정규식으로 도구와 인자를 찾는 라우터
+
+    규칙은 {"tool", "thought", "input", "keywords", "patterns"} 형태입니다.
+      - keywords: 리터럴 트리거 단어. 모든 규칙의 키워드를 trie 정규식 하나로 합치고,
+        매칭된 단어는 dict로 규칙을 찾으므로 키워드 규칙이 늘어도 위치당 비용이 거의 일정합니다
+      - patterns: 인자가 필요한 정규식. (?P<이름>...) 그룹이 도구 인자로 추출됩니다
+    키워드 정규식과 각 패턴은 따로 스캔하므로 서로 겹치는 매칭도 모두 잡힙니다.
+    따라서 질의 하나의 스캔 횟수는 1 + 인자 패턴 수이며, 비용은 인자 패턴 수에 비례합니다.
+    ("what is the time"은 search_knowledge_base와 get_current_time에 모두 매칭)
+    route()는 매칭된 도구와 인자를 질의 내 등장 순서대로 반환합니다.
+    """
+
+    def __init__(self, rules: List[Dict[str, Any]], flags: int = re.IGNORECASE):
+        self.rules = rules
+        self._rule_of_keyword: Dict[str, int] = {}
+        self._patterns: List[tuple] = []
+
+        for rule_index, rule in enumerate(rules):
+            for keyword in rule.get('keywords', ()):
+                self._rule_of_keyword.setdefault(keyword.lower(), rule_index)
+            for pattern in rule.get('patterns', ()):
+                self._patterns.append((rule_index, re.compile(pattern, flags)))
+
+        self._keyword_pattern = None
+        if self._rule_of_keyword:
+            keyword_pattern = _trie_regex(sorted(self._rule_of_keyword))
+            self._keyword_pattern = re.compile(rf"\b{keyword_pattern}\b", flags)
+        self.patterns_scanned = len(self._patterns) + (self._keyword_pattern is not None)
+
+    def route(self, query: str, trace=None) -> List[Dict[str, Any]]:
+        start = time.perf_counter()
+        found = []
+        if self._keyword_pattern is not None:
+            for match in self._keyword_pattern.finditer(query):
+                found.append(
+                    (
+                        match.start(),
+                        self._rule_of_keyword[match.group(0).lower()],
+                        {},
+                        match.group(0),
+                    )
+                )
+        for rule_index, pattern in self._patterns:
+            for match in pattern.finditer(query):
+                arguments = {name: value.strip() for name, value in match.groupdict().items()
+                             if value is not None}
+                found.append((match.start(), rule_index, arguments, match.group(0)))
+        found.sort(key=lambda entry: entry[0])
+
+        # 같은 도구는 인자 조합별로 한 번만, 인자가 추출된 매칭이 있으면 인자 없는 매칭은 생략
+        with_arguments = {
+            self.rules[rule_index]['tool'] for _, rule_index, arguments, _ in found if arguments
+        }
+        matches = []
+        seen = set()
+        for _, rule_index, arguments, text in found:
+            rule = self.rules[rule_index]
+            key = (rule['tool'], tuple(sorted(arguments.items())))
+            if key in seen or (not arguments and rule['tool'] in with_arguments):
+                continue
+            seen.add(key)
+            tool_input = rule.get('input', "")
+            if isinstance(tool_input, str):
+                tool_input = tool_input.format_map(_MissingArguments(arguments))
+            matches.append({
+                "tool": rule['tool'],
+                "thought": rule['thought'],
+                "input": tool_input,
+                "arguments": arguments,
+                "matched_text": text
+            })
+        elapsed = time.perf_counter() - start
+
+        if trace is not None:
+            trace.span(
+                name="agent_routing",
+                input=query,
+                output=[{"tool": m['tool'], "arguments": m['arguments']} for m in matches],
+                metadata={
+                    "routing_ms": round(elapsed * 1000, 4),
+                    "rules": len(self.rules),
+                    "patterns_scanned": self.patterns_scanned,
+                }
+            ).end()
+        return matches
+
+
+DEFAULT_ROUTING_RULES = [
+    {
+        "tool": "calculate",
+        "thought": "사용자가 계산을 요청했습니다.",
+        "input": "{expression}",
+        "keywords": ["calculate", "compute"],
+        "patterns": [
+            r"(?P<expression>\(*\s*\d+(?:\.\d+)?(?:\s*\)*\s*[-+*/%]\s*\(*\s*\d+(?:\.\d+)?)+\s*\)*)"
+        ],
+    },
+    {
+        "tool": "get_current_time",
+        "thought": "현재 시간 정보가 필요합니다.",
+        "input": "",
+        "keywords": ["time", "date"],
+    },
+    {
+        "tool": "get_weather",
+        "thought": "날씨 정보를 조회해야 합니다.",
+        "input": "{location}",
+        "patterns": [r"\bweather\b(?:\s+(?:in|for|at)\s+(?P<location>new\s+york|[a-z]+))?"],
+    },
+    {
+        "tool": "search_knowledge_base",
+        "thought": "지식 베이스에서 정보를 검색해야 합니다.",
+        "input": "{topic}",
+        "patterns": [
+            r"\b(?:search(?:\s+for)?|what\s+is|tell\s+me\s+about)\s+"
+            r"(?P<topic>[\w-]+(?:\s+[\w-]+)??)"
+            r"(?=\s+(?:and|then)\b|\s*[?.!,]|\s*$)"
+        ],
+    },
+    {
+        "tool": "save_note",
+        "thought": "메모를 저장해야 합니다.",
+        "input": "",
+        "keywords": ["save", "remember", "note"],
+    },
+]
+
+INTENT_ROUTER = IntentRouter(DEFAULT_ROUTING_RULES)
+
+
+# ============================================================
+# Agent 전략 벤치마크 (Strategy Benchmark)
+# ============================================================
+
+class ToolLatencyModel:
+    """
+    도구별 지연 시간 분포 (로그정규, 중앙값 ms와 sigma)
+
+    같은 (반복 번호, 도구, 입력)에는 항상 같은 지연 시간을 돌려주므로
+    모든 전략이 동일한 조건에서 비교됩니다. "llm" 항목은 LLM 호출 한 번의 지연입니다.
+    """
+
+    def __init__(self, distributions: Dict[str, Any], seed: int = 0, default: Any = (5.0, 0.2)):
+        self.distributions = distributions
+        self.seed = seed
+        self.default = default
+
+    def sample(self, name: str, key: Any, repetition: int) -> float:
+        median_ms, sigma = self.distributions.get(name, self.default)
+        rng = random.Random(f"{self.seed}:{repetition}:{name}:{key}")
+        return median_ms * rng.lognormvariate(0.0, sigma) / 1000
+
+
+BENCHMARK_SYSTEM_PROMPT = (
+    "You are a helpful assistant with access to tools: "
+    + ", ".join(AGENT_TOOLS) + ". Think step by step and call tools when needed."
+)
+
+# 벤치마크 질의 모음 (도구 호출 계획 포함)
+BENCHMARK_SUITE = [
+    {
+        "query": "Compare the weather in Seoul and Tokyo",
+        "actions": [
+            {"id": "seoul", "tool": "get_weather", "input": "Seoul"},
+            {"id": "tokyo", "tool": "get_weather", "input": "Tokyo"},
+        ],
+    },
+    {
+        "query": "Find information about Python and save it",
+        "actions": [
+            {"id": "search", "tool": "search_knowledge_base", "input": "Python"},
+            {"id": "save", "tool": "save_note", "input": "{search}", "depends_on": ["search"]},
+        ],
+    },
+    {
+        "query": "What's the weather in Seoul, what time is it, and how much warmer is Tokyo?",
+        "actions": [
+            {"id": "seoul", "tool": "get_weather", "input": "Seoul"},
+            {"id": "time", "tool": "get_current_time", "input": None},
+            {"id": "tokyo", "tool": "get_weather", "input": "Tokyo"},
+            {
+                "id": "diff",
+                "tool": "calculate",
+                "input": "20 - 15",
+                "depends_on": ["seoul", "tokyo"],
+            },
+        ],
+    },
+    {
+        "query": "What is Langfuse? Then look up Langfuse again and summarize its tracing features",
+        "actions": [
+            {"id": "search", "tool": "search_knowledge_base", "input": "Langfuse"},
+            {"id": "search_again", "tool": "search_knowledge_base", "input": "Langfuse"},
+            {
+                "id": "tracing",
+                "tool": "search_knowledge_base",
+                "input": "Langfuse tracing",
+                "depends_on": ["search_again"],
+            },
+        ],
+    },
+]
+
+
+class BenchmarkRun:
+    """
+    전략 한 번의 실행 상태
+
+    tools의 도구는 지연 분포에 따라 대기한 뒤 실제 도구를 호출하고 호출 수를 셉니다
+    (메모이제이션으로 재사용된 호출은 세지 않음). llm_step()은 LLM 호출 한 번을
+    지연과 토큰 사용량으로 기록합니다.
+    """
+
+    def __init__(
+        self,
+        spec: Dict[str, Any],
+        trace,
+        tools: Dict[str, Any],
+        latency: ToolLatencyModel,
+        repetition: int,
+        memoizer: Optional[ToolMemoizer] = None,
+        session_id: Optional[str] = None,
+    ):
+        self.spec = spec
+        self.trace = trace
+        self.latency = latency
+        self.repetition = repetition
+        self.memoizer = memoizer
+        self.session_id = session_id
+        self.steps = 0
+        self.tool_calls = 0
+        self.tokens = 0
+        self._lock = threading.Lock()
+        self.tools = {name: self._with_latency(name, tool_obj) for name, tool_obj in tools.items()}
+
+    def _with_latency(self, name: str, tool_obj: Any):
+        def call(*args, **kwargs):
+            tool_input = args[0] if args else (kwargs or None)
+            with self._lock:
+                self.tool_calls += 1
+            time.sleep(
+                self.latency.sample(name, json.dumps(tool_input, default=str), self.repetition)
+            )
+            return invoke_tool(tool_obj, tool_input)
+        return call
+
+    def llm_step(self, prompt: str, completion: str):
+        self.steps += 1
+        usage = {"input": estimate_tokens(prompt), "output": estimate_tokens(completion)}
+        self.tokens += usage['input'] + usage['output']
+        generation = self.trace.generation(
+            name=f"agent_llm_step_{self.steps}",
+            model="simulated-agent-llm",
+            input=prompt,
+            usage=usage,
+        )
+        time.sleep(
+            self.latency.sample("llm", f"{self.spec['query']}:{self.steps}", self.repetition)
+        )
+        generation.end(output=completion)
+
+
+def _dag_levels(actions: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """의존성 깊이별로 action을 묶습니다 (같은 단계의 action은 서로 독립)"""
+    by_id, _, order = ParallelToolExecutor(tools=AGENT_TOOLS).build_graph(actions)
+    depth = {}
+    for action_id in order:
+        depth[action_id] = 1 + max(
+            (depth[dep] for dep in by_id[action_id].get('depends_on', [])), default=-1
+        )
+
+    levels = [[] for _ in range(1 + max(depth.values(), default=-1))]
+    for action in actions:
+        levels[depth[action['id']]].append(action)
+    return levels
+
+
+def _final_answer(run: BenchmarkRun, scratchpad: List[str], observations: Dict[str, Any]):
+    answer = " / ".join(str(observations[action['id']]) for action in run.spec['actions']
+                        if action['id'] in observations)
+    run.llm_step("\n".join(scratchpad), f"Final Answer: {answer}")
+    return answer
+
+
+def sequential_strategy(run: BenchmarkRun) -> str:
+    """ReAct: 도구 한 번마다 LLM 호출 한 번, 관찰 결과를 scratchpad에 누적"""
+    scratchpad = [BENCHMARK_SYSTEM_PROMPT, f"Question: {run.spec['query']}"]
+    observations = {}
+    ParallelToolExecutor(tools=AGENT_TOOLS).build_graph(run.spec['actions'])
+    pending = list(run.spec['actions'])
+    for step in range(1, len(pending) + 1):
+        action = next(action for action in pending
+                      if all(dep in observations for dep in action.get('depends_on', [])))
+        pending.remove(action)
+        action_id = action['id']
+        tool_input = ParallelToolExecutor._resolve_input(action, observations)
+        run.llm_step("\n".join(scratchpad), f"Action: {action['tool']}({tool_input!r})")
+        span = run.trace.span(name=f"agent_step_{step}_{action['tool']}", input=tool_input,
+                              metadata={"strategy": "sequential", "action": action_id})
+        observations[action_id] = invoke_tool(
+            run.tools[action['tool']], tool_input, session_id=run.session_id
+        )
+        span.end(output=observations[action_id],
+                 metadata=tool_span_metadata(action['tool'], observations[action_id]))
+        scratchpad += [
+            f"Action: {action['tool']}({tool_input!r})",
+            f"Observation: {observations[action_id]}",
+        ]
+    return _final_answer(run, scratchpad, observations)
+
+
+def parallel_strategy(run: BenchmarkRun) -> str:
+    """의존성 단계마다 LLM 호출 한 번으로 독립적인 도구들을 계획하고 동시에 실행"""
+    scratchpad = [BENCHMARK_SYSTEM_PROMPT, f"Question: {run.spec['query']}"]
+    observations = {}
+    executor = ParallelToolExecutor(tools=run.tools, max_workers=4)
+    for step, level in enumerate(_dag_levels(run.spec['actions']), 1):
+        plan = [
+            {
+                "id": action['id'],
+                "tool": action['tool'],
+                "input": ParallelToolExecutor._resolve_input(action, observations),
+            }
+            for action in level
+        ]
+        run.llm_step(
+            "\n".join(scratchpad), "Actions: " + json.dumps(plan, ensure_ascii=False, default=str)
+        )
+        execution = executor.run(
+            plan, run.trace, name=f"agent_step_{step}_parallel", session_id=run.session_id
+        )
+        observations.update(execution['outputs'])
+        scratchpad += [
+            f"Observation[{action_id}]: {output}"
+            for action_id, output in execution['outputs'].items()
+        ]
+    return _final_answer(run, scratchpad, observations)
+
+
+def _dedupe_actions(actions: List[Dict[str, Any]]):
+    """
+    같은 (도구, 입력) 호출을 하나로 합치고 의존 관계와 입력 참조를 대표 action으로 바꿉니다
+
+    (중복 제거된 action 목록, action id → 대표 action id)를 반환합니다.
+    """
+    canonical, alias = {}, {}
+    for action in actions:
+        if action.get('depends_on'):
+            continue
+        key = (action['tool'], json.dumps(action.get('input'), sort_keys=True, default=str))
+        alias[action['id']] = canonical.setdefault(key, action['id'])
+
+    deduped = []
+    for action in actions:
+        if alias.get(action['id'], action['id']) != action['id']:
+            continue
+        action = dict(action)
+        if action.get('depends_on'):
+            action['depends_on'] = list(
+                dict.fromkeys(alias.get(dep, dep) for dep in action['depends_on'])
+            )
+            if isinstance(action.get('input'), str):
+                for old, new in alias.items():
+                    action['input'] = action['input'].replace("{" + old + "}", "{" + new + "}")
+        deduped.append(action)
+    return deduped, alias
+
+
+def optimized_strategy(run: BenchmarkRun) -> str:
+    """중복 호출 제거 + 전체 DAG를 한 번에 계획 + 세션 단위 도구 결과 메모이제이션"""
+    scratchpad = [BENCHMARK_SYSTEM_PROMPT, f"Question: {run.spec['query']}"]
+    plan, alias = _dedupe_actions(run.spec['actions'])
+    run.llm_step(
+        "\n".join(scratchpad), "Plan: " + json.dumps(plan, ensure_ascii=False, default=str)
+    )
+    execution = ParallelToolExecutor(tools=run.tools, max_workers=4, memoizer=run.memoizer).run(
+        plan, run.trace, name="agent_step_1_parallel", session_id=run.session_id
+    )
+    observations = {action['id']: execution['outputs'].get(alias.get(action['id'], action['id']))
+                    for action in run.spec['actions']}
+    scratchpad += [
+        f"Observation[{action_id}]: {output}" for action_id, output in execution['outputs'].items()
+    ]
+    return _final_answer(run, scratchpad, observations)
+
+
+AGENT_STRATEGIES = {
+    "sequential": sequential_strategy,
+    "parallel": parallel_strategy,
+    "optimized": optimized_strategy,
+}
+
+
+class StrategyBenchmark:
+    """
+    질의 모음에 대해 여러 Agent 전략을 반복 실행하고 실측값을 비교하는 하네스
+
+    실행마다 trace를 만들고 wall_ms, steps, tool_calls, tokens를 점수로 기록합니다.
+    반복 순서는 (반복 → 전략 → 질의)로 섞어 시간에 따른 환경 변화가 한 전략에 몰리지 않게 합니다.
+    질의마다 작업량이 다르므로 백분위수는 질의별로 따로 계산하고(p90은 반복이 min_tail_samples회
+    이상일 때만), 전략 간 비교는 질의별 p50을 기준 전략의 p50으로 나눈 비율의 기하평균으로 요약합니다.
+    메모이제이션 캐시는 (전략, 반복)마다 새로 만들어 한 세션 안에서만 재사용됩니다.
+    """
+
+    METRICS = ("wall_ms", "steps", "tool_calls", "tokens")
+
+    def __init__(self, suite: List[Dict[str, Any]], latency: ToolLatencyModel, repetitions: int = 5,
+                 tools: Optional[Dict[str, Any]] = None, langfuse: Optional[Langfuse] = None,
+                 min_tail_samples: int = 10):
+        self.suite = suite
+        self.latency = latency
+        self.repetitions = repetitions
+        self.min_tail_samples = min_tail_samples
+        self.tools = tools or AGENT_TOOLS
+        self.langfuse = langfuse or Langfuse()
+
+    def run_once(self, name: str, strategy: Callable, spec: Dict[str, Any], repetition: int,
+                 memoizer: ToolMemoizer, session_id: str) -> Dict[str, float]:
+        trace = self.langfuse.trace(
+            name="agent_strategy_benchmark",
+            session_id=session_id,
+            input=spec['query'],
+            metadata={
+                "strategy": name,
+                "repetition": repetition,
+                "experiment": "performance_comparison",
+            },
+        )
+        run = BenchmarkRun(spec, trace, self.tools, self.latency, repetition,
+                           memoizer=memoizer, session_id=session_id)
+        start = time.perf_counter()
+        answer = strategy(run)
+        wall = time.perf_counter() - start
+        memoizer.clear_scope(trace.id)
+
+        measured = {"wall_ms": round(wall * 1000, 3), "steps": run.steps,
+                    "tool_calls": run.tool_calls, "tokens": run.tokens}
+        trace.update(output=answer, metadata=measured)
+        for metric, value in measured.items():
+            trace.score(name=metric, value=value)
+        return measured
+
+    def _query_stats(self, values: List[float]) -> Dict[str, float]:
+        values = np.asarray(values, dtype=np.float64)
+        stats = {"mean": float(values.mean()), "p50": float(np.percentile(values, 50))}
+        if len(values) >= self.min_tail_samples:
+            stats["p90"] = float(np.percentile(values, 90))
+        return stats
+
+    def run(self, strategies: Optional[Dict[str, Callable]] = None,
+            baseline: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        전략 이름 → {"queries": 질의별 지표 통계, "relative": 기준 전략 대비 p50 비율, "mean": 전체 평균}
+
+        baseline을 생략하면 첫 번째 전략이 기준입니다.
+        """
+        strategies = strategies or AGENT_STRATEGIES
+        baseline = baseline or next(iter(strategies))
+        samples = {
+            name: [{metric: [] for metric in self.METRICS} for _ in self.suite]
+            for name in strategies
+        }
+
+        for repetition in range(self.repetitions):
+            for name, strategy in strategies.items():
+                session_id = f"strategy_benchmark_{name}_{repetition}"
+                memoizer = ToolMemoizer()
+                for index, spec in enumerate(self.suite):
+                    measured = self.run_once(name, strategy, spec, repetition, memoizer, session_id)
+                    for metric, value in measured.items():
+                        samples[name][index][metric].append(value)
+
+        summary = {}
+        for name, per_query in samples.items():
+            summary[name] = {
+                "queries": [
+                    {
+                        "query": spec['query'],
+                        **{metric: self._query_stats(values) for metric, values in metrics.items()},
+                    }
+                    for spec, metrics in zip(self.suite, per_query)
+                ],
+                "mean": {
+                    metric: float(
+                        np.mean([value for metrics in per_query for value in metrics[metric]])
+                    )
+                    for metric in self.METRICS
+                },
+            }
+
+        for name in summary:
+            relative = {}
+            for metric in self.METRICS:
+                ratios = [
+                    query[metric]['p50'] / base[metric]['p50']
+                    for query, base in zip(summary[name]['queries'], summary[baseline]['queries'])
+                    if base[metric]['p50'] > 0 and query[metric]['p50'] > 0
+                ]
+                relative[metric] = (
+                    float(np.exp(np.mean(np.log(ratios)))) if ratios else float("nan")
+                )
+            summary[name]['relative'] = relative
+
+            trace = self.langfuse.trace(
+                name="agent_strategy_benchmark_summary",
+                metadata={"strategy": name, "baseline": baseline, "repetitions": self.repetitions,
+                          "queries": len(self.suite), "experiment": "performance_comparison",
+                          "per_query": summary[name]['queries']}
+            )
+            for metric in self.METRICS:
+                trace.score(name=f"{metric}_mean", value=summary[name]['mean'][metric])
+                if not math.isnan(relative[metric]):
+                    trace.score(name=f"{metric}_vs_{baseline}", value=relative[metric])
+        return summary
+
+
+# ============================================================
+# 트레이스 리플레이 (Trace Replay)
+# ============================================================
+
+# step span 이름에 쓰는 도구 약칭 (agent_step_1_search, agent_step_2_save, ...)
+STEP_NAMES = {
+    "search_knowledge_base": "search",
+    "save_note": "save",
+    "get_weather": "weather",
+    "get_current_time": "time",
+    "calculate": "calculate",
+}
+
+_ACTION_PATTERN = re.compile(
+    r"^Action:\s*(?P<tool>\S+)\s*\nAction Input:\s*(?P<input>.*)$", re.MULTILINE
+)
+_FINAL_PATTERN = re.compile(r"^Final Answer:\s*(?P<answer>.*)", re.MULTILINE | re.DOTALL)
+_THOUGHT_PATTERN = re.compile(r"^Thought:\s*(.*)$", re.MULTILINE)
+
+
+def _preview(value: Any, limit: int = 60) -> str:
+    text = repr(value) if value is not None else ""
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+def render_agent_prompt(query: str, history: List[tuple]) -> str:
+    lines = [BENCHMARK_SYSTEM_PROMPT, f"Question: {query}"]
+    for tool_name, tool_input, observation in history:
+        lines += [
+            f"Action: {tool_name}",
+            f"Action Input: {json.dumps(tool_input, ensure_ascii=False)}",
+            f"Observation: {observation}",
+        ]
+    return "\n".join(lines)
+
+
+def parse_agent_completion(completion: str) -> Dict[str, Any]:
+    """LLM 출력에서 {"final": 답변} 또는 {"tool", "input"}을 꺼냅니다"""
+    final = _FINAL_PATTERN.search(completion)
+    if final:
+        return {"final": final.group("answer").strip()}
+    action = _ACTION_PATTERN.search(completion)
+    if not action:
+        raise ValueError(f"Unparseable agent output: {completion[:80]!r}")
+    return {"tool": action.group("tool"), "input": json.loads(action.group("input"))}
+
+
+class RouterAgentLLM:
+    """
+    IntentRouter로 다음 행동을 고르는 결정적 agent 정책 (실제 구현에서는 LLM)
+
+    입력이 비어 있는 save_note는 직전 관찰 결과를 저장하고, 계획이 끝나면 최종 답변을 냅니다.
+    """
+
+    model = "router-policy"
+
+    def __init__(self, router: Optional[IntentRouter] = None, latency: float = 0.0):
+        self.router = router or INTENT_ROUTER
+        self.latency = latency
+
+    def __call__(self, prompt: str, query: str, history: List[tuple]) -> str:
+        time.sleep(self.latency)
+        plan = self.router.route(query)
+        if len(history) >= len(plan):
+            return f"Final Answer: {history[-1][2] if history else '도움이 될 도구를 찾지 못했습니다.'}"
+        action = plan[len(history)]
+        tool_input = action['input']
+        if action['tool'] == "save_note" and not tool_input and history:
+            tool_input = history[-1][2]
+        return (f"Thought: {action['thought']}\nAction: {action['tool']}\n"
+                f"Action Input: {json.dumps(tool_input or None, ensure_ascii=False)}")
+
+
+def run_agent_loop(query: str, trace, llm: Callable, tools: Optional[Dict[str, Any]] = None,
+                   max_steps: int = 6, verbose: bool = False, session_id: Optional[str] = None,
+                   controller: Optional[ExecutionController] = None) -> str:
+    """
+    ReAct agent 루프
+
+    질의는 trace input, LLM 호출은 agent_llm_{n} generation, 도구 호출은
+    agent_step_{n}_{도구 약칭} span으로 기록되어 TraceReplayEngine으로 다시 실행할 수 있습니다.
+    session_id는 trace와 session_id 인자를 받는 도구(save_note)에 전달됩니다.
+    controller를 넘기면 반복/토큰/데드라인 예산을 확인하고 도구를 제한 시간 안에 실행하며,
+    예산을 넘으면 budget_exceeded 이벤트를 남기고 그 시점에서 답변을 마칩니다.
+    verbose=True면 Thought/Action/Observation을 출력합니다.
+    """
+    tools = tools or AGENT_TOOLS
+    trace.update(input=query, **({"session_id": session_id} if session_id is not None else {}))
+    try:
+        return _agent_loop(query, trace, llm, tools, max_steps, verbose, session_id, controller)
+    except BudgetExceeded as e:
+        answer = f"실행 예산 초과 ({e.reason}): {e}"
+        trace.event(name="budget_exceeded", metadata={"reason": e.reason, **controller.budget()})
+        if verbose:
+            print(f"[Stopped]\n  ⛔ {answer}")
+        trace.update(output=answer)
+        return answer
+
+
+def _agent_loop(
+    query: str,
+    trace,
+    llm: Callable,
+    tools: Dict[str, Any],
+    max_steps: int,
+    verbose: bool,
+    session_id: Optional[str],
+    controller: Optional[ExecutionController],
+) -> str:
+    history = []
+    for step in range(1, max_steps + 1):
+        if controller is not None:
+            controller.begin_iteration()
+        prompt = render_agent_prompt(query, history)
+        generation = trace.generation(name=f"agent_llm_{step}", model=getattr(llm, "model", None),
+                                      input=prompt)
+        completion = llm(prompt, query, history)
+        generation.end(output=completion)
+        if controller is not None:
+            controller.consume_tokens(estimate_tokens(prompt) + estimate_tokens(completion))
+
+        decision = parse_agent_completion(completion)
+        if "final" in decision:
+            if verbose:
+                print(f"[Final]\n  ✅ Answer: {decision['final']}")
+            trace.update(output=decision['final'])
+            return decision['final']
+
+        if verbose:
+            thought = _THOUGHT_PATTERN.search(completion)
+            print(f"[Iteration {step}]")
+            if thought:
+                print(f"  💭 Thought: {thought.group(1)}")
+            print(f"  🔧 Action: {decision['tool']}({_preview(decision['input'])})")
+
+        tool_name, tool_input = decision['tool'], decision['input']
+        span = trace.span(name=f"agent_step_{step}_{STEP_NAMES.get(tool_name, tool_name)}",
+                          input={"action": tool_name, "input": tool_input})
+        try:
+            if controller is not None:
+                observation = controller.call_tool(
+                    tool_name, tools[tool_name], tool_input, session_id=session_id
+                )
+            else:
+                observation = invoke_tool(tools[tool_name], tool_input, session_id=session_id)
+        except BudgetExceeded as e:
+            span.end(level="ERROR", status_message=str(e), metadata={"budget": controller.budget()})
+            raise
+        except Exception as e:
+            observation = f"도구 오류: {e}"
+        metadata = tool_span_metadata(tool_name, observation)
+        if controller is not None:
+            metadata = {**metadata, "budget": controller.budget()}
+        span.end(output=observation, metadata=metadata)
+        history.append((tool_name, tool_input, observation))
+        if verbose:
+            print(f"  👀 Observation: {observation}\n")
+
+    answer = f"최대 단계({max_steps})에 도달했습니다."
+    trace.update(output=answer)
+    return answer
+
+
+def _timestamp(value: Any) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+
+
+class _RecordedObservation:
+    def __init__(self, recorder, kind: str, kwargs: Dict[str, Any], inner):
+        self.inner = inner
+        self.record = {
+            "id": inner.id,
+            "type": kind,
+            "name": kwargs.get('name'),
+            "model": kwargs.get('model'),
+            "input": kwargs.get('input'),
+            "output": kwargs.get('output'),
+            "metadata": kwargs.get('metadata'),
+            "startTime": recorder.now(),
+            "endTime": None,
+        }
+        recorder.observations.append(self.record)
+        self.recorder = recorder
+
+    def update(self, **kwargs):
+        self.record.update(
+            {key: kwargs[key] for key in ("input", "output", "metadata") if key in kwargs}
+        )
+        self.inner.update(**kwargs)
+
+    def end(self, **kwargs):
+        self.record.update(
+            {key: kwargs[key] for key in ("input", "output", "metadata") if key in kwargs}
+        )
+        self.record['endTime'] = self.recorder.now()
+        self.inner.end(**kwargs)
+
+
+class RecordingTrace:
+    """
+    Langfuse trace를 감싸 observation을 Langfuse API export(fetch_trace)와 같은 형태로 함께 기록합니다
+
+    서버 없이 리플레이용 export 파일을 만들 때 사용합니다.
+    """
+
+    def __init__(self, trace, name: str, input: Any = None):
+        self.inner = trace
+        self.id = trace.id
+        self.observations: List[Dict[str, Any]] = []
+        self.trace_record = {"id": trace.id, "name": name, "input": input, "output": None,
+                             "timestamp": self.now()}
+
+    @staticmethod
+    def now() -> str:
+        return datetime.now().astimezone().isoformat()
+
+    def span(self, **kwargs):
+        return _RecordedObservation(self, "SPAN", kwargs, self.inner.span(**kwargs))
+
+    def generation(self, **kwargs):
+        return _RecordedObservation(self, "GENERATION", kwargs, self.inner.generation(**kwargs))
+
+    def update(self, **kwargs):
+        self.trace_record.update({key: kwargs[key] for key in ("input", "output") if key in kwargs})
+        self.inner.update(**kwargs)
+
+    def to_export(self) -> Dict[str, Any]:
+        return {**self.trace_record, "observations": list(self.observations)}
+
+
+def export_traces(langfuse: Langfuse, trace_ids: List[str], path: str) -> int:
+    """Langfuse API에서 trace를 받아 JSONL export 파일로 저장합니다"""
+    with open(path, "w", encoding="utf-8") as f:
+        for trace_id in trace_ids:
+            f.write(langfuse.fetch_trace(trace_id).data.json() + "\n")
+    return len(trace_ids)
+
+
+def load_trace_export(path: str) -> List[Dict[str, Any]]:
+    """JSONL, JSON 배열 또는 {"data": [...]} 형태의 trace export를 읽습니다"""
+    with open(path, encoding="utf-8") as f:
+        text = f.read().strip()
+    if not text:
+        return []
+    if text[0] == "[" or (text[0] == "{" and "\n" not in text):
+        data = json.loads(text)
+        if isinstance(data, dict):
+            data = data.get("data", [data])
+        return data
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+class ReplayExhausted(RuntimeError):
+    """리플레이 중인 코드가 기록에 없는 LLM/도구 호출을 시도함"""
+
+
+class _ReplaySession:
+    """
+    기록된 generation/도구 출력을 순서대로 돌려주며 새 코드와의 차이를 기록합니다
+
+    generation 없이 agent_step_* span만 있는 trace(직접 span을 만들던 이전 agent 코드)는
+    step span의 (action, input)과 최종 답변으로 LLM 출력을 재구성합니다. 이 경우 기록된
+    프롬프트가 없으므로 프롬프트 비교는 하지 않습니다.
+    """
+
+    _STEP_PATTERN = re.compile(r"^agent_step_(\d+)_")
+
+    def __init__(self, recorded: Dict[str, Any], simulate_latency: bool):
+        observations = sorted(
+            recorded.get('observations', []), key=lambda o: _timestamp(o['startTime'])
+        )
+        self.generations = [o for o in observations if o.get('type') == "GENERATION"]
+        self.steps = [o for o in observations
+                      if o.get('type') == "SPAN" and self._STEP_PATTERN.match(o.get('name') or "")]
+        self.llm_recorded = bool(self.generations)
+        if not self.llm_recorded:
+            self.generations = self._synthesize_generations(recorded, observations)
+        self.simulate_latency = simulate_latency
+        self.divergences: List[Dict[str, Any]] = []
+        self.llm_calls = 0
+        self.tool_calls = 0
+        self.marks: List[float] = []
+        self.stopped: Optional[str] = None
+
+    def _synthesize_generations(self, recorded: Dict[str, Any], observations: List[Dict[str, Any]]):
+        generations = []
+        for step in self.steps:
+            step_input = step.get('input') or {}
+            generations.append({
+                "startTime": step['startTime'], "endTime": step['startTime'], "input": None,
+                "output": f"Action: {step_input.get('action')}\n"
+                          f"Action Input: {json.dumps(step_input.get('input'), ensure_ascii=False)}"
+            })
+        final = recorded.get('output')
+        final_spans = [o for o in observations if o.get('name') == "agent_final_answer"]
+        if final is None and final_spans:
+            final = final_spans[-1].get('output')
+        last = final_spans[-1] if final_spans else (self.steps[-1] if self.steps else None)
+        timestamp = (
+            (last.get('endTime') or last['startTime']) if last else recorded.get('timestamp')
+        )
+        generations.append({"startTime": timestamp, "endTime": timestamp, "input": None,
+                            "output": f"Final Answer: {final}"})
+        self.final_answer = final
+        return generations
+
+    @staticmethod
+    def duration(observation: Dict[str, Any]) -> float:
+        if not observation.get('endTime'):
+            return 0.0
+        return _timestamp(observation['endTime']) - _timestamp(observation['startTime'])
+
+    def diverge(self, kind: str, step: int, expected: Any, actual: Any):
+        self.divergences.append(
+            {"kind": kind, "step": step, "expected": expected, "actual": actual}
+        )
+
+    def stop(self, message: str):
+        # agent 코드가 예외를 삼켜도 이후 호출이 모두 실패하도록 상태로 남김
+        self.stopped = self.stopped or message
+        raise ReplayExhausted(self.stopped)
+
+    def llm(self, prompt: str, query: str, history: List[tuple]) -> str:
+        if self.stopped:
+            self.stop(self.stopped)
+        self.marks.append(time.perf_counter())
+        self.llm_calls += 1
+        if self.llm_calls > len(self.generations):
+            self.stop(f"LLM call {self.llm_calls} has no recording")
+        recorded = self.generations[self.llm_calls - 1]
+        if self.llm_recorded and recorded.get('input') != prompt:
+            self.diverge("llm_prompt", self.llm_calls, recorded.get('input'), prompt)
+        if self.simulate_latency:
+            time.sleep(self.duration(recorded))
+        return recorded.get('output')
+
+    def tool(self, tool_name: str):
+        def call(*args, **kwargs):
+            tool_input = args[0] if args else (kwargs or None)
+            if self.stopped:
+                self.stop(self.stopped)
+            self.tool_calls += 1
+            if self.tool_calls > len(self.steps):
+                self.stop(f"Tool call {self.tool_calls} ({tool_name}) has no recording")
+            recorded = self.steps[self.tool_calls - 1]
+            recorded_input = recorded.get('input') or {}
+            if recorded_input.get('action') != tool_name:
+                self.diverge("tool", self.tool_calls, recorded_input.get('action'), tool_name)
+                self.stop(f"Step {self.tool_calls} called {tool_name}, "
+                          f"recording has {recorded_input.get('action')}")
+            if recorded_input.get('input') != tool_input:
+                self.diverge("tool_input", self.tool_calls, recorded_input.get('input'), tool_input)
+            if self.simulate_latency:
+                time.sleep(self.duration(recorded))
+            return recorded.get('output')
+        return call
+
+
+class TraceReplayEngine:
+    """
+    기록된 agent trace를 실제 도구/모델 호출 없이 결정적으로 다시 실행하는 엔진
+
+    LLM 출력과 도구 출력은 기록된 generation과 agent_step_* span의 출력으로 대체합니다
+    (generation이 없는 trace는 step span으로 LLM 출력을 재구성, _ReplaySession 참고).
+    새 코드가 다른 프롬프트를 만들거나, 다른 도구/입력을 쓰거나, 단계 수나 최종 답변이 달라지면
+    divergence로 보고합니다. 기록에 없는 도구를 호출하면 그 지점에서 리플레이를 멈춥니다.
+
+    단계 지연은 n번째 LLM 호출 시작부터 다음 LLM 호출 시작(마지막은 종료)까지입니다.
+    simulate_latency=True면 기록된 LLM/도구 시간만큼 대기해 전체 시간을 비교할 수 있고,
+    False면 agent 코드 자체의 오버헤드만 측정합니다.
+    """
+
+    def __init__(self, agent: Callable = run_agent_loop, simulate_latency: bool = False,
+                 langfuse: Optional[Langfuse] = None):
+        self.agent = agent
+        self.simulate_latency = simulate_latency
+        self.langfuse = langfuse or Langfuse()
+
+    @staticmethod
+    def _recorded_step_ms(session: _ReplaySession, recorded: Dict[str, Any]) -> List[float]:
+        starts = [_timestamp(g['startTime']) for g in session.generations]
+        ends = [
+            _timestamp(o['endTime']) for o in recorded.get('observations', []) if o.get('endTime')
+        ]
+        bounds = starts + [max(ends, default=starts[-1] if starts else 0.0)]
+        return [(bounds[i + 1] - bounds[i]) * 1000 for i in range(len(starts))]
+
+    def replay(self, recorded: Dict[str, Any]) -> Dict[str, Any]:
+        session = _ReplaySession(recorded, self.simulate_latency)
+        trace = self.langfuse.trace(name="agent_replay", input=recorded.get('input'),
+                                    metadata={"source_trace_id": recorded.get('id'),
+                                              "source_trace_name": recorded.get('name')})
+        tools = {name: session.tool(name) for name in AGENT_TOOLS}
+
+        output = None
+        try:
+            output = self.agent(recorded.get('input'), trace, session.llm, tools)
+        except ReplayExhausted:
+            pass
+        end = time.perf_counter()
+        error = session.stopped
+        if error is not None and not session.divergences:
+            session.diverge("extra_call", session.llm_calls, None, error)
+
+        if error is None:
+            if session.llm_calls < len(session.generations) or session.tool_calls < len(
+                session.steps
+            ):
+                session.diverge(
+                    "missing_steps",
+                    session.llm_calls,
+                    {"llm_calls": len(session.generations), "tool_calls": len(session.steps)},
+                    {"llm_calls": session.llm_calls, "tool_calls": session.tool_calls},
+                )
+            expected_output = (
+                recorded.get('output') if session.llm_recorded else session.final_answer
+            )
+            if output != expected_output:
+                session.diverge("final_output", session.llm_calls, expected_output, output)
+
+        recorded_ms = self._recorded_step_ms(session, recorded)
+        marks = session.marks + [end]
+        replay_ms = [(marks[i + 1] - marks[i]) * 1000 for i in range(len(session.marks))]
+        steps = []
+        for i in range(max(len(recorded_ms), len(replay_ms))):
+            before = recorded_ms[i] if i < len(recorded_ms) else None
+            after = replay_ms[i] if i < len(replay_ms) else None
+            steps.append(
+                {
+                    "step": i + 1,
+                    "recorded_ms": before,
+                    "replay_ms": after,
+                    "delta_ms": (
+                        after - before if before is not None and after is not None else None
+                    ),
+                }
+            )
+
+        report = {
+            "trace_id": recorded.get('id'),
+            "input": recorded.get('input'),
+            "llm_recorded": session.llm_recorded,
+            "matched": not session.divergences,
+            "first_divergence": session.divergences[0] if session.divergences else None,
+            "divergences": session.divergences,
+            "error": error,
+            "steps": steps,
+            "recorded_ms": sum(recorded_ms),
+            "replay_ms": sum(replay_ms)
+        }
+        trace.update(
+            output=output,
+            metadata={
+                key: report[key]
+                for key in ("matched", "first_divergence", "recorded_ms", "replay_ms")
+            },
+        )
+        trace.score(name="replay_match", value=1.0 if report['matched'] else 0.0)
+        return report
+
+    def replay_file(self, path: str) -> List[Dict[str, Any]]:
+        return [self.replay(recorded) for recorded in load_trace_export(path)]
+
+
 # ============================================================
 # Agent 시뮬레이션 함수들
 # ============================================================
 
-def simulate_agent_thinking(query: str, tools: List[Dict]) -> Dict[str, Any]:
+def simulate_agent_thinking(query: str, tools: List[Dict], trace=None) -> Dict[str, Any]:
     """
     Agent의 사고 과정을 시뮬레이션합니다.
 
     실제 구현에서는 LLM이 이 과정을 수행합니다.
+    도구 선택은 IntentRouter가 키워드 trie 정규식과 인자 패턴들로 처리하며,
+    trace를 넘기면 라우팅 결과와 시간이 agent_routing span에 기록됩니다.
     """
     thinking_process = {
         "query": query,
@@ -158,42 +2453,15 @@ def simulate_agent_thinking(query: str, tools: List[Dict]) -> Dict[str, Any]:
         "final_answer": ""
     }
 
-    # 쿼리 분석 및 도구 선택 (시뮬레이션)
-    query_lower = query.lower()
-
-    if "calculate" in query_lower or "compute" in query_lower or any(op in query for op in ['+', '-', '*', '/']):
-        thinking_process["thoughts"].append("사용자가 계산을 요청했습니다.")
-        thinking_process["actions"].append({
-            "tool": "calculate",
-            "input": "추출된 수식"
-        })
-
-    if "time" in query_lower or "date" in query_lower:
-        thinking_process["thoughts"].append("현재 시간 정보가 필요합니다.")
-        thinking_process["actions"].append({
-            "tool": "get_current_time",
-            "input": ""
-        })
-
-    if "weather" in query_lower:
-        thinking_process["thoughts"].append("날씨 정보를 조회해야 합니다.")
-        thinking_process["actions"].append({
-            "tool": "get_weather",
-            "input": "위치 추출 필요"
-        })
-
-    if "search" in query_lower or "what is" in query_lower or "tell me about" in query_lower:
-        thinking_process["thoughts"].append("지식 베이스에서 정보를 검색해야 합니다.")
-        thinking_process["actions"].append({
-            "tool": "search_knowledge_base",
-            "input": "검색 쿼리"
-        })
-
-    if "save" in query_lower or "remember" in query_lower or "note" in query_lower:
-        thinking_process["thoughts"].append("메모를 저장해야 합니다.")
+    # 쿼리 분석 및 도구 선택
+    available = {tool_info['name'] for tool_info in tools} if tools else None
+    for match in INTENT_ROUTER.route(query, trace=trace):
+        if available is not None and match['tool'] not in available:
+            continue
+        thinking_process["thoughts"].append(match['thought'])
         thinking_process["actions"].append({
-            "tool": "save_note",
-            "input": "저장할 내용"
+            "tool": match['tool'],
+            "input": match['input']
         })
 
     return thinking_process
@@ -211,18 +2479,13 @@ def simple_agent_example():
 
     langfuse = Langfuse()
 
-    # 도구 목록
-    tools_list = [
-        {"name": "calculate", "description": "수학 계산 수행"},
-        {"name": "get_current_time", "description": "현재 시간 조회"},
-        {"name": "search_knowledge_base", "description": "지식 베이스 검색"}
-    ]
-
-    print(f"\n사용 가능한 도구: {len(tools_list)}개")
-    for tool in tools_list:
-        print(f"  - {tool['name']}: {tool['description']}")
+    print(f"\n사용 가능한 도구: {len(AGENT_TOOLS)}개")
+    for name, tool_obj in AGENT_TOOLS.items():
+        description = (getattr(tool_obj, "description", None) or tool_obj.__doc__ or name).strip()
+        description = description.splitlines()[0]
+        print(f"  - {name}: {description}")
 
-    # Agent 실행 시뮬레이션
+    # Agent 실행: 사고(Thought) → 행동(Action) → 관찰(Observation) → 최종 답변
     user_query = "What time is it now?"
 
     trace = langfuse.trace(
@@ -230,47 +2493,15 @@ def simple_agent_example():
         user_id="agent_user_001",
         metadata={
             "agent_type": "react",
-            "tools_count": len(tools_list)
+            "tools_count": len(AGENT_TOOLS)
         }
     )
 
     print(f"\nUser Query: {user_query}")
-    print("\nAgent 사고 과정:")
-
-    # 1. 사고 (Thought)
-    thought = "사용자가 현재 시간을 요청했습니다. get_current_time 도구를 사용해야 합니다."
-    print(f"  💭 Thought: {thought}")
-
-    thought_span = trace.span(
-        name="agent_thought_1",
-        metadata={"step": "thinking", "iteration": 1}
-    )
-    thought_span.end(output=thought)
-
-    # 2. 행동 (Action)
-    action = "get_current_time"
-    print(f"  🔧 Action: {action}")
-
-    action_span = trace.span(
-        name="agent_action_1",
-        metadata={"step": "action", "tool": action}
-    )
+    print("\nAgent 사고 과정:\n")
 
-    # 3. 관찰 (Observation)
-    observation = get_current_time.func()
-    print(f"  👀 Observation: {observation}")
-
-    action_span.end(output=observation)
-
-    # 4. 최종 답변
-    final_answer = f"The current time is {observation}"
-    print(f"  ✅ Final Answer: {final_answer}")
-
-    answer_span = trace.span(
-        name="agent_final_answer",
-        metadata={"step": "final_answer"}
-    )
-    answer_span.end(output=final_answer)
+    # LLM 호출은 agent_llm_{n} generation, 도구 호출은 agent_step_{n}_{도구} span으로 기록됨
+    run_agent_loop(user_query, trace, RouterAgentLLM(), verbose=True)
 
     trace.end()
 
@@ -292,68 +2523,23 @@ def multi_step_agent_example():
     langfuse = Langfuse()
 
     user_query = "What is Langfuse and save this information"
+    session_id = "agent_session_multi_001"
 
     trace = langfuse.trace(
         name="multi_step_agent",
         user_id="agent_user_002",
+        session_id=session_id,
         metadata={"agent_type": "react", "expected_steps": "multiple"}
     )
 
     print(f"\nUser Query: {user_query}")
     print("\nAgent 실행 과정:\n")
 
-    # Iteration 1: 정보 검색
-    print("[Iteration 1]")
-    print("  💭 Thought: 먼저 Langfuse에 대한 정보를 검색해야 합니다.")
-
-    step1_span = trace.span(
-        name="agent_step_1_search",
-        metadata={"iteration": 1, "action": "search"}
-    )
-
-    action1 = "search_knowledge_base"
-    input1 = "langfuse"
-    print(f"  🔧 Action: {action1}('{input1}')")
-
-    observation1 = search_knowledge_base.func(input1)
-    print(f"  👀 Observation: {observation1}")
-
-    step1_span.end(
-        input={"action": action1, "input": input1},
-        output=observation1
-    )
-
-    # Iteration 2: 정보 저장
-    print("\n[Iteration 2]")
-    print("  💭 Thought: 이제 이 정보를 저장해야 합니다.")
-
-    step2_span = trace.span(
-        name="agent_step_2_save",
-        metadata={"iteration": 2, "action": "save_note"}
-    )
-
-    action2 = "save_note"
-    input2 = observation1
-    print(f"  🔧 Action: {action2}(...)")
-
-    observation2 = save_note.func(input2)
-    print(f"  👀 Observation: {observation2}")
-
-    step2_span.end(
-        input={"action": action2, "input": input2[:100]},
-        output=observation2
-    )
-
-    # 최종 답변
-    print("\n[Final]")
-    final_answer = f"I found information about Langfuse and saved it. {observation2}"
-    print(f"  ✅ Answer: {final_answer[:100]}...")
-
-    final_span = trace.span(
-        name="agent_final_answer",
-        metadata={"step": "final"}
-    )
-    final_span.end(output=final_answer)
+    # agent_step_1_search (BM25 랭킹 포함) → agent_step_2_save → 최종 답변
+    # save_note에는 trace의 session_id가 함께 전달되어 세션별로 메모가 묶임
+    run_agent_loop(user_query, trace, RouterAgentLLM(), verbose=True, session_id=session_id)
+    saved = get_note_store().by_session(session_id)
+    print(f"\n세션 {session_id}의 메모: {len(saved)}개")
 
     trace.end()
 
@@ -374,60 +2560,84 @@ def agent_with_error_handling():
 
     langfuse = Langfuse()
 
-    user_query = "Calculate the result of 10 divided by zero"
+    user_query = "Calculate the result of 10 / 0"
 
     trace = langfuse.trace(
         name="agent_with_error_handling",
         user_id="agent_user_003",
+        input=user_query,
         metadata={"test_type": "error_handling"}
     )
 
     print(f"\nUser Query: {user_query}")
     print("\nAgent 실행 과정:\n")
 
-    # Iteration 1: 계산 시도 (실패)
-    print("[Iteration 1 - 시도]")
-    print("  💭 Thought: 계산을 수행해야 합니다.")
-
-    step1_span = trace.span(
-        name="agent_step_1_calculate_attempt",
-        metadata={"iteration": 1}
-    )
-
-    try:
-        action1 = "calculate"
-        input1 = "10 / 0"
-        print(f"  🔧 Action: {action1}('{input1}')")
-
-        observation1 = "계산 오류: division by zero"
-        print(f"  ❌ Observation: {observation1}")
+    # 반복/토큰/데드라인 예산 안에서 실행하고, 각 step span에 예산 사용량을 기록
+    with ExecutionController(
+        deadline_seconds=5.0, max_iterations=4, token_budget=2000
+    ) as controller:
+        # Iteration 1: 계산 시도 (실패)
+        print("[Iteration 1 - 시도]")
+        print("  💭 Thought: 계산을 수행해야 합니다.")
+
+        with controller.step(
+            trace, "agent_step_1_calculate_attempt", tool="calculate"
+        ) as step1_span:
+            action1 = "calculate"
+            input1 = "10 / 0"
+            print(f"  🔧 Action: {action1}('{input1}')")
+
+            controller.consume_tokens(estimate_tokens(user_query) + 50)
+            observation1 = controller.call_tool(action1, AGENT_TOOLS[action1], input1)
+            failed = observation1.startswith("계산 오류")
+            print(f"  {'❌' if failed else '👀'} Observation: {observation1}")
+
+            step1_span.update(
+                input={"action": action1, "input": input1},
+                output=observation1,
+                level="ERROR" if failed else "DEFAULT"
+            )
+
+        # Iteration 2: 에러 처리
+        print("\n[Iteration 2 - 복구]")
+        print("  💭 Thought: 0으로 나누기는 불가능합니다. 사용자에게 설명해야 합니다.")
+
+        with controller.step(trace, "agent_step_2_error_explanation", recovery=True) as step2_span:
+            final_answer = (
+                "I cannot calculate 10 divided by zero because division by zero is mathematically "
+                "undefined. Would you like to try a different calculation?"
+            )
+            controller.consume_tokens(estimate_tokens(final_answer))
+            print(f"  ✅ Answer: {final_answer}")
+            step2_span.update(output=final_answer)
+
+        trace.update(output=final_answer, metadata={"budget": controller.budget()})
 
-        step1_span.end(
-            input={"action": action1, "input": input1},
-            output=observation1,
-            level="ERROR"
-        )
-
-    except Exception as e:
-        observation1 = f"Error: {str(e)}"
+    trace.end()
 
-    # Iteration 2: 에러 처리
-    print("\n[Iteration 2 - 복구]")
-    print("  💭 Thought: 0으로 나누기는 불가능합니다. 사용자에게 설명해야 합니다.")
+    # 응답하지 않는 도구: 제한 시간이 지나면 에러 관찰로 바꾸고 다음 단계로 진행
+    def hanging_weather(location, cancel_event=None):
+        if cancel_event is not None and cancel_event.wait(5.0):
+            return "cancelled"
+        return get_weather.func(location)
 
-    step2_span = trace.span(
-        name="agent_step_2_error_explanation",
-        metadata={"iteration": 2, "recovery": True}
+    timeout_query = "What's the weather in Paris?"
+    timeout_trace = langfuse.trace(
+        name="agent_with_error_handling",
+        user_id="agent_user_003",
+        metadata={"test_type": "tool_timeout"}
     )
-
-    final_answer = "I cannot calculate 10 divided by zero because division by zero is mathematically undefined. Would you like to try a different calculation?"
-    print(f"  ✅ Answer: {final_answer}")
-
-    step2_span.end(output=final_answer)
-
-    trace.end()
-
-    print("\n✓ Agent가 에러를 처리하고 복구함")
+    print(f"\nUser Query: {timeout_query}\n")
+    with ExecutionController(deadline_seconds=3.0, max_iterations=4,
+                             tool_timeouts={"get_weather": 0.3}) as controller:
+        run_agent_loop(timeout_query, timeout_trace, RouterAgentLLM(),
+                       tools={**AGENT_TOOLS, "get_weather": hanging_weather},
+                       verbose=True, controller=controller)
+        budget = controller.budget()
+    timeout_trace.end()
+    print(f"  → {budget['elapsed_ms']:.0f}ms, 도구 타임아웃 {budget['tool_timeouts']}회")
+
+    print("\n✓ Agent가 에러를 처리하고 복구함 (예산 사용량은 step span 메타데이터에 기록)")
 
     langfuse.flush()
 
@@ -458,42 +2668,22 @@ def agent_with_multiple_tools():
     print(f"\nUser Query: {user_query}")
     print("\nAgent 실행 과정:\n")
 
-    # Step 1: 날씨 조회
-    print("[Step 1: 날씨 조회]")
-    print("  💭 Thought: 먼저 서울의 날씨를 확인해야 합니다.")
+    # Step 1-2: 날씨 조회와 시간 계산은 서로 독립적이므로 동시에 실행
+    print("[Step 1-2: 날씨 조회 + 시간 계산 (병렬)]")
+    print("  💭 Thought: 서울 날씨와 2PM~6PM 시간 계산은 서로 의존하지 않습니다.")
 
-    weather_span = trace.span(
-        name="agent_weather_check",
-        metadata={"step": 1, "tool": "get_weather"}
-    )
+    plan = [
+        {"id": "weather_check", "tool": "get_weather", "input": "Seoul"},
+        {"id": "time_calculation", "tool": "calculate", "input": "18 - 14"},  # 6PM - 2PM
+    ]
+    execution = ParallelToolExecutor().run(plan, trace)
 
-    weather_result = get_weather.func("Seoul")
-    print(f"  🔧 Action: get_weather('Seoul')")
+    weather_result = execution['outputs']['weather_check']
+    calc_result = execution['outputs']['time_calculation']
+    print(f"  🔧 Action: get_weather('Seoul') | calculate('18 - 14')")
     print(f"  👀 Observation: {weather_result}")
-
-    weather_span.end(
-        input="Seoul",
-        output=weather_result
-    )
-
-    # Step 2: 시간 계산
-    print("\n[Step 2: 시간 계산]")
-    print("  💭 Thought: 이제 2PM에서 6PM까지의 시간을 계산해야 합니다.")
-
-    calc_span = trace.span(
-        name="agent_time_calculation",
-        metadata={"step": 2, "tool": "calculate"}
-    )
-
-    calc_result = calculate.func("18 - 14")  # 6PM - 2PM
-    print(f"  🔧 Action: calculate('18 - 14')")
     print(f"  👀 Observation: {calc_result}")
 
-    calc_span.end(
-        input="18 - 14",
-        output=calc_result
-    )
-
     # Step 3: 최종 답변 생성
     print("\n[Step 3: 최종 답변]")
 
@@ -533,8 +2723,8 @@ def conversational_agent_with_memory():
 
     session_id = "agent_session_001"
 
-    # 대화 히스토리
-    conversation_history = []
+    # 대화 메모리 (최근 턴 원문 + 과거 턴 요약/검색, 토큰 예산 300)
+    memory = AgentMemory(token_budget=300, recent_turns=2)
 
     conversations = [
         {
@@ -563,7 +2753,7 @@ def conversational_agent_with_memory():
             user_id="agent_user_005",
             metadata={
                 "turn": conv['turn'],
-                "history_length": len(conversation_history)
+                "history_length": memory.turn_count
             }
         )
 
@@ -573,11 +2763,14 @@ def conversational_agent_with_memory():
         # Agent 사고 과정
         memory_span = trace.span(
             name="agent_memory_retrieval",
-            metadata={"memory_items": len(conversation_history)}
+            metadata={"memory_items": memory.turn_count}
         )
 
-        memory_context = "\n".join([f"- {item}" for item in conversation_history])
-        print(f"  🧠 Memory: {len(conversation_history)} previous exchanges")
+        memory_context = memory.build_context(conv['user'], span=memory_span)
+        print(
+            f"  🧠 Memory: {memory.turn_count} previous exchanges "
+            f"({estimate_tokens(memory_context)} tokens)"
+        )
 
         memory_span.end(output=memory_context if memory_context else "No previous context")
 
@@ -590,9 +2783,8 @@ def conversational_agent_with_memory():
 
         response_span.end(output=conv['agent_response'])
 
-        # 대화 히스토리 업데이트
-        conversation_history.append(f"User: {conv['user']}")
-        conversation_history.append(f"Agent: {conv['agent_response']}")
+        # 대화 메모리 업데이트
+        memory.add_turn(conv['user'], conv['agent_response'])
 
         trace.end()
         print()
@@ -606,7 +2798,7 @@ def agent_performance_comparison():
     """
     Agent 성능 비교 예제
 
-    여러 Agent 전략을 비교합니다.
+    여러 Agent 전략을 같은 질의 모음과 도구 지연 분포에서 반복 실행해 실측값으로 비교합니다.
     """
     print("\n" + "=" * 60)
     print("6. Agent 성능 비교")
@@ -614,62 +2806,739 @@ def agent_performance_comparison():
 
     langfuse = Langfuse()
 
-    test_query = "Find information about Python and save it"
+    # 도구/LLM 지연 분포: (중앙값 ms, 로그정규 sigma)
+    latency = ToolLatencyModel({
+        "llm": (60.0, 0.3),
+        "get_weather": (40.0, 0.5),
+        "search_knowledge_base": (30.0, 0.4),
+        "save_note": (15.0, 0.3),
+        "calculate": (2.0, 0.2),
+        "get_current_time": (1.0, 0.2),
+    }, seed=7)
+    benchmark = StrategyBenchmark(BENCHMARK_SUITE, latency, repetitions=3, langfuse=langfuse)
+
+    descriptions = {
+        "sequential": "도구마다 LLM 호출 후 순차 실행",
+        "parallel": "의존성 단계별로 독립적인 도구를 병렬 실행",
+        "optimized": "중복 호출 제거 + 한 번에 계획 + 메모이제이션",
+    }
 
-    strategies = [
-        {
-            "name": "Sequential Strategy",
-            "description": "순차적으로 도구 실행",
-            "steps": 2,
-            "execution_time": 3.5
-        },
-        {
-            "name": "Parallel Strategy",
-            "description": "가능한 경우 병렬 실행",
-            "steps": 2,
-            "execution_time": 2.1
-        },
-        {
-            "name": "Optimized Strategy",
-            "description": "불필요한 단계 제거",
-            "steps": 1,
-            "execution_time": 1.8
-        }
+    print(f"\nQueries: {len(BENCHMARK_SUITE)}개, Repetitions: {benchmark.repetitions}회")
+    print(f"Strategies: {len(AGENT_STRATEGIES)}개\n")
+
+    summary = benchmark.run(AGENT_STRATEGIES, baseline="sequential")
+
+    # 질의마다 작업량이 다르므로 전략 비교는 질의별 p50 비율의 기하평균으로
+    print(f"{'Strategy':<12} {'wall vs seq':>11} {'steps':>6} {'tools':>6} {'tokens':>7}")
+    for name, result in summary.items():
+        print(f"{name:<12} {result['relative']['wall_ms']:>10.2f}x "
+              f"{result['mean']['steps']:>6.2f} {result['mean']['tool_calls']:>6.2f} "
+              f"{result['mean']['tokens']:>7.0f}")
+        print(f"  - {descriptions.get(name, '')}")
+
+    print(
+        f"\n질의별 wall p50 (반복 {benchmark.repetitions}회, p90은 {benchmark.min_tail_samples}회 이상일 때만)"
+    )
+    for index, spec in enumerate(BENCHMARK_SUITE):
+        cells = "  ".join(f"{name} {summary[name]['queries'][index]['wall_ms']['p50']:>5.0f}ms"
+                          for name in summary)
+        print(f"  [{index + 1}] {spec['query'][:40]:<40}  {cells}")
+
+    fastest = min(summary, key=lambda name: summary[name]['relative']['wall_ms'])
+    print(f"\n✓ Agent 전략 비교 완료 (질의별 p50 비율 기준 가장 빠른 전략: {fastest})")
+    print("  실행별 trace에 wall_ms/steps/tool_calls/tokens 점수가, 요약 trace에 기준 대비 비율이 기록됨")
+
+    langfuse.flush()
+
+
+def parallel_tool_execution_example():
+    """
+    병렬 도구 실행 예제
+
+    서로 독립적인 도구 호출은 동시에, 의존하는 호출은 선행 결과를 받아 실행하고
+    순차 실행 대비 시간과 critical path를 비교합니다.
+    """
+    print("\n" + "=" * 60)
+    print("7. 의존성 DAG 기반 병렬 도구 실행")
+    print("=" * 60)
+
+    langfuse = Langfuse()
+
+    # 실제 API 호출 지연 시뮬레이션
+    latencies = {
+        "get_weather": 0.4,
+        "search_knowledge_base": 0.3,
+        "calculate": 0.05,
+        "save_note": 0.2,
+    }
+
+    def with_latency(name):
+        def call(*args, **kwargs):
+            time.sleep(latencies.get(name, 0.0))
+            return invoke_tool(AGENT_TOOLS[name], args[0] if args else (kwargs or None))
+        return call
+
+    tools = {name: with_latency(name) for name in AGENT_TOOLS}
+
+    user_query = (
+        "Check the weather in Seoul and Tokyo, find what Langfuse is, compute 18 - 14, "
+        "and save a summary"
+    )
+    plan = [
+        {"id": "weather_seoul", "tool": "get_weather", "input": "Seoul"},
+        {"id": "weather_tokyo", "tool": "get_weather", "input": "Tokyo"},
+        {"id": "search", "tool": "search_knowledge_base", "input": "langfuse"},
+        {"id": "hours", "tool": "calculate", "input": "18 - 14"},
+        {"id": "save", "tool": "save_note",
+         "input": "{weather_seoul} / {weather_tokyo} / {search} / {hours}",
+         "depends_on": ["weather_seoul", "weather_tokyo", "search", "hours"]},
     ]
 
-    print(f"\nTest Query: {test_query}")
-    print(f"Strategies: {len(strategies)}개\n")
+    trace = langfuse.trace(
+        name="parallel_tool_agent",
+        user_id="agent_user_007",
+        input=user_query,
+        metadata={"agent_type": "plan_and_execute", "planned_actions": len(plan)}
+    )
+
+    print(f"\nUser Query: {user_query}")
+    print("\n계획된 도구 호출:")
+    for action in plan:
+        deps = action.get('depends_on')
+        print(
+            f"  - {action['id']}: {action['tool']}"
+            + (f" (after {', '.join(deps)})" if deps else "")
+        )
+
+    execution = ParallelToolExecutor(tools=tools, max_workers=4).run(plan, trace)
+
+    print("\n실행 타임라인:")
+    for action_id, (start, end) in sorted(
+        execution['timings'].items(), key=lambda item: item[1][0]
+    ):
+        print(f"  {action_id:<14} {start * 1000:>6.0f}ms → {end * 1000:>6.0f}ms")
+
+    print(f"\n  - 전체 실행 시간: {execution['wall_ms']:.0f}ms")
+    print(f"  - 순차 실행 시 (도구 시간 합계): {execution['tool_time_sum_ms']:.0f}ms")
+    print(
+        f"  - Critical path: {' → '.join(execution['critical_path'])} "
+        f"({execution['critical_path_ms']:.0f}ms)"
+    )
+
+    trace.update(output=execution['outputs']['save'])
+    trace.score(name="parallel_speedup", value=execution['tool_time_sum_ms'] / execution['wall_ms'])
+
+    print("\n✓ 도구 호출별 자식 span과 critical path가 Langfuse에 기록됨")
+
+    langfuse.flush()
+
+
+def tool_memoization_example():
+    """
+    도구 메모이제이션 예제
+
+    한 세션의 여러 턴에서 반복되는 도구 호출을 정책에 따라 재사용합니다.
+    """
+    print("\n" + "=" * 60)
+    print("8. 정책 기반 도구 결과 메모이제이션")
+    print("=" * 60)
 
-    for strategy in strategies:
+    langfuse = Langfuse()
+
+    latencies = {"get_weather": 0.2, "search_knowledge_base": 0.15, "get_current_time": 0.01,
+                 "calculate": 0.01, "save_note": 0.05}
+
+    def with_latency(name):
+        def call(*args, **kwargs):
+            time.sleep(latencies.get(name, 0.0))
+            return invoke_tool(AGENT_TOOLS[name], args[0] if args else (kwargs or None))
+        return call
+
+    tools = {name: with_latency(name) for name in AGENT_TOOLS}
+    memoizer = ToolMemoizer(max_entries=256)
+    # 턴 안에서 반복되는 호출도 캐시를 거치도록 순차 실행 (max_workers=1)
+    executor = ParallelToolExecutor(tools=tools, memoizer=memoizer, max_workers=1)
+
+    session_id = "agent_session_memo_001"
+    turns = [
+        ("What's the weather in Seoul and what is Langfuse?",
+         [("weather", "get_weather", "Seoul"), ("search", "search_knowledge_base", "langfuse")]),
+        ("Compare Seoul and Tokyo weather, and what time is it?",
+         [("weather_seoul", "get_weather", "Seoul"), ("weather_tokyo", "get_weather", "Tokyo"),
+          ("time", "get_current_time", None)]),
+        ("Remind me what Langfuse is and save it, then check the time again",
+         [("search", "search_knowledge_base", "langfuse"), ("time", "get_current_time", None),
+          ("time_again", "get_current_time", None), ("save", "save_note", "Langfuse summary")]),
+    ]
+
+    print(f"\nSession ID: {session_id}")
+    print(f"캐시 정책: " + ", ".join(f"{name}={policy['policy']}"
+                                   for name, policy in DEFAULT_TOOL_CACHE_POLICIES.items()))
+
+    for turn, (user_query, calls) in enumerate(turns, 1):
         trace = langfuse.trace(
-            name=f"agent_strategy_comparison",
-            metadata={
-                "strategy": strategy['name'],
-                "experiment": "performance_comparison"
-            }
+            name="memoized_agent_turn",
+            session_id=session_id,
+            input=user_query,
+            metadata={"turn": turn}
         )
+        plan = [{"id": action_id, "tool": tool_name, "input": tool_input}
+                for action_id, tool_name, tool_input in calls]
+
+        hits_before = memoizer.hits
+        execution = executor.run(plan, trace, session_id=session_id)
+        memoizer.clear_scope(trace.id)
+
+        print(f"\n[Turn {turn}] {user_query}")
+        print(f"  - 도구 호출 {len(plan)}개 (캐시 적중 {memoizer.hits - hits_before}개), "
+              f"실행 시간 {execution['wall_ms']:.0f}ms")
+
+    stats = memoizer.stats()
+    print(f"\n캐시 통계: 적중 {stats['hits']}회, 미스 {stats['misses']}회 "
+          f"(적중률 {stats['hit_rate'] * 100:.0f}%), 항목 {stats['entries']}개")
+
+    print("\n✓ 도구 span에 cache=hit/miss/bypass와 정책이 기록됨")
+
+    langfuse.flush()
+
+
+def knowledge_base_search_example():
+    """
+    지식 베이스 검색 예제
+
+    대규모 지식 베이스를 파일에서 불러와 BM25로 검색하고, 증분 업데이트를 반영합니다.
+    """
+    print("\n" + "=" * 60)
+    print("9. 역색인 + BM25 지식 베이스")
+    print("=" * 60)
 
-        print(f"[{strategy['name']}]")
-        print(f"  Description: {strategy['description']}")
-        print(f"  Steps: {strategy['steps']}")
-        print(f"  Execution Time: {strategy['execution_time']}s")
+    langfuse = Langfuse()
 
-        # 성능 점수 기록
-        trace.score(
-            name="efficiency",
-            value=1.0 / strategy['execution_time']
+    # 합성 지식 베이스를 JSONL 파일로 생성 (Zipf 분포 어휘 3만 개 + 도메인 용어)
+    rng = random.Random(9)
+    domain_terms = (
+        "trace span generation score dataset prompt session latency cost token model agent tool "
+        "retrieval embedding cache evaluation callback flush batch sampling regression"
+    ).split()
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    vocabulary = ["".join(rng.choices(letters, k=rng.randint(4, 9))) for _ in range(30_000)]
+    for rank, term in zip(range(300, 3000, 120), domain_terms):
+        vocabulary[rank] = term
+    cum_weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(vocabulary))))
+
+    directory = tempfile.mkdtemp(prefix="agent_kb_")
+    kb_path = os.path.join(directory, "agent_knowledge_base.jsonl")
+    with open(kb_path, "w", encoding="utf-8") as f:
+        for i in range(50_000):
+            words = rng.choices(vocabulary, cum_weights=cum_weights, k=30)
+            f.write(json.dumps({"id": f"kb_{i}", "title": f"{words[0]} {words[1]} guide",
+                                "content": " ".join(words)}) + "\n")
+
+    start = time.perf_counter()
+    kb = KnowledgeBase.from_jsonl(kb_path)
+    print(f"\n지식 베이스 로딩 + 색인: {len(kb):,}개 문서, {time.perf_counter() - start:.2f}s")
+    shutil.rmtree(directory, ignore_errors=True)
+
+    # 증분 업데이트: 추가/수정/삭제는 해당 문서의 term만 갱신
+    start = time.perf_counter()
+    kb.upsert("kb_langfuse", "Langfuse traces every agent tool call with spans, scores and latency",
+              title="langfuse agent tracing")
+    kb.upsert(
+        "kb_0", "Updated entry about prompt caching and prompt versions", title="prompt caching"
+    )
+    kb.remove("kb_1")
+    print(f"증분 업데이트 3건: {(time.perf_counter() - start) * 1000:.2f}ms")
+
+    queries = ["how does langfuse trace agent tool calls", "prompt caching versions",
+               "regression sampling evaluation", "embedding retrieval cache"]
+
+    trace = langfuse.trace(name="knowledge_base_search", metadata={"documents": len(kb)})
+    for query in queries:
+        span = trace.span(name="tool_search_knowledge_base", input=query)
+        start = time.perf_counter()
+        results = kb.search(query, k=3, span=span)
+        elapsed = (time.perf_counter() - start) * 1000
+        span.end(
+            output=[
+                {"id": doc['id'], "title": doc['title'], "score": doc['score']} for doc in results
+            ]
         )
 
-        trace.score(
-            name="step_count",
-            value=1.0 / strategy['steps']
+        print(f"\n  Query: {query} ({elapsed:.1f}ms)")
+        for doc in results:
+            print(f"    - [{doc['score']:.2f}] {doc['id']}: {doc['title']}")
+
+    # 참고: 기존 방식(모든 항목을 순회하며 부분 문자열 검사) 한 번의 비용
+    start = time.perf_counter()
+    _ = [doc for doc in kb.documents.values() if "langfuse" in doc['content'].lower()]
+    print(f"\n  (비교) 선형 스캔 1회: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    print("\n✓ 검색 결과와 BM25 점수가 tool span에 기록됨")
+
+    langfuse.flush()
+
+
+def safe_calculator_example():
+    """
+    안전한 계산기 예제
+
+    반복 호출 시 캐시된 컴파일 결과를 사용하고, 위험하거나 과도한 입력을 거부하며,
+    하나의 표현식을 여러 변수 값에 대해 벡터화 계산합니다.
+    """
+    print("\n" + "=" * 60)
+    print("10. AST 기반 안전한 계산기")
+    print("=" * 60)
+
+    langfuse = Langfuse()
+    trace = langfuse.trace(name="safe_calculator", metadata={"tool": "calculate"})
+
+    print("\n[입력 검증]")
+    for expression in ["18 - 14", "sqrt(2) * 10", "10 / 0", "__import__('os').system('ls')",
+                       "2 ** 10 ** 10", "9 ** 999 * 9 ** 999 * 9 ** 999", "().__class__"]:
+        span = trace.span(name="tool_calculate", input=expression)
+        result = calculate.func(expression)
+        span.end(output=result, level="ERROR" if result.startswith("계산 오류") else None)
+        print(f"  {expression:<36} → {result}")
+
+    # 반복 호출: 컴파일 결과 캐시 vs eval
+    expression = "(1200 * 0.85 + 350) / 12 - 4 ** 2"
+    iterations = 20_000
+    span = trace.span(
+        name="calculator_benchmark", input=expression, metadata={"iterations": iterations}
+    )
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        CALCULATOR.evaluate(expression)
+    cached_us = (time.perf_counter() - start) / iterations * 1e6
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        eval(expression, {"__builtins__": {}}, {})
+    eval_us = (time.perf_counter() - start) / iterations * 1e6
+
+    # 벡터화: 주문 100만 건의 금액을 한 번에 계산
+    rng = np.random.default_rng(0)
+    bindings = {
+        "price": rng.uniform(10, 500, 1_000_000),
+        "qty": rng.integers(1, 20, 1_000_000),
+        "discount": rng.uniform(0, 0.3, 1_000_000),
+    }
+    start = time.perf_counter()
+    totals = CALCULATOR.evaluate_many("round(price * qty * (1 - discount), 2)", bindings)
+    vectorized_ms = (time.perf_counter() - start) * 1000
+
+    span.end(metadata={
+        "cached_us_per_call": round(cached_us, 3),
+        "eval_us_per_call": round(eval_us, 3),
+        "vectorized_rows": len(totals),
+        "vectorized_ms": round(vectorized_ms, 3),
+        "cache": CALCULATOR.cache_info()._asdict()
+    })
+
+    print("\n[성능]")
+    print(f"  - 캐시된 AST 계산: {cached_us:.2f}µs/회, eval: {eval_us:.2f}µs/회")
+    print(f"  - 벡터화 계산: {len(totals):,}건 {vectorized_ms:.1f}ms (합계 {totals.sum():,.0f})")
+    print(f"  - 컴파일 캐시: {CALCULATOR.cache_info()}")
+
+    print("\n✓ 계산 결과와 거부된 입력이 Langfuse에 기록됨")
+
+    langfuse.flush()
+
+
+def intent_routing_example():
+    """
+    의도 라우팅 예제
+
+    트리거 정규식으로 사용할 도구와 인자를 추출하고 (겹치는 매칭 포함), 규칙이 수백 개로 늘어났을 때
+    키워드를 하나씩 검사하는 방식과 라우팅 시간을 비교합니다.
+    """
+    print("\n" + "=" * 60)
+    print("11. 정규식 기반 의도 라우팅")
+    print("=" * 60)
+
+    langfuse = Langfuse()
+    tools_list = [{"name": name} for name in AGENT_TOOLS]
+
+    queries = [
+        "What's the weather in Seoul and what is Langfuse?",
+        "Calculate (1200 * 0.85 + 350) / 12 and save the result",
+        "Tell me about agent tracing, then check the weather for New York",
+        "What time is it?",
+        # 겹치는 트리거: 검색 패턴과 time 키워드가 모두 매칭되어야 함
+        "what is the time",
+    ]
+
+    for query in queries:
+        trace = langfuse.trace(name="agent_routing_example", input=query)
+        thinking = simulate_agent_thinking(query, tools_list, trace=trace)
+        print(f"\n  Query: {query}")
+        for thought, action in zip(thinking['thoughts'], thinking['actions']):
+            print(f"    💭 {thought} → {action['tool']}({action['input']!r})")
+
+    # 규칙 300개 규모에서 라우팅 시간 비교
+    rng = random.Random(11)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    keywords = sorted({"".join(rng.choices(letters, k=7)) for _ in range(600)})
+    synthetic_rules = DEFAULT_ROUTING_RULES + [
+        {"tool": f"tool_{i}", "thought": f"tool_{i} 필요", "input": "",
+         "keywords": [keywords[2 * i], keywords[2 * i + 1]]}
+        for i in range(295)
+    ]
+    router = IntentRouter(synthetic_rules)
+    trigger_words = [(rule['tool'], keywords[2 * i], keywords[2 * i + 1])
+                     for i, rule in enumerate(synthetic_rules[len(DEFAULT_ROUTING_RULES):])]
+
+    def keyword_chain(query):
+        # 기존 방식: 소문자 변환 후 도구마다 in 검사
+        query_lower = query.lower()
+        return [tool_name for tool_name, first, second in trigger_words
+                if first in query_lower or second in query_lower]
+
+    query = f"please run {keywords[100]} and {keywords[450]} on the weather in Paris"
+    iterations = 5_000
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        router.route(query)
+    router_us = (time.perf_counter() - start) / iterations * 1e6
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        keyword_chain(query)
+    chain_us = (time.perf_counter() - start) / iterations * 1e6
+
+    trace = langfuse.trace(name="agent_routing_benchmark", metadata={"rules": len(synthetic_rules)})
+    matches = router.route(query, trace=trace)
+    trace.update(
+        metadata={"router_us": round(router_us, 3), "keyword_chain_us": round(chain_us, 3)}
+    )
+
+    print(f"\n[규칙 {len(synthetic_rules)}개]")
+    print(f"  - 매칭: {[m['tool'] for m in matches]}")
+    print(f"  - 정규식 라우터: {router_us:.1f}µs/질의 "
+          f"(인자 추출 포함, 스캔 {router.patterns_scanned}회)")
+    print(f"  - 도구별 in 검사: {chain_us:.1f}µs/질의 (도구 선택만)")
+
+    print("\n✓ 라우팅 결과와 시간이 agent_routing span에 기록됨")
+
+    langfuse.flush()
+
+
+def long_session_memory_example():
+    """
+    장기 세션 메모리 예제
+
+    수백 턴이 이어지는 세션에서도 메모리와 프롬프트 컨텍스트가 토큰 예산 안에 머무는지 확인합니다.
+    """
+    print("\n" + "=" * 60)
+    print("12. 토큰 예산 기반 Agent 메모리")
+    print("=" * 60)
+
+    langfuse = Langfuse()
+    session_id = "agent_session_long_001"
+    memory = AgentMemory(token_budget=400, recent_turns=4, max_summaries=100)
+
+    topics = ["weather in Seoul", "Langfuse pricing", "prompt versioning", "dataset experiments",
+              "tracing latency", "Python packaging", "agent memory", "vector search"]
+    rng = random.Random(12)
+
+    naive_history_tokens = 0
+    checkpoints = {10, 50, 200, 400}
+    for turn in range(1, 401):
+        topic = rng.choice(topics)
+        user = f"Question {turn}: can you explain {topic} in more detail?"
+        agent = (
+            f"Here is an explanation of {topic}. "
+            f"It covers the main ideas and a short example for turn {turn}."
         )
 
-        trace.end()
-        print()
+        if turn in checkpoints:
+            trace = langfuse.trace(
+                name="long_session_turn", session_id=session_id, metadata={"turn": turn}
+            )
+            span = trace.span(name="agent_memory_retrieval", input=user)
+            context = memory.build_context(user, span=span)
+            span.end(output=context)
+            print(f"\n[Turn {turn}] 컨텍스트 {estimate_tokens(context)} 토큰 "
+                  f"(전체 히스토리 사용 시 {naive_history_tokens} 토큰)")
+            print(f"  - 최근 턴 {len(memory.recent)}개, 요약 {len(memory.summaries)}개, "
+                  f"색인된 과거 턴 {len(memory.archive)}개, 제거된 턴 {memory.evicted_turns}개")
+
+        memory.add_turn(user, agent)
+        naive_history_tokens += estimate_tokens(f"User: {user}") + estimate_tokens(
+            f"Agent: {agent}"
+        )
+
+    print("\n✓ 메모리 크기, 검색 시간, 제거 수가 agent_memory_retrieval span에 기록됨")
+
+    langfuse.flush()
+
+
+def controlled_agent_example():
+    """
+    실행 제어 예제
+
+    느리거나 멈추는 도구와 계속 실패하는 재시도 루프를 예산으로 끊어냅니다.
+    """
+    print("\n" + "=" * 60)
+    print("13. 데드라인/도구 타임아웃/반복/토큰 예산 실행 제어")
+    print("=" * 60)
+
+    langfuse = Langfuse()
+
+    def flaky_weather(location, cancel_event=None):
+        # 외부 날씨 API가 가끔 응답하지 않는 상황 (취소 신호를 받으면 즉시 중단)
+        delay = 5.0 if location == "Paris" else 0.1
+        if cancel_event is not None and cancel_event.wait(delay):
+            return "cancelled"
+        return get_weather.func(location)
+
+    def run_agent(label, plan, **limits):
+        trace = langfuse.trace(name="controlled_agent", metadata={"scenario": label, **limits})
+        print(f"\n[{label}] limits={limits}")
+
+        with ExecutionController(tool_timeouts={"get_weather": 0.5}, **limits) as controller:
+            answer = None
+            try:
+                for thought, tool_name, tool_input in plan:
+                    with controller.step(
+                        trace, f"agent_step_{controller.iterations + 1}_{tool_name}", tool=tool_name
+                    ) as span:
+                        # 사고 단계의 LLM 토큰 사용량 (근사)
+                        controller.consume_tokens(estimate_tokens(thought) + 150)
+                        try:
+                            observation = controller.call_tool(
+                                tool_name,
+                                (
+                                    flaky_weather
+                                    if tool_name == "get_weather"
+                                    else AGENT_TOOLS[tool_name]
+                                ),
+                                tool_input,
+                            )
+                        except ToolTimeout as e:
+                            observation = f"도구 타임아웃: {e}"
+                        span.update(
+                            input={"tool": tool_name, "input": tool_input}, output=observation
+                        )
+                        print(
+                            f"  step {controller.iterations}: {tool_name}({tool_input!r}) "
+                            f"→ {observation[:50]}"
+                        )
+                answer = "완료"
+            except BudgetExceeded as e:
+                answer = f"중단 ({e.reason}): {e}"
+                trace.event(
+                    name="budget_exceeded", metadata={"reason": e.reason, **controller.budget()}
+                )
+
+            budget = controller.budget()
+            trace.update(output=answer, metadata={"budget": budget})
+            print(f"  → {answer}")
+            print(f"  → {budget['elapsed_ms']:.0f}ms, 반복 {budget['iteration']}회, "
+                  f"토큰 {budget['tokens_used']}, 도구 타임아웃 {budget['tool_timeouts']}회")
+
+    normal_plan = [
+        ("서울 날씨를 확인합니다.", "get_weather", "Seoul"),
+        ("시간을 계산합니다.", "calculate", "18 - 14"),
+    ]
+    # 응답 없는 도구를 계속 재시도하는 폭주 루프
+    runaway_plan = [("파리 날씨를 다시 확인합니다.", "get_weather", "Paris")] * 20
+
+    run_agent("정상 실행", normal_plan, deadline_seconds=5.0, max_iterations=8)
+    run_agent("반복 횟수 제한", runaway_plan, deadline_seconds=30.0, max_iterations=3)
+    run_agent("데드라인 제한", runaway_plan, deadline_seconds=1.2, max_iterations=20)
+    run_agent("토큰 예산 제한", runaway_plan, deadline_seconds=30.0, max_iterations=20, token_budget=500)
+
+    print("\n✓ 각 step span에 예산 사용량이 기록되고 폭주 루프가 제한 안에서 중단됨")
+
+    langfuse.flush()
+
+
+def note_store_example():
+    """
+    메모 저장소 예제
 
-    print("✓ Agent 전략 비교 완료")
-    print("  대시보드에서 각 전략의 성능을 비교할 수 있습니다")
+    여러 세션의 agent가 동시에 메모를 저장할 때 디스크 I/O를 기다리지 않고,
+    writer 스레드가 일괄 fsync로 기록하는 과정을 보여줍니다.
+    """
+    print("\n" + "=" * 60)
+    print("14. 로그 구조 메모 저장소 (백그라운드 writer, 일괄 fsync)")
+    print("=" * 60)
+
+    langfuse = Langfuse()
+    directory = tempfile.mkdtemp(prefix="agent_notes_")
+    notes_per_session = 100
+    sessions = [f"agent_session_notes_{i:03d}" for i in range(4)]
+
+    # 비교 기준: 메모마다 쓰기 + fsync
+    baseline_path = os.path.join(directory, "baseline.log")
+    start = time.perf_counter()
+    with open(baseline_path, "ab") as f:
+        for i in range(notes_per_session * len(sessions)):
+            f.write(NoteStore._encode({"id": i, "content": f"note {i}"}))
+            f.flush()
+            os.fsync(f.fileno())
+    baseline_ms = (time.perf_counter() - start) * 1000
+
+    store = NoteStore(directory, max_batch=64, flush_interval=0.02)
+    trace = langfuse.trace(name="note_store_benchmark", metadata={"sessions": len(sessions)})
+    append_seconds, max_depth = [], 0
+    lock = threading.Lock()
+
+    def agent_session(session_id):
+        nonlocal max_depth
+        for i in range(notes_per_session):
+            span = trace.span(
+                name="agent_step_save", metadata={"session_id": session_id, "turn": i}
+            )
+            t0 = time.perf_counter()
+            receipt = store.append(
+                f"[{session_id}] turn {i}: 사용자 요청 요약과 결정 사항", session_id=session_id
+            )
+            elapsed = time.perf_counter() - t0
+            span.end(
+                output=receipt['note_id'], metadata={"write_queue_depth": receipt['queue_depth']}
+            )
+            with lock:
+                append_seconds.append(elapsed)
+                max_depth = max(max_depth, receipt['queue_depth'])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(sessions)) as pool:
+        list(pool.map(agent_session, sessions))
+    enqueue_ms = (time.perf_counter() - start) * 1000
+    store.flush()
+    durable_ms = (time.perf_counter() - start) * 1000
+
+    stats = store.stats()
+    p50, p99 = np.percentile(np.asarray(append_seconds) * 1e6, [50, 99])
+    print(f"\n저장한 메모: {stats['notes']}개 ({len(sessions)}개 세션 동시 저장)")
+    print(f"  - 메모마다 fsync: {baseline_ms:.0f}ms")
+    print(f"  - 대기열 + 일괄 fsync: 저장 호출 {enqueue_ms:.0f}ms, 디스크 기록 완료 {durable_ms:.0f}ms")
+    print(f"  - append() 지연: p50 {p50:.0f}µs, p99 {p99:.0f}µs, 최대 대기열 깊이 {max_depth}")
+    print(f"  - fsync {stats['batches']}회 (평균 배치 {stats['avg_batch_size']}개)")
+
+    t0 = time.perf_counter()
+    session_notes = store.by_session(sessions[1], limit=3)
+    recent = store.between(time.time() - 60, time.time() + 1)
+    lookup_ms = (time.perf_counter() - t0) * 1000
+    print(f"\n색인 조회 ({lookup_ms:.2f}ms):")
+    for note in session_notes:
+        print(f"  - {note['id']}: {note['content']}")
+    print(f"  - 최근 1분 메모: {len(recent)}개")
+    store.close()
+
+    # 쓰다 만 레코드가 남은 상황에서 다시 열기
+    with open(store.path, "ab") as f:
+        f.write(b'1234abcd {"id":"note_torn"')
+    with NoteStore(directory) as reopened:
+        print(f"\n다시 열기: 메모 {reopened.stats()['notes']}개 복구, "
+              f"손상된 꼬리 {reopened.truncated_bytes}바이트 제거")
+        receipt = reopened.append("복구 후 메모", session_id=sessions[0])
+        reopened.flush()
+        print(f"  - 이어서 저장: {receipt['note_id']} → {reopened.get(receipt['note_id'])['content']}")
+    shutil.rmtree(directory, ignore_errors=True)
+
+    trace.update(
+        output=stats,
+        metadata={
+            "baseline_fsync_ms": round(baseline_ms, 1),
+            "durable_ms": round(durable_ms, 1),
+            "max_queue_depth": max_depth,
+        },
+    )
+    print("\n✓ 저장 span마다 쓰기 대기열 깊이가 기록됨")
+
+    langfuse.flush()
+
+
+def trace_replay_example():
+    """
+    트레이스 리플레이 예제
+
+    운영 환경처럼 실행한 agent trace를 export 파일로 남긴 뒤,
+    실제 도구/모델 호출 없이 현재 코드와 변경된 코드로 다시 실행해 비교합니다.
+    """
+    print("\n" + "=" * 60)
+    print("15. 기록된 trace 기반 Agent 리플레이")
+    print("=" * 60)
+
+    langfuse = Langfuse()
+    directory = tempfile.mkdtemp(prefix="agent_replay_")
+    export_path = os.path.join(directory, "agent_traces.jsonl")
+
+    # 1. 운영 실행 기록 (도구/LLM 지연 포함) → export 파일
+    latencies = {"search_knowledge_base": 0.12, "save_note": 0.03, "get_weather": 0.15,
+                 "get_current_time": 0.01, "calculate": 0.01}
+
+    def with_latency(name):
+        def call(*args, **kwargs):
+            time.sleep(latencies.get(name, 0.0))
+            return invoke_tool(AGENT_TOOLS[name], args[0] if args else (kwargs or None))
+        return call
+
+    live_tools = {name: with_latency(name) for name in AGENT_TOOLS}
+    queries = [
+        "Search for Langfuse and save it",
+        "What is the weather in Seoul and what time is it?",
+        "Calculate 15 * 23 and save the result",
+    ]
+    with open(export_path, "w", encoding="utf-8") as f:
+        for query in queries:
+            recorder = RecordingTrace(langfuse.trace(name="production_agent", input=query),
+                                      name="production_agent", input=query)
+            run_agent_loop(query, recorder, RouterAgentLLM(latency=0.08), live_tools)
+            f.write(json.dumps(recorder.to_export(), ensure_ascii=False, default=str) + "\n")
+    print(f"\n운영 trace {len(queries)}개 export: {export_path}")
+    print("  (실서비스에서는 export_traces(langfuse, trace_ids, path)로 API에서 받아 저장)")
+
+    def print_report(report):
+        status = "일치" if report['matched'] else "불일치"
+        print(f"\n  [{status}] {report['input']}")
+        divergence = report['first_divergence']
+        if divergence:
+            print(f"    첫 divergence: step {divergence['step']} {divergence['kind']}")
+            print(f"      기록: {str(divergence['expected'])[:60]!r}")
+            print(f"      현재: {str(divergence['actual'])[:60]!r}")
+        for step in report['steps']:
+            recorded = f"{step['recorded_ms']:.1f}ms" if step['recorded_ms'] is not None else "-"
+            replayed = f"{step['replay_ms']:.1f}ms" if step['replay_ms'] is not None else "-"
+            delta = f" (Δ {step['delta_ms']:+.1f}ms)" if step['delta_ms'] is not None else ""
+            print(f"    step {step['step']}: 기록 {recorded:>8} → 리플레이 {replayed:>8}{delta}")
+
+    # 2. 현재 코드 그대로 리플레이 (도구/모델 호출 없음)
+    print("\n[현재 코드 리플레이]")
+    start = time.perf_counter()
+    reports = TraceReplayEngine(langfuse=langfuse).replay_file(export_path)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    for report in reports:
+        print_report(report)
+    print(f"\n  → {sum(r['matched'] for r in reports)}/{len(reports)}개 일치, "
+          f"기록 {sum(r['recorded_ms'] for r in reports):.0f}ms → 리플레이 {elapsed_ms:.0f}ms")
+
+    # 3. 변경된 agent 코드 리플레이: 저장 전에 관찰 결과를 40자로 줄이는 새 버전
+    def agent_with_short_notes(query, trace, llm, tools, max_steps=6):
+        def shortened(prompt, query, history):
+            completion = llm(prompt, query, history)
+            decision = parse_agent_completion(completion)
+            if decision.get('tool') == "save_note" and isinstance(decision['input'], str):
+                return completion.replace(json.dumps(decision['input'], ensure_ascii=False),
+                                          json.dumps(decision['input'][:40], ensure_ascii=False))
+            return completion
+        return run_agent_loop(query, trace, shortened, tools, max_steps=max_steps)
+
+    # 기록된 LLM/도구 시간만큼 대기해 단계별 지연 차이가 agent 코드 변화만 반영하도록 함
+    print("\n[변경된 코드 리플레이: save_note 입력 40자 요약, 기록된 지연 재현]")
+    engine = TraceReplayEngine(
+        agent=agent_with_short_notes, simulate_latency=True, langfuse=langfuse
+    )
+    for report in engine.replay_file(export_path):
+        print_report(report)
+    shutil.rmtree(directory, ignore_errors=True)
+
+    print("\n✓ 리플레이 trace에 source_trace_id, 첫 divergence, 단계별 지연 비교와 replay_match 점수가 기록됨")
 
     langfuse.flush()
 
@@ -700,6 +3569,33 @@ def main():
         # 6. 성능 비교
         agent_performance_comparison()
 
+        # 7. 병렬 도구 실행
+        parallel_tool_execution_example()
+
+        # 8. 도구 메모이제이션
+        tool_memoization_example()
+
+        # 9. 지식 베이스 검색
+        knowledge_base_search_example()
+
+        # 10. 안전한 계산기
+        safe_calculator_example()
+
+        # 11. 의도 라우팅
+        intent_routing_example()
+
+        # 12. 장기 세션 메모리
+        long_session_memory_example()
+
+        # 13. 실행 제어
+        controlled_agent_example()
+
+        # 14. 메모 저장소
+        note_store_example()
+
+        # 15. 트레이스 리플레이
+        trace_replay_example()
+
         print("\n" + "=" * 60)
         print("✓ 모든 Agent 예제 완료!")
         print("=" * 60)